@@ -1,88 +1,160 @@
 # SEO Analysis API
 
+import atexit
+import hashlib
+import json
 import os
+import threading
 import time
-from threading import Thread
-from queue import Queue
-import uuid
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from .seo_analysis import SEOAnalysisTools, create_seo_analysis_crew
+from .seo_analysis.extraction_pool import EXTRACTION_RETRY_AFTER, ExtractionPoolBusy
+from .seo_analysis.metrics import (
+    jobs_gauge,
+    observe_job,
+    percentile,
+    render_metrics,
+    workers_gauge,
+)
+from .seo_analysis.tools import QUICK_ANALYSIS_CACHE_TTL, quick_structure_analysis
+from .job_store import PRIORITIES, ResultReaper, create_job_store
+from .worker import (
+    BULK_MAX_RUNNING,
+    JOB_STORE_URL,
+    JOB_STORE_RECHECK_INTERVAL,
+    MAX_BATCH_URLS,
+    MAX_STORED_RESULTS,
+    RESULT_REAPER_INTERVAL,
+    RESULT_TTL_HOURS,
+    TENANT_MAX_RUNNING,
+    WorkerPool,
+)
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # Configuration from environment variables
 PORT = os.getenv("PORT")
+# Worker threads started inside each API process. Set to 0 when analyses are
+# run by dedicated `python -m applications.api.src.worker` processes.
+EMBEDDED_WORKERS = int(os.getenv("EMBEDDED_WORKERS", "1"))
+# How often event streams look for progress recorded by other processes, and
+# how long they stay silent before sending a keep-alive comment
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "1"))
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+# Recently started jobs whose queue wait the health check reports on, and
+# recently completed jobs whose run time queue ETAs are estimated from
+QUEUE_WAIT_SAMPLE = int(os.getenv("QUEUE_WAIT_SAMPLE", "100"))
+# Clients allowed to queue jobs, as comma-separated name:key[:priority]
+# entries. The name is the tenant the client's jobs are scheduled as, and the
+# priority ("interactive" by default, or "bulk") the most urgent one its jobs
+# get. Unset, any request may queue jobs, all as one anonymous client.
+API_KEYS = os.getenv("API_KEYS", "")
+
+FINAL_STATUSES = ("completed", "failed", "cancelled")
 
 app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
-# In-memory store for analysis results
-analysis_results = {}
-analysis_queue = Queue()
-
-
-def process_analysis_queue():
-    while True:
-        if not analysis_queue.empty():
-            analysis_id, url = analysis_queue.get()
-            try:
-                analysis_results[analysis_id]["status"] = "running"
-
-                seo_crew = create_seo_analysis_crew(url)
-                crew_result = seo_crew.kickoff()
-
-                result = {
-                    "analysis_text": str(crew_result),
-                    "summary": (
-                        str(crew_result).split("\n\n")[0] if str(crew_result) else ""
-                    ),
-                    "timestamp": time.time(),
-                }
-
-                # Collect all task outputs
-                task_outputs = []
-                for idx, task in enumerate(seo_crew.tasks, start=1):
-                    task_outputs.append(
-                        {
-                            "task_number": idx,
-                            "task_name": task.description.strip().splitlines()[0],
-                            "task_output": (str(task.output)),
-                        }
-                    )
-
-                result = {
-                    "tasks": task_outputs,
-                    "result_summary": result["summary"],
-                    "analysis_text": result["analysis_text"],
-                    "url": url,
-                    "timestamp": time.time(),
-                }
-
-                analysis_results[analysis_id]["status"] = "completed"
-                analysis_results[analysis_id]["result"] = result
-                analysis_results[analysis_id]["completed_at"] = time.time()
-
-            except Exception as e:
-                import traceback
-
-                analysis_results[analysis_id]["status"] = "failed"
-                analysis_results[analysis_id]["error"] = str(e)
-                analysis_results[analysis_id][
-                    "error_traceback"
-                ] = traceback.format_exc()
-                print(f"Error processing analysis {analysis_id}: {str(e)}")
-                print(traceback.format_exc())
-            finally:
-                analysis_queue.task_done()
-        else:
-            time.sleep(1)
-
-
-# Background worker
-worker_thread = Thread(target=process_analysis_queue, daemon=True)
-worker_thread.start()
+# Durable store for analysis jobs and results, shared by every API and
+# worker process that points at the same JOB_STORE_URL
+job_store = create_job_store(
+    JOB_STORE_URL, JOB_STORE_RECHECK_INTERVAL, TENANT_MAX_RUNNING, BULK_MAX_RUNNING
+)
+
+# Background workers; in-flight analyses are drained when the process exits.
+# They and the result reaper are started by `create_app`, not on import, so
+# processes that only import this module don't claim jobs.
+worker_pool = WorkerPool(job_store, EMBEDDED_WORKERS)
+
+# Expire old results in the background instead of letting the store grow
+result_reaper = ResultReaper(
+    job_store,
+    ttl=RESULT_TTL_HOURS * 3600 or None,
+    max_results=MAX_STORED_RESULTS or None,
+    interval=RESULT_REAPER_INTERVAL,
+)
+
+_services_lock = threading.Lock()
+_services_started = False
+
+
+def start_background_services():
+    """Start the embedded workers and the result reaper, once per process."""
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+    worker_pool.start()
+    atexit.register(worker_pool.stop)
+    result_reaper.start()
+    atexit.register(result_reaper.stop)
+
+
+def create_app():
+    """
+    The API with its background services running; the WSGI entry point:
+
+        gunicorn 'applications.api.src.api:create_app()'
+    """
+    start_background_services()
+    return app
+
+
+def _key_hash(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+def parse_api_keys(spec):
+    """
+    Parse API_KEYS into {hash of the key: (client name, highest priority)};
+    only hashes of the keys are kept in memory.
+    """
+    clients = {}
+    for entry in filter(None, (entry.strip() for entry in spec.split(","))):
+        name, _, rest = entry.partition(":")
+        api_key, _, priority = rest.partition(":")
+        priority = priority or PRIORITIES[0]
+        if not name or not api_key or priority not in PRIORITIES:
+            raise ValueError(f"Invalid API_KEYS entry for client '{name}'")
+        clients[_key_hash(api_key)] = (name, priority)
+    return clients
+
+
+api_clients = parse_api_keys(API_KEYS)
+
+
+def _client():
+    """
+    The client queuing a job, from the X-API-Key header: its tenant and the
+    most urgent priority its jobs get, or None if the key isn't configured.
+    Without API_KEYS every request is the same anonymous client.
+    """
+    if not api_clients:
+        return "", PRIORITIES[0]
+    api_key = request.headers.get("X-API-Key")
+    if not api_key:
+        return None
+    return api_clients.get(_key_hash(api_key))
+
+
+def _unauthorized():
+    return jsonify({"error": "Missing or unknown X-API-Key"}), 401
+
+
+def _capped(priority, highest):
+    # PRIORITIES go from most to least urgent
+    return PRIORITIES[max(PRIORITIES.index(priority), PRIORITIES.index(highest))]
+
+
+def _priority_error(priority):
+    if priority in PRIORITIES:
+        return None
+    return (
+        jsonify({"error": "'priority' must be one of: " + ", ".join(PRIORITIES)}),
+        400,
+    )
 
 
 @app.route("/api/seo/analyze", methods=["POST"])
@@ -91,8 +163,17 @@ def request_analysis():
     Endpoint to request a new SEO analysis
 
     Expects JSON body: {"url": "https://example.com/landing-page"}
+    Optional "force": true re-runs every task even if the page is unchanged
+    Optional "priority": "interactive" (default) or "bulk"; interactive
+    analyses are started first, and clients (by X-API-Key) take turns. A
+    client's jobs never get a more urgent priority than its key allows.
     Returns analysis_id that can be used to check status and retrieve results
     """
+    client = _client()
+    if client is None:
+        return _unauthorized()
+    tenant, highest_priority = client
+
     data = request.get_json()
 
     if not data or "url" not in data:
@@ -103,46 +184,164 @@ def request_analysis():
     if not url.startswith(("http://", "https://")):
         return jsonify({"error": "URL must start with http:// or https://"}), 400
 
-    analysis_id = str(uuid.uuid4())
+    priority = data.get("priority", "interactive")
+    error = _priority_error(priority)
+    if error:
+        return error
+    priority = _capped(priority, highest_priority)
 
-    analysis_results[analysis_id] = {
-        "url": url,
-        "status": "queued",
-        "created_at": time.time(),
-        "result": None,
-        "error": None,
-        "completed_at": None,
-    }
-
-    analysis_queue.put((analysis_id, url))
+    params = {"force": True} if data.get("force") else None
+    analysis_id = job_store.create(
+        url, params=params, priority=priority, tenant=tenant
+    )["analysis_id"]
 
     return jsonify(
         {
             "analysis_id": analysis_id,
             "status": "queued",
+            "priority": priority,
             "message": "Analysis request has been queued",
             "check_status_url": f"/api/seo/status/{analysis_id}",
         }
     )
 
 
+@app.route("/api/seo/analyze-batch", methods=["POST"])
+def request_batch_analysis():
+    """
+    Endpoint to request a quick structure analysis of many pages at once
+
+    Expects JSON body: {"urls": ["https://example.com/a", ...]} and/or
+    {"sitemap_url": "https://example.com/sitemap.xml"}
+    Optional "priority": "bulk" (default) or "interactive", capped like
+    single analyses
+    Returns an analysis_id; the result holds per-page results and a summary
+    """
+    client = _client()
+    if client is None:
+        return _unauthorized()
+    tenant, highest_priority = client
+
+    data = request.get_json()
+
+    if not data or not (data.get("urls") or data.get("sitemap_url")):
+        return jsonify({"error": "Missing required field 'urls' or 'sitemap_url'"}), 400
+
+    priority = data.get("priority", "bulk")
+    error = _priority_error(priority)
+    if error:
+        return error
+    priority = _capped(priority, highest_priority)
+
+    urls = data.get("urls") or []
+    sitemap_url = data.get("sitemap_url")
+
+    if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+        return jsonify({"error": "'urls' must be a list of URLs"}), 400
+
+    if len(urls) > MAX_BATCH_URLS:
+        return (
+            jsonify({"error": f"A batch can contain at most {MAX_BATCH_URLS} URLs"}),
+            400,
+        )
+
+    for url in urls + ([sitemap_url] if sitemap_url else []):
+        if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+            return jsonify({"error": "URL must start with http:// or https://"}), 400
+
+    analysis_id = job_store.create(
+        sitemap_url or urls[0],
+        kind="batch",
+        params={"urls": urls, "sitemap_url": sitemap_url},
+        priority=priority,
+        tenant=tenant,
+    )["analysis_id"]
+
+    return jsonify(
+        {
+            "analysis_id": analysis_id,
+            "status": "queued",
+            "priority": priority,
+            "message": "Batch analysis request has been queued",
+            "check_status_url": f"/api/seo/status/{analysis_id}",
+            "stream_url": f"/api/seo/stream/{analysis_id}",
+        }
+    )
+
+
+@app.route("/api/seo/analyze/<analysis_id>", methods=["DELETE"])
+def cancel_analysis(analysis_id):
+    """
+    Endpoint to cancel a queued or running analysis
+
+    Queued analyses are cancelled immediately; running ones are stopped
+    after the agent's current step.
+    """
+    status = job_store.cancel(analysis_id)
+
+    if status is None:
+        return jsonify({"error": "Analysis ID not found"}), 404
+
+    if status not in ("cancelled", "cancelling"):
+        return (
+            jsonify({"error": "Analysis already finished", "status": status}),
+            409,
+        )
+
+    job_store.add_event(analysis_id, "status", {"status": status})
+
+    return jsonify(
+        {
+            "analysis_id": analysis_id,
+            "status": status,
+            "check_status_url": f"/api/seo/status/{analysis_id}",
+        }
+    )
+
+
+def queue_estimate(job):
+    """
+    Where a queued job stands: its 1-based "queue_position", the
+    "jobs_ahead" of it and "eta_seconds", an estimate of when a worker will
+    start it. Every busy worker is assumed to get through the jobs ahead
+    at the median run time of recently completed jobs; no ETA without any.
+    """
+    jobs_ahead = job_store.jobs_ahead(job)
+    run_seconds = _percentile(job_store.run_durations(QUEUE_WAIT_SAMPLE), 0.5)
+    eta = None
+    if run_seconds is not None:
+        workers = max(job_store.count("running") + job_store.count("cancelling"), 1)
+        eta = round((jobs_ahead // workers + 1) * run_seconds, 1)
+    return {
+        "queue_position": jobs_ahead + 1,
+        "jobs_ahead": jobs_ahead,
+        "eta_seconds": eta,
+    }
+
+
 @app.route("/api/seo/status/<analysis_id>", methods=["GET"])
 def check_status(analysis_id):
     """
     Endpoint to check the status of an analysis
+
+    Queued analyses also report their queue position and an estimated wait
     """
-    if analysis_id not in analysis_results:
+    analysis = job_store.get(analysis_id)
+    if analysis is None:
         return jsonify({"error": "Analysis ID not found"}), 404
 
-    analysis = analysis_results[analysis_id]
-
     response = {
         "analysis_id": analysis_id,
         "url": analysis["url"],
+        "kind": analysis["kind"],
+        "priority": analysis["priority"],
         "status": analysis["status"],
         "created_at": analysis["created_at"],
     }
 
+    if analysis["status"] == "queued":
+        response.update(queue_estimate(analysis))
+
     if analysis["completed_at"]:
         response["completed_at"] = analysis["completed_at"]
 
@@ -152,6 +351,9 @@ def check_status(analysis_id):
     if analysis["status"] == "completed":
         response["result_url"] = f"/api/seo/result/{analysis_id}"
 
+    if analysis["metrics"]:
+        response["metrics"] = analysis["metrics"]
+
     return jsonify(response)
 
 
@@ -160,11 +362,10 @@ def get_results(analysis_id):
     """
     Endpoint to retrieve the results of a completed analysis
     """
-    if analysis_id not in analysis_results:
+    analysis = job_store.get(analysis_id)
+    if analysis is None:
         return jsonify({"error": "Analysis ID not found"}), 404
 
-    analysis = analysis_results[analysis_id]
-
     if analysis["status"] != "completed":
         return (
             jsonify(
@@ -181,20 +382,98 @@ def get_results(analysis_id):
             "created_at": analysis["created_at"],
             "completed_at": analysis["completed_at"],
             "result": analysis["result"],
+            "metrics": analysis["metrics"],
         }
     )
 
 
-@app.route("/api/seo/analyze-quick", methods=["POST"])
+def _format_event(event):
+    data = dict(event["data"])
+    if event["event"] == "status" and data.get("status") == "completed":
+        data["result_url"] = f"/api/seo/result/{event['analysis_id']}"
+    return (
+        f"id: {event['seq']}\n"
+        f"event: {event['event']}\n"
+        f"data: {json.dumps(data)}\n\n"
+    )
+
+
+@app.route("/api/seo/stream/<analysis_id>", methods=["GET"])
+def stream_analysis(analysis_id):
+    """
+    Endpoint streaming the progress of an analysis as Server-Sent Events
+
+    Sends a `status` event on every status change and a `task` event with
+    each task's output as soon as it finishes, then closes once the analysis
+    is completed, failed or cancelled. Reconnecting clients resume after the
+    `Last-Event-ID` header (or `last_event_id` query parameter).
+    """
+    if job_store.status(analysis_id) is None:
+        return jsonify({"error": "Analysis ID not found"}), 404
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get(
+        "last_event_id", "0"
+    )
+    try:
+        after = int(last_event_id)
+    except ValueError:
+        after = 0
+
+    def generate():
+        nonlocal after
+        while True:
+            # Don't wait for more events from deleted or finished analyses
+            finished = job_store.status(analysis_id) in (None, *FINAL_STATUSES)
+            events = job_store.wait_for_events(
+                analysis_id,
+                after,
+                timeout=0 if finished else STREAM_KEEPALIVE_SECONDS,
+                poll_interval=STREAM_POLL_INTERVAL,
+            )
+            for event in events:
+                after = event["seq"]
+                yield _format_event({**event, "analysis_id": analysis_id})
+            if finished or (
+                events and events[-1]["data"].get("status") in FINAL_STATUSES
+            ):
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def quick_analysis_payload(url, structure_analysis):
+    """Body of a quick analysis response; the ASGI app returns the same."""
+    return {
+        "url": url,
+        "analysis_type": "quick",
+        "structure_analysis": structure_analysis,
+        "message": "For complete analysis with recommendations, use the /api/seo/analyze endpoint",
+    }
+
+
+@app.route("/api/seo/analyze-quick", methods=["GET", "POST"])
 def quick_analysis():
     """
     Endpoint for a quicker, simpler analysis without using CrewAI
     This is useful for initial checks or when full analysis would be too time-consuming
 
     Expects JSON body: {"url": "https://example.com/landing-page"}
+    or, for GET, the query string ?url=https://example.com/landing-page
     Returns basic structure and visual analysis directly
+
+    Results are cached for QUICK_ANALYSIS_CACHE_TTL seconds and carry an
+    ETag; a GET with a matching If-None-Match gets 304 Not Modified.
     """
-    data = request.get_json()
+    if request.method == "GET":
+        data = request.args
+    else:
+        data = request.get_json()
 
     if not data or "url" not in data:
         return jsonify({"error": "Missing required field 'url'"}), 400
@@ -205,31 +484,103 @@ def quick_analysis():
         return jsonify({"error": "URL must start with http:// or https://"}), 400
 
     try:
-        # Run the direct analysis
-        structure_analysis = SEOAnalysisTools.analyze_page_structure.run(url)
-
-        return jsonify(
-            {
-                "url": url,
-                "analysis_type": "quick",
-                "structure_analysis": structure_analysis,
-                "message": "For complete analysis with recommendations, use the /api/seo/analyze endpoint",
-            }
+        # Run the direct analysis, or share a recent or in-flight one
+        analysis = quick_structure_analysis(url)
+
+        response = jsonify(quick_analysis_payload(url, analysis.result))
+        age = time.time() - analysis.fetched_at
+        # Weak: the body echoes the requested spelling of the URL
+        response.set_etag(analysis.etag, weak=True)
+        response.cache_control.public = True
+        response.cache_control.max_age = max(int(QUICK_ANALYSIS_CACHE_TTL - age), 0)
+        # Only answers GET and HEAD requests with 304
+        return response.make_conditional(request)
+
+    except ExtractionPoolBusy as e:
+        return (
+            jsonify({"error": str(e)}),
+            503,
+            {"Retry-After": str(EXTRACTION_RETRY_AFTER)},
         )
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def _percentile(values, fraction):
+    if not values:
+        return None
+    return round(percentile(sorted(values), fraction), 3)
+
+
+def health_payload():
+    waits = job_store.queue_waits(QUEUE_WAIT_SAMPLE)
+    oldest_queued_at = job_store.oldest_queued_at()
+    return {
+        "status": "healthy",
+        "queue_size": job_store.count("queued"),
+        "active_analyses": job_store.count(),
+        "running_analyses": job_store.count("running"),
+        "queue_wait_seconds": {
+            "oldest_queued": (
+                round(time.time() - oldest_queued_at, 3) if oldest_queued_at else 0
+            ),
+            "recent_p50": _percentile(waits, 0.5),
+            "recent_p95": _percentile(waits, 0.95),
+            "recent_max": _percentile(waits, 1),
+        },
+        # This process's embedded workers
+        "workers": worker_pool.utilization(),
+    }
+
+
 @app.route("/api/seo/health", methods=["GET"])
 def health_check():
     """Health check endpoint"""
-    return jsonify(
-        {
-            "status": "healthy",
-            "queue_size": analysis_queue.qsize(),
-            "active_analyses": len(analysis_results),
-        }
+    return jsonify(health_payload())
+
+
+# Finished jobs already added to the metrics: (completed_at, analysis_id) of
+# the last one. Jobs that finished before this process started aren't added.
+_metrics_cursor = (time.time(), "")
+_metrics_lock = threading.Lock()
+# Jobs are added once they finished this long ago, so one stored a moment
+# after a later-finishing job isn't skipped
+METRICS_SETTLE_SECONDS = 2
+METRICS_BATCH_SIZE = 500
+
+
+def collect_job_metrics():
+    """Add the stored metrics of newly finished jobs, from any worker process."""
+    global _metrics_cursor
+    with _metrics_lock:
+        before = time.time() - METRICS_SETTLE_SECONDS
+        while True:
+            jobs = job_store.finished_metrics(
+                *_metrics_cursor, before=before, limit=METRICS_BATCH_SIZE
+            )
+            for job in jobs:
+                observe_job(job)
+            if jobs:
+                _metrics_cursor = (jobs[-1]["completed_at"], jobs[-1]["analysis_id"])
+            if len(jobs) < METRICS_BATCH_SIZE:
+                return
+
+
+@app.route("/api/seo/metrics", methods=["GET"])
+def metrics():
+    """
+    Prometheus metrics: histograms of the analysis stages, LLM calls, queue
+    waits and job durations, token and download counters, job and worker gauges
+    """
+    collect_job_metrics()
+    for status in ("queued", "running"):
+        jobs_gauge.set(job_store.count(status), status=status)
+    workers = worker_pool.utilization()
+    workers_gauge.set(workers["busy"], state="busy")
+    workers_gauge.set(workers["workers"] - workers["busy"], state="idle")
+    return Response(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
     )
 
 
@@ -248,21 +599,13 @@ def cleanup_old_analyses():
 
     max_age_hours = data.get("max_age_hours", 24)
     max_age_seconds = max_age_hours * 3600
-    current_time = time.time()
-
-    keys_to_remove = []
-    for analysis_id, analysis in analysis_results.items():
-        if current_time - analysis["created_at"] > max_age_seconds:
-            keys_to_remove.append(analysis_id)
-
-    for key in keys_to_remove:
-        del analysis_results[key]
+    removed_count = job_store.delete_created_before(time.time() - max_age_seconds)
 
     return jsonify(
         {
             "status": "success",
-            "removed_count": len(keys_to_remove),
-            "remaining_count": len(analysis_results),
+            "removed_count": removed_count,
+            "remaining_count": job_store.count(),
         }
     )
 
@@ -271,4 +614,4 @@ if __name__ == "__main__":
     # For development only - use gunicorn or similar for production
     port = int(os.environ.get("PORT", PORT))
     print(f"Server running on port ${PORT}... ")
-    app.run(host="0.0.0.0", port=port, debug=True)
+    create_app().run(host="0.0.0.0", port=port, debug=True)
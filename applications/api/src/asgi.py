@@ -0,0 +1,316 @@
+# Async (ASGI) variant of the SEO Analysis API
+#
+#     uvicorn applications.api.src.asgi:app --host 0.0.0.0 --port 5000
+#
+# The quick analysis and health endpoints are served natively: page fetches
+# don't hold a thread and parsing runs in the extraction pool, so one process
+# can serve many quick analyses at once. Every other route is the Flask app.
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+import httpx
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from urllib3.exceptions import InvalidHeader, MaxRetryError
+from werkzeug.http import parse_etags
+
+from .api import (
+    app as flask_app,
+    health_payload,
+    quick_analysis_payload,
+    start_background_services,
+)
+from .seo_analysis.cache import (
+    AsyncSingleFlight,
+    CachedAnalysis,
+    CachedPage,
+    normalize_url,
+)
+from .seo_analysis.extraction_pool import (
+    EXTRACTION_RETRY_AFTER,
+    ExtractionPoolBusy,
+    extraction_pool,
+)
+from .seo_analysis.http_client import (
+    HTTP_MAX_RETRIES,
+    READ_CHUNK_SIZE,
+    REQUEST_CONNECT_TIMEOUT,
+    REQUEST_TIMEOUT,
+    USER_AGENT,
+    new_retry,
+    page_charset,
+    require_content_type,
+)
+from .seo_analysis.llm_cache import content_hash
+from .seo_analysis.metrics import add_total, span
+from .seo_analysis.structure import extract_page
+from .seo_analysis.tools import (
+    PAGE_CONTENT_TYPES,
+    PAGE_MAX_BYTES,
+    QUICK_ANALYSIS_CACHE_TTL,
+    conditional_headers,
+    page_cache,
+    page_from_extraction,
+    page_structure_analysis,
+    quick_analysis_cache,
+    record_extraction,
+)
+
+load_dotenv()
+
+# Outgoing connections kept open
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "200"))
+# Threads serving the Flask routes; every open event stream holds one
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "64"))
+
+# Concurrent quick analyses of the same page share one fetch and parse
+_inflight = AsyncSingleFlight()
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    """
+    `WsgiToAsgi` running each request on a thread of `executor`.
+
+    asgiref runs WSGI apps thread-sensitively, i.e. every request on the
+    same single thread, so one slow request (such as an event stream) would
+    hold up all the others.
+    """
+
+    def __init__(self, wsgi_application, executor: ThreadPoolExecutor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        instance = _ThreadedWsgiInstance(self.wsgi_application, self.executor)
+        await instance(scope, receive, send)
+
+
+class _ThreadedWsgiInstance(WsgiToAsgiInstance):
+    def __init__(self, wsgi_application, executor: ThreadPoolExecutor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        # The undecorated method; attribute access would bind the wrapper
+        run = sync_to_async(
+            WsgiToAsgiInstance.__dict__["run_wsgi_app"].func,
+            thread_sensitive=False,
+            executor=self.executor,
+        )
+        await run(self, body)
+
+
+_wsgi_executor = ThreadPoolExecutor(
+    max_workers=ASGI_WSGI_THREADS, thread_name_prefix="asgi-wsgi"
+)
+
+
+async def send_with_retries(
+    client: httpx.AsyncClient, url: str, headers: Optional[Dict[str, str]] = None
+) -> httpx.Response:
+    """
+    Send a streamed GET, retrying RETRY_STATUSES answers with the same
+    policy as `HttpClient` (see `new_retry`), Retry-After included. The
+    client's transport retries failed connections. Returns the last response.
+    """
+    retry = new_retry()
+    while True:
+        response = await client.send(
+            client.build_request("GET", url, headers=headers), stream=True
+        )
+        has_retry_after = "Retry-After" in response.headers
+        if not retry.is_retry("GET", response.status_code, has_retry_after):
+            return response
+        try:
+            retry = retry.increment("GET", url)
+        except MaxRetryError:
+            return response
+        try:
+            delay = retry.get_retry_after(response)
+        except InvalidHeader:
+            delay = None
+        await response.aclose()
+        await asyncio.sleep(delay if delay is not None else retry.get_backoff_time())
+
+
+async def fetch_page_body(
+    client: httpx.AsyncClient, url: str, headers: Optional[Dict[str, str]] = None
+) -> Tuple[httpx.Response, bytes, bool]:
+    """
+    Async counterpart of `tools._get_page`: GET a page, reading at most
+    PAGE_MAX_BYTES of its body. Returns the response, the body and whether
+    it was cut short; a 304 has no body.
+    """
+    body = b""
+    truncated = False
+    with span("fetch") as attrs:
+        response = await send_with_retries(client, url, headers)
+        try:
+            attrs["status"] = response.status_code
+            if response.status_code != 304:
+                response.raise_for_status()
+                require_content_type(url, response.headers, PAGE_CONTENT_TYPES)
+                chunks = []
+                size = 0
+                async for chunk in response.aiter_bytes(READ_CHUNK_SIZE):
+                    if size + len(chunk) > PAGE_MAX_BYTES:
+                        # Closing the response stops the download
+                        chunks.append(chunk[: PAGE_MAX_BYTES - size])
+                        truncated = True
+                        break
+                    size += len(chunk)
+                    chunks.append(chunk)
+                body = b"".join(chunks)
+                attrs.update(bytes=len(body), truncated=truncated)
+                add_total("downloaded_bytes", len(body))
+        finally:
+            await response.aclose()
+    return response, body, truncated
+
+
+async def load_page(client: httpx.AsyncClient, url: str) -> CachedPage:
+    """
+    Async counterpart of `tools._load_page`: fetch and parse a page into the
+    page cache, revalidating a stale entry with a conditional GET.
+    """
+    stale = page_cache.lookup(url)
+    headers = {}
+    if stale is not None:
+        headers = conditional_headers(stale.etag, stale.last_modified)
+
+    response, body, truncated = await fetch_page_body(client, url, headers)
+    if response.status_code == 304 and stale is not None:
+        stale.fetched_at = time.time()
+        page = stale
+    else:
+        encoding = page_charset(response.headers, body)
+        started = time.perf_counter()
+        extracted = await extraction_pool.run_async(
+            extract_page, url, body, encoding, truncated
+        )
+        record_extraction(extracted, started)
+        page = page_from_extraction(
+            url, response.headers, body, encoding, truncated, extracted
+        )
+    page_cache.put(url, page)
+    return page
+
+
+async def quick_structure_analysis(request: Request, url: str) -> CachedAnalysis:
+    """
+    Async counterpart of `tools.quick_structure_analysis`, sharing its caches:
+    the page is fetched without blocking and parsed in the extraction pool.
+    """
+    cached = quick_analysis_cache.peek(url)
+    if cached is not None:
+        return cached
+
+    async def load():
+        page = page_cache.peek(url)
+        if page is None:
+            page = await load_page(request.app.state.http_client, url)
+        result = page_structure_analysis(url, page)
+        analysis = CachedAnalysis(
+            url=url, result=result, etag=content_hash(result), fetched_at=time.time()
+        )
+        quick_analysis_cache.put(url, analysis)
+        return analysis
+
+    return await _inflight.do(normalize_url(url), load)
+
+
+async def quick_analysis(request: Request) -> Response:
+    """Same request and response as the Flask `/api/seo/analyze-quick`."""
+    if request.method == "GET":
+        data = request.query_params
+    else:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+
+    if not data or "url" not in data:
+        return JSONResponse({"error": "Missing required field 'url'"}, 400)
+
+    url = data["url"]
+
+    if not url.startswith(("http://", "https://")):
+        return JSONResponse({"error": "URL must start with http:// or https://"}, 400)
+
+    try:
+        analysis = await quick_structure_analysis(request, url)
+    except ExtractionPoolBusy as e:
+        return JSONResponse(
+            {"error": str(e)},
+            503,
+            headers={"Retry-After": str(EXTRACTION_RETRY_AFTER)},
+        )
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, 500)
+
+    age = time.time() - analysis.fetched_at
+    headers = {
+        "ETag": f'W/"{analysis.etag}"',
+        "Cache-Control": f"public, max-age={max(int(QUICK_ANALYSIS_CACHE_TTL - age), 0)}",
+    }
+    if_none_match = parse_etags(request.headers.get("If-None-Match"))
+    if request.method == "GET" and if_none_match.contains_weak(analysis.etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(quick_analysis_payload(url, analysis.result), headers=headers)
+
+
+async def health_check(request: Request) -> Response:
+    """Health check endpoint"""
+    # Store reads may block on SQLite; keep them off the event loop
+    return JSONResponse(await run_in_threadpool(health_payload))
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    start_background_services()
+    app.state.http_client = httpx.AsyncClient(
+        headers={"User-Agent": USER_AGENT},
+        timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=REQUEST_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS),
+        # Retries failed connections; `send_with_retries` retries answers
+        transport=httpx.AsyncHTTPTransport(retries=HTTP_MAX_RETRIES),
+        follow_redirects=True,
+    )
+    try:
+        yield
+    finally:
+        await app.state.http_client.aclose()
+        extraction_pool.shutdown()
+        _wsgi_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route("/api/seo/analyze-quick", quick_analysis, methods=["GET", "POST"]),
+        Route("/api/seo/health", health_check, methods=["GET"]),
+        # Everything else, including the event streams, runs in threads
+        Mount("/", app=ThreadedWsgiToAsgi(flask_app, _wsgi_executor)),
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=["*"],
+            allow_methods=["*"],
+            allow_headers=["*"],
+        )
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,68 @@
+"""
+Deterministic stand-in for the model, so the crew can be benchmarked offline.
+
+Each agent calls every tool it was given once, in order, and then gives a
+canned final answer, answering in the same ReAct format as a real model.
+"""
+
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from crewai import BaseLLM
+
+TOOL_NAME = re.compile(r"^Tool Name: (.+)$", re.MULTILINE)
+URL = re.compile(r"https?://[^\s\"'<>]+")
+
+FINAL_ANSWER = """Thought: I now know the final answer
+Final Answer: The page has a clear structure and one primary call to action.
+
+1. Shorten the title to under 60 characters and lead with the main keyword.
+2. Add descriptive alt text to every image and compress the largest ones.
+3. Move social proof above the fold, next to the call to action.
+"""
+
+
+class FakeLLM(BaseLLM):
+    """Answers agent prompts without a model; waits `latency` seconds per call."""
+
+    def __init__(self, latency: float = 0):
+        super().__init__(model="fake-llm", temperature=0)
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def call(
+        self,
+        messages: Union[str, List[Dict[str, str]]],
+        tools: Optional[List[dict]] = None,
+        callbacks: Optional[List[Any]] = None,
+        available_functions: Optional[Dict[str, Any]] = None,
+    ) -> Union[str, Any]:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        # The executor adds each tool call and its observation as an
+        # assistant message, after the system and task prompts
+        prompt = "\n".join(m["content"] for m in messages if m["role"] != "assistant")
+        used = sum(1 for m in messages if m["role"] == "assistant")
+
+        tool_names = TOOL_NAME.findall(prompt)
+        urls = URL.findall(prompt)
+        if used >= len(tool_names) or not urls:
+            return FINAL_ANSWER
+
+        url = urls[0].rstrip(".,;:)")
+        return (
+            f"Thought: I need more information about the page\n"
+            f"Action: {tool_names[used].strip()}\n"
+            f"Action Input: {json.dumps({'url': url})}"
+        )
+
+    def get_context_window_size(self) -> int:
+        return 128000
@@ -0,0 +1,199 @@
+"""
+Analysis pipeline benchmark: run every stage of an analysis against a
+corpus of fixture pages served locally, with a fake LLM, and report each
+stage's latency, throughput and peak memory.
+
+    python -m applications.api.src.benchmarks.pipeline --save-baseline
+    python -m applications.api.src.benchmarks.pipeline --max-regression 0.2
+
+Stages, per fixture page:
+    fetch       download and extract the page (page cache cleared first)
+    structure   the page structure tool
+    visual      the visual elements tool, probing the page's images
+    landing     the landing page tool
+    crew        a whole analysis (`worker.run_analysis`), cold page cache
+
+The tool stages start from a cached page, so they measure the analysis
+rather than the download. Nothing touches the network: pages and images
+come from the stub site and the agents talk to `FakeLLM`.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict
+
+from ..seo_analysis.metrics import percentile
+
+# Settings for a reproducible, offline run; set before the API modules load
+BENCHMARK_ENV = {
+    # Extract in this process, so the stages (and tracemalloc) see the work
+    "EXTRACTION_PROCESSES": "0",
+    "LLM_CACHE_PATH": "",
+    "NLTK_AUTO_DOWNLOAD": "false",
+    "CREWAI_DISABLE_TELEMETRY": "true",
+    "OTEL_SDK_DISABLED": "true",
+}
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines.json"
+
+STAGES = ["fetch", "structure", "visual", "landing", "crew"]
+
+
+def stage_functions() -> Dict[str, Callable[[str], object]]:
+    from ..seo_analysis.tools import SEOAnalysisTools, fetch_page, page_cache
+    from ..worker import run_analysis
+
+    def fetch(url):
+        page_cache.clear()
+        return fetch_page(url)
+
+    def crew(url):
+        page_cache.clear()
+        return run_analysis(url)
+
+    return {
+        "fetch": fetch,
+        "structure": SEOAnalysisTools.analyze_page_structure.run,
+        "visual": SEOAnalysisTools.analyze_visual_elements.run,
+        "landing": SEOAnalysisTools.analyze_landing_page.run,
+        "crew": crew,
+    }
+
+
+def measure(fn: Callable[[str], object], url: str, runs: int) -> dict:
+    # Warm up once, then time untraced runs; tracemalloc slows allocation
+    # down, so peak memory comes from one separate traced run
+    fn(url)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(url)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn(url)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "median_ms": round(1000 * statistics.median(timings), 2),
+        "p95_ms": round(1000 * percentile(timings, 0.95), 2),
+        "per_second": round(len(timings) / sum(timings), 1),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def regressions(results: dict, baseline: dict, max_regression: float) -> list:
+    """Stages whose median latency or peak memory grew past the threshold."""
+    failures = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ("median_ms", "peak_kb"):
+            limit = previous[metric] * (1 + max_regression)
+            if result[metric] > limit:
+                failures.append(
+                    f"{name} {metric}: {result[metric]} > {limit:.1f} "
+                    f"(baseline {previous[metric]})"
+                )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--fixtures", nargs="+", help="Fixture pages to run")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument(
+        "--fixtures-dir", help="Also run every *.html page in this directory"
+    )
+    parser.add_argument(
+        "--llm-latency",
+        type=float,
+        default=0,
+        help="Seconds the fake LLM takes per call",
+    )
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Save the results as the new baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.2,
+        help="Fail when a stage is this much slower or larger than the baseline",
+    )
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    for name, value in BENCHMARK_ENV.items():
+        os.environ.setdefault(name, value)
+
+    from ..seo_analysis.crew import use_llm
+    from .fake_llm import FakeLLM
+    from .stub_site import StubSite, load_fixtures
+
+    fixtures = load_fixtures(args.fixtures_dir)
+    names = args.fixtures or list(fixtures)
+    unknown = set(names) - set(fixtures)
+    if unknown:
+        parser.error(f"unknown fixtures: {', '.join(sorted(unknown))}")
+
+    fake_llm = FakeLLM(latency=args.llm_latency)
+    use_llm(fake_llm)
+    functions = stage_functions()
+    site = StubSite(fixtures).start()
+    results = {}
+    try:
+        for fixture in names:
+            url = site.url(f"/fixtures/{fixture}")
+            for stage in args.stages:
+                result = measure(functions[stage], url, args.runs)
+                results[f"{fixture}/{stage}"] = result
+                print(
+                    f"{fixture:>14} {stage:<10} median {result['median_ms']:9.2f}ms  "
+                    f"p95 {result['p95_ms']:9.2f}ms  {result['per_second']:8.1f}/s  "
+                    f"peak {result['peak_kb']:9.1f}KB"
+                )
+    finally:
+        site.stop()
+        use_llm(None)
+    print(f"({fake_llm.calls} fake LLM calls)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Saved the baseline to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline first")
+        return
+    with open(args.baseline) as f:
+        failures = regressions(results, json.load(f), args.max_regression)
+    if failures:
+        print(f"FAIL: regressions beyond {args.max_regression:.0%} of the baseline")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print(f"OK: within {args.max_regression:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
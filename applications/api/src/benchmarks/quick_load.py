@@ -0,0 +1,199 @@
+"""
+Load test for the quick analysis endpoint: serve a stub site locally, start
+the API in the sync (gunicorn + Flask) and async (uvicorn + ASGI) modes and
+compare how many concurrent quick analyses each one gets through.
+
+    python -m applications.api.src.benchmarks.quick_load --requests 500 --concurrency 200
+
+Every request asks for a different page, so the caches don't hide the
+fetch and parse, and the stub site answers after `--latency` seconds to
+stand in for a remote server.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from ..seo_analysis.metrics import percentile
+from .stub_site import StubSite
+
+REPO_ROOT = Path(__file__).resolve().parents[4]
+
+STARTUP_TIMEOUT = 60
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_command(mode: str, port: int, threads: int) -> list:
+    if mode == "sync":
+        return [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "--workers",
+            "1",
+            "--threads",
+            str(threads),
+            "--bind",
+            f"127.0.0.1:{port}",
+            "applications.api.src.api:create_app()",
+        ]
+    return [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "applications.api.src.asgi:app",
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(port),
+        "--no-access-log",
+    ]
+
+
+def wait_until_healthy(base_url: str, process: subprocess.Popen) -> None:
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The API exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/api/seo/health").status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"The API didn't start within {STARTUP_TIMEOUT}s")
+
+
+async def run_load(
+    base_url: str, site_url: str, requests: int, concurrency: int, offset: int
+) -> dict:
+    latencies = []
+    errors = 0
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(client: httpx.AsyncClient, number: int):
+        nonlocal errors
+        async with limit:
+            start = time.perf_counter()
+            try:
+                response = await client.get(
+                    f"{base_url}/api/seo/analyze-quick",
+                    params={"url": f"{site_url}/page/{number}"},
+                )
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(one(client, offset + number) for number in range(requests))
+        )
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(1000 * statistics.median(latencies), 1),
+        "p95_ms": round(1000 * percentile(latencies, 0.95), 1),
+    }
+
+
+def benchmark_mode(mode: str, site_url: str, args, env: dict, offset: int) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        server_command(mode, port, args.sync_threads),
+        cwd=REPO_ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_healthy(base_url, process)
+        # Warm up (worker processes, imports) before measuring
+        asyncio.run(run_load(base_url, site_url, args.concurrency, 10, offset))
+        return asyncio.run(
+            run_load(
+                base_url,
+                site_url,
+                args.requests,
+                args.concurrency,
+                offset + args.concurrency,
+            )
+        )
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test quick analyses")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--paragraphs", type=int, default=50)
+    parser.add_argument("--sync-threads", type=int, default=8)
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"])
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    site = StubSite(latency=args.latency, paragraphs=args.paragraphs).start()
+    site_url = site.base_url
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            EMBEDDED_WORKERS="0",
+            JOB_STORE_URL=f"sqlite:///{os.path.join(tmp, 'jobs.db')}",
+            LLM_CACHE_PATH="",
+            NLTK_AUTO_DOWNLOAD="false",
+            PAGE_CACHE_TTL="0",
+            QUICK_ANALYSIS_CACHE_TTL="0",
+        )
+        # Each mode gets its own page numbers
+        for idx, mode in enumerate(args.modes):
+            offset = idx * (args.requests + args.concurrency)
+            try:
+                results[mode] = benchmark_mode(mode, site_url, args, env, offset)
+            except RuntimeError as e:
+                print(f"{mode}: {e}")
+                sys.exit(1)
+    site.stop()
+
+    for mode, result in results.items():
+        print(
+            f"{mode:>5}: {result['requests_per_second']:8.1f} req/s  "
+            f"p50 {result['p50_ms']:8.1f}ms  p95 {result['p95_ms']:8.1f}ms  "
+            f"{result['errors']} errors ({result['requests']} requests, "
+            f"{result['concurrency']} concurrent)"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Startup-time benchmark: import the API in fresh interpreters and fail when
+the import is slower than the budget or opens a network connection.
+
+    python -m applications.api.src.benchmarks.startup --budget 5 --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[4]
+
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "5"))
+
+# Runs in the child interpreter; any connection attempt fails the import
+IMPORT_SCRIPT = """
+import json, socket, sys, time
+
+def _no_network(*args, **kwargs):
+    raise RuntimeError("network access while importing the API")
+
+socket.socket.connect = _no_network
+socket.socket.connect_ex = _no_network
+socket.create_connection = _no_network
+
+start = time.perf_counter()
+import applications.api.src.api
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": len(sys.modules)}))
+"""
+
+
+def measure_import(env: dict) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing the API failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API import time")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_SECONDS)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            # Measure the import itself, not worker threads or stray files
+            EMBEDDED_WORKERS="0",
+            JOB_STORE_URL=f"sqlite:///{os.path.join(tmp, 'jobs.db')}",
+            LLM_CACHE_PATH=os.path.join(tmp, "llm_cache.db"),
+            NLTK_AUTO_DOWNLOAD="false",
+        )
+        try:
+            runs = [measure_import(env) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(e)
+            sys.exit(1)
+
+    timings = [run["seconds"] for run in runs]
+    median = statistics.median(timings)
+    print(
+        f"import applications.api.src.api: median {median:.3f}s, "
+        f"min {min(timings):.3f}s, max {max(timings):.3f}s over {args.runs} runs "
+        f"({runs[-1]['modules']} modules loaded)"
+    )
+    if median > args.budget:
+        print(f"FAIL: median import time exceeds the {args.budget:.3f}s budget")
+        sys.exit(1)
+    print(f"OK: within the {args.budget:.3f}s budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Local stub site for the benchmarks: landing page fixtures and images served
+from memory, so nothing touches the network.
+
+    /fixtures/<name>  a page of the fixture corpus (see FIXTURES)
+    /page/<number>    a generated landing page, different for every number
+    /img/<anything>   a PNG image
+"""
+
+import io
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+from PIL import Image
+
+PARAGRAPH = (
+    "<p>Our landing page platform helps marketing teams launch faster. "
+    "Build responsive landing pages, run experiments and measure conversions "
+    "without writing code. Landing page templates load fast on every device.</p>"
+)
+
+# Inline script of roughly 1KB, as bundled by analytics and tag managers
+SCRIPT = (
+    "<script>window.dataLayer=window.dataLayer||[];"
+    + "dataLayer.push({});" * 55
+    + "</script>"
+)
+
+
+def landing_page(
+    title: str,
+    sections: int,
+    images_per_section: int = 1,
+    scripts: int = 0,
+) -> bytes:
+    """A landing page with `sections` headed sections of text and images."""
+    parts = []
+    for i in range(sections):
+        parts.append(f"<section class='benefits grid'><h2>Section {i}</h2>{PARAGRAPH}")
+        parts.extend(
+            f"<img src='/img/{i}-{j}.png' alt='Figure {i}.{j}' width='600' height='400'>"
+            for j in range(images_per_section)
+        )
+        parts.append("</section>")
+    return (
+        "<!DOCTYPE html><html lang='en'><head>"
+        f"<title>{title}</title>"
+        "<meta name='description' content='A stub landing page for benchmarks'>"
+        "<meta name='viewport' content='width=device-width, initial-scale=1'>"
+        "<link rel='stylesheet' href='/static/site.css'>"
+        f"{SCRIPT * scripts}"
+        "</head><body><nav><a href='/'>Home</a></nav><main>"
+        f"<h1>{title}</h1>{''.join(parts)}"
+        "<div class='testimonial'>Our customers love it.</div>"
+        "<a class='cta button' href='/signup'>Get started</a>"
+        "</main><footer class='social share'>Follow us</footer></body></html>"
+    ).encode("utf-8")
+
+
+# Pages covering the shapes that stress different parts of the tools
+FIXTURES: Dict[str, Callable[[], bytes]] = {
+    "small": lambda: landing_page("Small landing page", sections=3),
+    "medium": lambda: landing_page("Medium landing page", sections=60),
+    # Text only: the image probes belong to "image_heavy"
+    "huge": lambda: landing_page(
+        "Huge landing page", sections=4000, images_per_section=0
+    ),
+    "image_heavy": lambda: landing_page(
+        "Image heavy landing page", sections=20, images_per_section=25
+    ),
+    "script_heavy": lambda: landing_page(
+        "Script heavy landing page", sections=20, scripts=500
+    ),
+}
+
+
+def load_fixtures(directory: Optional[str] = None) -> Dict[str, bytes]:
+    """
+    The generated fixtures, plus every `*.html` file in `directory` (e.g.
+    recorded copies of real landing pages), named after the file.
+    """
+    pages = {name: build() for name, build in FIXTURES.items()}
+    if directory:
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith(".html"):
+                with open(os.path.join(directory, filename), "rb") as f:
+                    pages[filename[: -len(".html")]] = f.read()
+    return pages
+
+
+def png_image(width: int = 1200, height: int = 800) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (40, 120, 200)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class StubSite:
+    """Threaded HTTP server for the stub site, answering after `latency` seconds."""
+
+    def __init__(
+        self,
+        fixtures: Optional[Dict[str, bytes]] = None,
+        latency: float = 0,
+        paragraphs: int = 50,
+    ):
+        self.fixtures = fixtures or {}
+        self.latency = latency
+        self.paragraphs = paragraphs
+        self.image = png_image()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def start(self) -> "StubSite":
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                time.sleep(site.latency)
+                found = site.respond(self.path)
+                if found is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                content_type, body = found
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def respond(self, path: str):
+        """(content type, body) for a path, or None if there's nothing there."""
+        path = path.split("?", 1)[0]
+        if path.startswith("/img/"):
+            return "image/png", self.image
+        if path.startswith("/fixtures/"):
+            body = self.fixtures.get(path[len("/fixtures/") :])
+            return None if body is None else ("text/html; charset=utf-8", body)
+        if path.startswith("/page/"):
+            number = path[len("/page/") :]
+            if number.isdigit():
+                page = landing_page(f"Landing page {number}", self.paragraphs)
+                return "text/html; charset=utf-8", page
+        return None
@@ -0,0 +1,1334 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+RESULT_COMPRESSION_LEVEL = 6
+# Jobs deleted per write transaction when expiring results, so readers and
+# workers aren't locked out of the database for long
+EXPIRE_BATCH_SIZE = 500
+# Set on stored results whose "analysis_text" was dropped because it is the
+# same as the output of the last task
+_TEXT_FROM_LAST_TASK = "_analysis_text_from_last_task"
+# Job priorities, most urgent first
+PRIORITIES = ("interactive", "bulk")
+
+
+class JobStore(ABC):
+    """
+    Durable record of analysis jobs, shared by the API and the workers.
+
+    The store doubles as the job queue: workers `claim` the next queued job,
+    which atomically marks it as running so no other worker picks it up.
+    Jobs are plain dicts with the same fields the API has always returned.
+
+    Each job has a priority (see PRIORITIES) and a tenant, the client that
+    queued it. Interactive jobs are claimed before bulk ones, and tenants
+    take turns, so one client's bulk submission doesn't hold up everyone
+    else's jobs (see `_choose_queue`). At most `tenant_max_running` jobs of
+    one tenant, and `bulk_max_running` bulk jobs in all, run at once (0 for
+    no limit); keep the bulk quota below the number of workers to leave
+    room for interactive jobs.
+
+    A claimed job is leased to its worker, which renews the lease with
+    `heartbeat` while the job runs. Jobs whose lease lapses are presumed
+    abandoned by a dead worker and requeued (`requeue_abandoned`); passing
+    `worker` to `complete`, `fail`, `mark_cancelled` and `release` makes
+    them no-ops once the job belongs to someone else.
+
+    Each job also has an append-only log of progress events (status changes
+    and task outputs), numbered from 1, that clients can follow as it grows.
+
+    Results are stored zlib-compressed. Finished jobs are kept until they are
+    expired with `expire` (see `ResultReaper`) or deleted by age of creation.
+
+    `claim` and `wait_for_events` block until a job or event is added through
+    this store instance. Changes made by other processes are only noticed
+    every `recheck_interval` seconds, since there is no cross-process signal
+    to wait on.
+    """
+
+    def __init__(
+        self,
+        recheck_interval: Optional[float] = None,
+        tenant_max_running: int = 0,
+        bulk_max_running: int = 0,
+    ):
+        self.recheck_interval = recheck_interval
+        self.tenant_max_running = tenant_max_running
+        self.bulk_max_running = bulk_max_running
+        self._changed = threading.Condition()
+        self._enqueued = 0
+        self._published = 0
+
+    def create(
+        self,
+        url: str,
+        kind: str = "analysis",
+        params: Optional[Dict[str, Any]] = None,
+        priority: str = "interactive",
+        tenant: str = "",
+    ) -> Dict[str, Any]:
+        """
+        Queue a job. `kind` tells workers what to run: "analysis" (the crew,
+        for `url`) or "batch" (quick analyses of the pages in `params`).
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'")
+        job = _new_job(url, kind, params, priority, tenant)
+        self._insert(job)
+        self.add_event(job["analysis_id"], "status", {"status": job["status"]})
+        with self._changed:
+            self._enqueued += 1
+            self._changed.notify_all()
+        return job
+
+    def claim(
+        self,
+        worker: str,
+        timeout: Optional[float] = None,
+        stop: Optional[threading.Event] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Mark the next queued job as running and return it, waiting up to
+        `timeout` seconds (forever if None) for one to be created. Returns
+        None on timeout, or once `stop` is set and `interrupt` is called.
+        """
+        # Jobs held back by a quota can be claimed once a running job
+        # finishes, which workers record as a status event
+        quotas = bool(self.tenant_max_running or self.bulk_max_running)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while stop is None or not stop.is_set():
+            with self._changed:
+                enqueued = self._enqueued
+                published = self._published
+            job = self._claim_next(worker)
+            if job is not None:
+                return job
+
+            waits = [self.recheck_interval]
+            if deadline is not None:
+                waits.append(deadline - time.monotonic())
+                if waits[-1] <= 0:
+                    return None
+            waits = [wait for wait in waits if wait is not None]
+
+            with self._changed:
+                self._changed.wait_for(
+                    lambda: self._enqueued != enqueued
+                    or (quotas and self._published != published)
+                    or (stop is not None and stop.is_set()),
+                    timeout=min(waits) if waits else None,
+                )
+        return None
+
+    def add_event(self, job_id: str, event: str, data: Dict[str, Any]) -> int:
+        """Append an event to a job's log and return its sequence number."""
+        seq = self._append_event(job_id, event, data)
+        with self._changed:
+            self._published += 1
+            self._changed.notify_all()
+        return seq
+
+    def wait_for_events(
+        self,
+        job_id: str,
+        after: int = 0,
+        timeout: Optional[float] = None,
+        poll_interval: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the events of a job numbered above `after`, waiting up to
+        `timeout` seconds (forever if None) for one to be added. Events added
+        by other processes are looked for every `poll_interval` seconds
+        (default: the store's `recheck_interval`).
+        """
+        if poll_interval is None:
+            poll_interval = self.recheck_interval
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._changed:
+                published = self._published
+            events = self.events(job_id, after)
+            if events:
+                return events
+
+            waits = [poll_interval]
+            if deadline is not None:
+                waits.append(deadline - time.monotonic())
+                if waits[-1] <= 0:
+                    return []
+            waits = [wait for wait in waits if wait is not None]
+
+            with self._changed:
+                self._changed.wait_for(
+                    lambda: self._published != published,
+                    timeout=min(waits) if waits else None,
+                )
+
+    def interrupt(self) -> None:
+        """Wake every thread blocked in `claim` so it can check its stop event."""
+        with self._changed:
+            self._changed.notify_all()
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def status(self, job_id: str) -> Optional[str]:
+        job = self.get(job_id)
+        return job["status"] if job else None
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        """
+        Renew the lease of a job `worker` is running. Returns False if the
+        job is no longer running under that worker, e.g. it was requeued.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete(
+        self,
+        job_id: str,
+        result: Dict[str, Any],
+        metrics: Optional[Dict[str, Any]] = None,
+        worker: Optional[str] = None,
+    ) -> bool:
+        """
+        Store the result of a running job, and the timings recorded while
+        running it. Returns False if it was cancelled, or no longer held by
+        `worker`.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def fail(
+        self,
+        job_id: str,
+        error: str,
+        error_traceback: str,
+        metrics: Optional[Dict[str, Any]] = None,
+        worker: Optional[str] = None,
+    ) -> bool:
+        """
+        Record the error of a running job. Returns False if it was cancelled,
+        or no longer held by `worker`.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        Cancel a job and return its new status: queued jobs become
+        "cancelled" right away, running jobs become "cancelling" until their
+        worker stops. Finished jobs keep their status; None if unknown.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def mark_cancelled(self, job_id: str, worker: Optional[str] = None) -> None:
+        """Called by a worker once it has stopped a "cancelling" job."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def release(self, job_id: str, worker: Optional[str] = None) -> None:
+        """Give an unfinished job back to the queue (or finish its cancellation)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def requeue_abandoned(self, renewed_before: float) -> int:
+        """
+        Put jobs whose lease was last renewed before `renewed_before` back in
+        the queue: their worker is presumed dead.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_created_before(self, cutoff: float) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def expire(
+        self, finished_before: Optional[float] = None, keep: Optional[int] = None
+    ) -> int:
+        """
+        Delete finished jobs, with their events: those that finished before
+        `finished_before`, then the oldest ones beyond the `keep` most
+        recently finished. Queued and running jobs are never deleted.
+        Returns the number of jobs deleted.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self, status: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def finished_metrics(
+        self,
+        after: float,
+        after_id: str = "",
+        before: Optional[float] = None,
+        limit: int = 500,
+    ) -> List[Dict[str, Any]]:
+        """
+        Jobs with stored metrics that finished after (`after`, `after_id`)
+        and before `before`, in (completion time, id) order. Each entry has
+        the job's analysis_id, kind, status, completed_at and metrics.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def queue_waits(self, limit: int = 100) -> List[float]:
+        """Seconds that the `limit` most recently started jobs waited in the queue."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def oldest_queued_at(self) -> Optional[float]:
+        """Creation time of the job that has been queued the longest."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def run_durations(self, limit: int = 100) -> List[float]:
+        """Seconds that the `limit` most recently completed jobs ran."""
+        raise NotImplementedError
+
+    def jobs_ahead(self, job: Dict[str, Any]) -> int:
+        """
+        Estimated number of queued jobs that will be claimed before `job`:
+        every queued job of a higher priority, the tenant's own older jobs of
+        the same priority, and the turns other tenants get before this one's
+        turn comes. Jobs queued later at a higher priority can still go first.
+        """
+        higher, own, others = self._queue_counts(job)
+        return higher + own + sum(min(count, own) for count in others)
+
+    @abstractmethod
+    def _queue_counts(self, job: Dict[str, Any]) -> Tuple[int, int, List[int]]:
+        """
+        For a queued job: the number of queued jobs of a higher priority,
+        those of its tenant and priority created before it, and the number
+        of queued jobs of its priority of every other tenant.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """Events of a job numbered above `after`, oldest first."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_fingerprint(self, url: str) -> Optional[Dict[str, Any]]:
+        """The fingerprint saved by the last completed analysis of `url`."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_fingerprint(self, url: str, fingerprint: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _insert(self, job: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _append_event(self, job_id: str, event: str, data: Dict[str, Any]) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _claim_next(self, worker: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+def _pack_result(result: Dict[str, Any]) -> bytes:
+    tasks = result.get("tasks") or []
+    if tasks and result.get("analysis_text") == tasks[-1].get("task_output"):
+        result = {key: value for key, value in result.items() if key != "analysis_text"}
+        result[_TEXT_FROM_LAST_TASK] = True
+    payload = json.dumps(result).encode("utf-8")
+    return zlib.compress(payload, RESULT_COMPRESSION_LEVEL)
+
+
+def _unpack_result(data: Any) -> Dict[str, Any]:
+    # Results stored before compression are plain JSON text
+    if isinstance(data, bytes):
+        data = zlib.decompress(data)
+    result = json.loads(data)
+    if result.pop(_TEXT_FROM_LAST_TASK, False):
+        result["analysis_text"] = result["tasks"][-1]["task_output"]
+    return result
+
+
+def _dump_metrics(metrics: Optional[Dict[str, Any]]) -> Optional[str]:
+    return json.dumps(metrics) if metrics is not None else None
+
+
+def _new_event(seq: int, event: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    return {"seq": seq, "event": event, "data": data, "created_at": time.time()}
+
+
+def _choose_queue(
+    heads: Dict[Tuple[str, str], float],
+    running: Dict[str, int],
+    last_started: Dict[str, float],
+    bulk_running: int,
+    tenant_max_running: int,
+    bulk_max_running: int,
+) -> Optional[Tuple[str, str]]:
+    """
+    Pick the (tenant, priority) queue whose oldest job is claimed next.
+
+    `heads` maps every non-empty queue to the creation time of its oldest
+    job; `running` and `last_started` hold each tenant's running jobs and
+    the time its last job started. Tenants at their quota are skipped, and
+    so are bulk queues while bulk jobs fill theirs. Of the rest, a higher
+    priority goes first, then the tenant with the fewest running jobs, then
+    the one that waited longest for its last turn, then the oldest job.
+    """
+    eligible = [
+        (tenant, priority)
+        for tenant, priority in heads
+        if not (tenant_max_running and running.get(tenant, 0) >= tenant_max_running)
+        and not (
+            priority == "bulk" and bulk_max_running and bulk_running >= bulk_max_running
+        )
+    ]
+    if not eligible:
+        return None
+    return min(
+        eligible,
+        key=lambda queue: (
+            PRIORITIES.index(queue[1]),
+            running.get(queue[0], 0),
+            last_started.get(queue[0]) or 0,
+            heads[queue],
+        ),
+    )
+
+
+def _new_job(
+    url: str,
+    kind: str = "analysis",
+    params: Optional[Dict[str, Any]] = None,
+    priority: str = "interactive",
+    tenant: str = "",
+) -> Dict[str, Any]:
+    return {
+        "analysis_id": str(uuid.uuid4()),
+        "url": url,
+        "kind": kind,
+        "params": params,
+        "priority": priority,
+        "tenant": tenant,
+        "status": "queued",
+        "created_at": time.time(),
+        "started_at": None,
+        "heartbeat_at": None,
+        "completed_at": None,
+        "worker": None,
+        "result": None,
+        "error": None,
+        "error_traceback": None,
+        "metrics": None,
+    }
+
+
+class MemoryJobStore(JobStore):
+    """In-process store; jobs are lost on restart and invisible to other processes."""
+
+    def __init__(self, tenant_max_running: int = 0, bulk_max_running: int = 0):
+        super().__init__(
+            tenant_max_running=tenant_max_running, bulk_max_running=bulk_max_running
+        )
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._events: Dict[str, List[Dict[str, Any]]] = {}
+        # url -> (saved at, fingerprint), oldest first
+        self._fingerprints: "OrderedDict[str, tuple]" = OrderedDict()
+        # analysis_id -> url of the fingerprint the analysis saved
+        self._fingerprint_urls: Dict[str, str] = {}
+        # Finished jobs in the order they finished, for `expire`
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _insert(self, job):
+        with self._lock:
+            self._jobs[job["analysis_id"]] = dict(job)
+
+    def _claim_next(self, worker):
+        with self._lock:
+            # The oldest job of every (tenant, priority) queue
+            heads: Dict[Tuple[str, str], Dict[str, Any]] = {}
+            running: Dict[str, int] = {}
+            last_started: Dict[str, float] = {}
+            bulk_running = 0
+            for job in self._jobs.values():
+                tenant = job["tenant"]
+                if job["status"] == "queued":
+                    queue = (tenant, job["priority"])
+                    if (
+                        queue not in heads
+                        or job["created_at"] < heads[queue]["created_at"]
+                    ):
+                        heads[queue] = job
+                elif job["status"] in ("running", "cancelling"):
+                    running[tenant] = running.get(tenant, 0) + 1
+                    bulk_running += job["priority"] == "bulk"
+                if job["started_at"] and job["started_at"] > last_started.get(
+                    tenant, 0
+                ):
+                    last_started[tenant] = job["started_at"]
+
+            queue = _choose_queue(
+                {queue: job["created_at"] for queue, job in heads.items()},
+                running,
+                last_started,
+                bulk_running,
+                self.tenant_max_running,
+                self.bulk_max_running,
+            )
+            if queue is None:
+                return None
+            job = heads[queue]
+            now = time.time()
+            job.update(
+                status="running", started_at=now, heartbeat_at=now, worker=worker
+            )
+            return dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+        if job["result"] is not None:
+            job["result"] = _unpack_result(job["result"])
+        return job
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job["status"] if job else None
+
+    def _finish_job(self, job: Dict[str, Any], **fields) -> None:
+        # Called with the lock held
+        job.update(fields, completed_at=time.time())
+        self._finished[job["analysis_id"]] = job["completed_at"]
+
+    def _held(self, job_id: str, worker: Optional[str]) -> Optional[Dict[str, Any]]:
+        # Called with the lock held: the job, unless another worker holds it
+        job = self._jobs.get(job_id)
+        if job is None or (worker is not None and job["worker"] != worker):
+            return None
+        return job
+
+    def _finish(self, job_id, worker, **fields):
+        with self._lock:
+            job = self._held(job_id, worker)
+            if job is None or job["status"] != "running":
+                return False
+            self._finish_job(job, **fields)
+            return True
+
+    def heartbeat(self, job_id, worker):
+        with self._lock:
+            job = self._held(job_id, worker)
+            if job is None or job["status"] not in ("running", "cancelling"):
+                return False
+            job["heartbeat_at"] = time.time()
+            return True
+
+    def complete(self, job_id, result, metrics=None, worker=None):
+        return self._finish(
+            job_id,
+            worker,
+            status="completed",
+            result=_pack_result(result),
+            metrics=metrics,
+        )
+
+    def fail(self, job_id, error, error_traceback, metrics=None, worker=None):
+        return self._finish(
+            job_id,
+            worker,
+            status="failed",
+            error=error,
+            error_traceback=error_traceback,
+            metrics=metrics,
+        )
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] == "queued":
+                self._finish_job(job, status="cancelled")
+            elif job["status"] == "running":
+                job["status"] = "cancelling"
+            return job["status"]
+
+    def mark_cancelled(self, job_id, worker=None):
+        with self._lock:
+            job = self._held(job_id, worker)
+            if job is not None and job["status"] == "cancelling":
+                self._finish_job(job, status="cancelled")
+
+    def _release_job(self, job: Dict[str, Any]) -> None:
+        # Called with the lock held
+        if job["status"] == "running":
+            job.update(status="queued", started_at=None, heartbeat_at=None, worker=None)
+        elif job["status"] == "cancelling":
+            self._finish_job(job, status="cancelled")
+
+    def release(self, job_id, worker=None):
+        with self._lock:
+            job = self._held(job_id, worker)
+            if job is not None:
+                self._release_job(job)
+
+    def requeue_abandoned(self, renewed_before):
+        with self._lock:
+            abandoned = [
+                job
+                for job in self._jobs.values()
+                if job["status"] in ("running", "cancelling")
+                and (job["heartbeat_at"] or job["started_at"]) < renewed_before
+            ]
+            for job in abandoned:
+                self._release_job(job)
+        return len(abandoned)
+
+    def _delete(self, job_id: str) -> None:
+        # Called with the lock held
+        del self._jobs[job_id]
+        self._events.pop(job_id, None)
+        self._finished.pop(job_id, None)
+        # Its fingerprint would point at a job that is gone
+        url = self._fingerprint_urls.get(job_id)
+        if url is not None:
+            self._drop_fingerprint(url)
+
+    def _drop_fingerprint(self, url: str) -> None:
+        # Called with the lock held
+        saved = self._fingerprints.pop(url, None)
+        if saved is not None:
+            self._fingerprint_urls.pop(saved[1].get("analysis_id"), None)
+
+    def delete_created_before(self, cutoff):
+        with self._lock:
+            expired = [
+                job_id
+                for job_id, job in self._jobs.items()
+                if job["created_at"] < cutoff
+            ]
+            for job_id in expired:
+                self._delete(job_id)
+            return len(expired)
+
+    def expire(self, finished_before=None, keep=None):
+        deleted = 0
+        with self._lock:
+            # Oldest first, so this stops at the first job that is kept
+            while self._finished:
+                job_id, completed_at = next(iter(self._finished.items()))
+                expired = finished_before is not None and completed_at < finished_before
+                if not expired and (keep is None or len(self._finished) <= keep):
+                    break
+                self._delete(job_id)
+                deleted += 1
+            # Fingerprints saved before the cutoff point at expired jobs
+            while finished_before is not None and self._fingerprints:
+                url, (saved_at, _) = next(iter(self._fingerprints.items()))
+                if saved_at >= finished_before:
+                    break
+                self._drop_fingerprint(url)
+        return deleted
+
+    def count(self, status=None):
+        with self._lock:
+            if status is None:
+                return len(self._jobs)
+            return sum(1 for job in self._jobs.values() if job["status"] == status)
+
+    def finished_metrics(self, after, after_id="", before=None, limit=500):
+        with self._lock:
+            jobs = [
+                self._jobs[job_id]
+                for job_id, completed_at in self._finished.items()
+                if (completed_at, job_id) > (after, after_id)
+                and (before is None or completed_at < before)
+                and self._jobs[job_id]["metrics"] is not None
+            ]
+            jobs.sort(key=lambda job: (job["completed_at"], job["analysis_id"]))
+            fields = ("analysis_id", "kind", "status", "completed_at", "metrics")
+            return [{key: job[key] for key in fields} for job in jobs[:limit]]
+
+    def queue_waits(self, limit=100):
+        with self._lock:
+            started = [job for job in self._jobs.values() if job["started_at"]]
+        started.sort(key=lambda job: job["started_at"], reverse=True)
+        return [job["started_at"] - job["created_at"] for job in started[:limit]]
+
+    def oldest_queued_at(self):
+        with self._lock:
+            return min(
+                (
+                    job["created_at"]
+                    for job in self._jobs.values()
+                    if job["status"] == "queued"
+                ),
+                default=None,
+            )
+
+    def run_durations(self, limit=100):
+        with self._lock:
+            completed = [
+                job for job in self._jobs.values() if job["status"] == "completed"
+            ]
+        completed.sort(key=lambda job: job["completed_at"], reverse=True)
+        return [job["completed_at"] - job["started_at"] for job in completed[:limit]]
+
+    def _queue_counts(self, job):
+        rank = PRIORITIES.index(job["priority"])
+        higher = own = 0
+        others: Dict[str, int] = {}
+        with self._lock:
+            for other in self._jobs.values():
+                if (
+                    other["status"] != "queued"
+                    or other["analysis_id"] == job["analysis_id"]
+                ):
+                    continue
+                other_rank = PRIORITIES.index(other["priority"])
+                if other_rank < rank:
+                    higher += 1
+                elif other_rank > rank:
+                    continue
+                elif other["tenant"] != job["tenant"]:
+                    others[other["tenant"]] = others.get(other["tenant"], 0) + 1
+                elif other["created_at"] < job["created_at"]:
+                    own += 1
+        return higher, own, list(others.values())
+
+    def events(self, job_id, after=0):
+        with self._lock:
+            log = self._events.get(job_id, [])
+            # Sequence numbers start at 1 and have no gaps
+            return [dict(event) for event in log[max(after, 0) :]]
+
+    def get_fingerprint(self, url):
+        with self._lock:
+            saved = self._fingerprints.get(url)
+            return dict(saved[1]) if saved else None
+
+    def save_fingerprint(self, url, fingerprint):
+        with self._lock:
+            self._drop_fingerprint(url)
+            self._fingerprints[url] = (time.time(), dict(fingerprint))
+            if fingerprint.get("analysis_id"):
+                self._fingerprint_urls[fingerprint["analysis_id"]] = url
+
+    def _append_event(self, job_id, event, data):
+        with self._lock:
+            log = self._events.setdefault(job_id, [])
+            log.append(_new_event(len(log) + 1, event, data))
+            return len(log)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    SQLite-backed store that survives restarts and is shared by every process
+    pointing at the same database file.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            analysis_id TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            completed_at REAL,
+            worker TEXT,
+            result TEXT,
+            error TEXT,
+            error_traceback TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status_created_at
+            ON jobs (status, created_at);
+        CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at);
+        CREATE INDEX IF NOT EXISTS jobs_completed_at ON jobs (completed_at);
+        CREATE INDEX IF NOT EXISTS jobs_started_at ON jobs (started_at);
+        CREATE TABLE IF NOT EXISTS job_events (
+            analysis_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (analysis_id, seq)
+        );
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            url TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            analysis_id TEXT
+        );
+        CREATE INDEX IF NOT EXISTS fingerprints_updated_at
+            ON fingerprints (updated_at);
+    """
+
+    # Columns added after the first release: (name, definition)
+    MIGRATIONS = [
+        ("kind", "TEXT NOT NULL DEFAULT 'analysis'"),
+        ("params", "TEXT"),
+        ("metrics", "TEXT"),
+        ("priority", "TEXT NOT NULL DEFAULT 'interactive'"),
+        ("tenant", "TEXT NOT NULL DEFAULT ''"),
+        ("heartbeat_at", "REAL"),
+    ]
+    # Indexes on migrated columns, created once the columns exist
+    MIGRATION_INDEXES = """
+        CREATE INDEX IF NOT EXISTS jobs_queue
+            ON jobs (status, tenant, priority, created_at);
+        CREATE INDEX IF NOT EXISTS jobs_tenant_started_at
+            ON jobs (tenant, started_at);
+        CREATE INDEX IF NOT EXISTS fingerprints_analysis_id
+            ON fingerprints (analysis_id);
+    """
+
+    def __init__(
+        self,
+        path: str,
+        recheck_interval: Optional[float] = 5,
+        tenant_max_running: int = 0,
+        bulk_max_running: int = 0,
+    ):
+        super().__init__(recheck_interval, tenant_max_running, bulk_max_running)
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(self.SCHEMA)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        conn = self._connection()
+        # Several processes may open an old database at once; the write lock
+        # makes sure only one of them adds each column
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, definition in self.MIGRATIONS:
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+            # Fingerprints name their analysis, so they go when it is deleted
+            columns = {
+                row["name"] for row in conn.execute("PRAGMA table_info(fingerprints)")
+            }
+            if "analysis_id" not in columns:
+                conn.execute("ALTER TABLE fingerprints ADD COLUMN analysis_id TEXT")
+                conn.execute(
+                    "UPDATE fingerprints "
+                    "SET analysis_id = json_extract(data, '$.analysis_id')"
+                )
+            # Failed jobs used to be stored without a completion time, which
+            # `expire` goes by
+            conn.execute(
+                "UPDATE jobs SET completed_at = COALESCE(started_at, created_at) "
+                "WHERE status = 'failed' AND completed_at IS NULL"
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.executescript(self.MIGRATION_INDEXES)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_job(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        if job["result"] is not None:
+            job["result"] = _unpack_result(job["result"])
+        for field in ("params", "metrics"):
+            if job[field] is not None:
+                job[field] = json.loads(job[field])
+        return job
+
+    def _insert(self, job):
+        self._connection().execute(
+            "INSERT INTO jobs (analysis_id, url, kind, params, priority, tenant, "
+            "status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                job["analysis_id"],
+                job["url"],
+                job["kind"],
+                json.dumps(job["params"]) if job["params"] is not None else None,
+                job["priority"],
+                job["tenant"],
+                job["status"],
+                job["created_at"],
+            ),
+        )
+
+    def _claim_next(self, worker):
+        conn = self._connection()
+        # IMMEDIATE takes the write lock up front so two workers can't both
+        # read the same queued row before either marks it as running
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._next_queued(conn)
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, "
+                "heartbeat_at = ?, worker = ? WHERE analysis_id = ?",
+                (now, now, worker, row["analysis_id"]),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["analysis_id"])
+
+    def _next_queued(self, conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+        # Only the oldest job of each (tenant, priority) queue and per-tenant
+        # totals are read, not the whole queue
+        heads = {
+            (row["tenant"], row["priority"]): row["created_at"]
+            for row in conn.execute(
+                "SELECT tenant, priority, MIN(created_at) AS created_at FROM jobs "
+                "WHERE status = 'queued' GROUP BY tenant, priority"
+            )
+        }
+        if not heads:
+            return None
+        running = {}
+        bulk_running = 0
+        for row in conn.execute(
+            "SELECT tenant, COUNT(*) AS jobs, SUM(priority = 'bulk') AS bulk "
+            "FROM jobs WHERE status IN ('running', 'cancelling') GROUP BY tenant"
+        ):
+            running[row["tenant"]] = row["jobs"]
+            bulk_running += row["bulk"]
+        tenants = sorted({tenant for tenant, _ in heads})
+        last_started = {
+            row["tenant"]: row["started_at"]
+            for row in conn.execute(
+                "SELECT tenant, MAX(started_at) AS started_at FROM jobs "
+                f"WHERE tenant IN ({', '.join('?' * len(tenants))}) GROUP BY tenant",
+                tenants,
+            )
+        }
+        queue = _choose_queue(
+            heads,
+            running,
+            last_started,
+            bulk_running,
+            self.tenant_max_running,
+            self.bulk_max_running,
+        )
+        if queue is None:
+            return None
+        return conn.execute(
+            "SELECT analysis_id FROM jobs WHERE status = 'queued' "
+            "AND tenant = ? AND priority = ? ORDER BY created_at LIMIT 1",
+            queue,
+        ).fetchone()
+
+    def get(self, job_id):
+        row = (
+            self._connection()
+            .execute("SELECT * FROM jobs WHERE analysis_id = ?", (job_id,))
+            .fetchone()
+        )
+        return self._to_job(row)
+
+    def status(self, job_id):
+        row = (
+            self._connection()
+            .execute("SELECT status FROM jobs WHERE analysis_id = ?", (job_id,))
+            .fetchone()
+        )
+        return row["status"] if row else None
+
+    @staticmethod
+    def _held_by(worker: Optional[str]) -> Tuple[str, tuple]:
+        # Condition and parameters that skip jobs held by another worker
+        if worker is None:
+            return "", ()
+        return " AND worker = ?", (worker,)
+
+    def heartbeat(self, job_id, worker):
+        cursor = self._connection().execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE analysis_id = ? AND worker = ? "
+            "AND status IN ('running', 'cancelling')",
+            (time.time(), job_id, worker),
+        )
+        return cursor.rowcount > 0
+
+    def complete(self, job_id, result, metrics=None, worker=None):
+        held, held_params = self._held_by(worker)
+        cursor = self._connection().execute(
+            "UPDATE jobs SET status = 'completed', result = ?, metrics = ?, "
+            "completed_at = ? WHERE analysis_id = ? AND status = 'running'" + held,
+            (_pack_result(result), _dump_metrics(metrics), time.time(), job_id)
+            + held_params,
+        )
+        return cursor.rowcount > 0
+
+    def fail(self, job_id, error, error_traceback, metrics=None, worker=None):
+        held, held_params = self._held_by(worker)
+        cursor = self._connection().execute(
+            "UPDATE jobs SET status = 'failed', error = ?, error_traceback = ?, "
+            "metrics = ?, completed_at = ? "
+            "WHERE analysis_id = ? AND status = 'running'" + held,
+            (error, error_traceback, _dump_metrics(metrics), time.time(), job_id)
+            + held_params,
+        )
+        return cursor.rowcount > 0
+
+    def cancel(self, job_id):
+        conn = self._connection()
+        if conn.execute(
+            "UPDATE jobs SET status = 'cancelled', completed_at = ? "
+            "WHERE analysis_id = ? AND status = 'queued'",
+            (time.time(), job_id),
+        ).rowcount:
+            return "cancelled"
+        if conn.execute(
+            "UPDATE jobs SET status = 'cancelling' "
+            "WHERE analysis_id = ? AND status = 'running'",
+            (job_id,),
+        ).rowcount:
+            return "cancelling"
+        return self.status(job_id)
+
+    def mark_cancelled(self, job_id, worker=None):
+        held, held_params = self._held_by(worker)
+        self._connection().execute(
+            "UPDATE jobs SET status = 'cancelled', completed_at = ? "
+            "WHERE analysis_id = ? AND status = 'cancelling'" + held,
+            (time.time(), job_id) + held_params,
+        )
+
+    def release(self, job_id, worker=None):
+        held, held_params = self._held_by(worker)
+        conn = self._connection()
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', started_at = NULL, "
+            "heartbeat_at = NULL, worker = NULL "
+            "WHERE analysis_id = ? AND status = 'running'" + held,
+            (job_id,) + held_params,
+        )
+        self.mark_cancelled(job_id, worker)
+
+    def requeue_abandoned(self, renewed_before):
+        conn = self._connection()
+        # Jobs claimed before leases were renewed only have a start time
+        requeued = conn.execute(
+            "UPDATE jobs SET status = 'queued', started_at = NULL, "
+            "heartbeat_at = NULL, worker = NULL WHERE status = 'running' "
+            "AND COALESCE(heartbeat_at, started_at) < ?",
+            (renewed_before,),
+        ).rowcount
+        cancelled = conn.execute(
+            "UPDATE jobs SET status = 'cancelled', completed_at = ? "
+            "WHERE status = 'cancelling' "
+            "AND COALESCE(heartbeat_at, started_at) < ?",
+            (time.time(), renewed_before),
+        ).rowcount
+        return requeued + cancelled
+
+    def delete_created_before(self, cutoff):
+        conn = self._connection()
+        conn.execute(
+            "DELETE FROM job_events WHERE analysis_id IN "
+            "(SELECT analysis_id FROM jobs WHERE created_at < ?)",
+            (cutoff,),
+        )
+        conn.execute(
+            "DELETE FROM fingerprints WHERE analysis_id IN "
+            "(SELECT analysis_id FROM jobs WHERE created_at < ?)",
+            (cutoff,),
+        )
+        cursor = conn.execute("DELETE FROM jobs WHERE created_at < ?", (cutoff,))
+        return cursor.rowcount
+
+    def expire(self, finished_before=None, keep=None):
+        conn = self._connection()
+        deleted = 0
+        if finished_before is not None:
+            deleted += self._delete_finished_before(conn, finished_before)
+            conn.execute(
+                "DELETE FROM fingerprints WHERE updated_at < ?", (finished_before,)
+            )
+        if keep:
+            # Completion time of the oldest job that is kept
+            row = conn.execute(
+                "SELECT completed_at FROM jobs WHERE completed_at IS NOT NULL "
+                "ORDER BY completed_at DESC LIMIT 1 OFFSET ?",
+                (keep - 1,),
+            ).fetchone()
+            if row is not None:
+                deleted += self._delete_finished_before(conn, row["completed_at"])
+        return deleted
+
+    def _delete_finished_before(self, conn: sqlite3.Connection, cutoff: float) -> int:
+        # Walks the completed_at index, so only expired rows are read
+        deleted = 0
+        while True:
+            job_ids = [
+                row["analysis_id"]
+                for row in conn.execute(
+                    "SELECT analysis_id FROM jobs WHERE completed_at < ? "
+                    "ORDER BY completed_at LIMIT ?",
+                    (cutoff, EXPIRE_BATCH_SIZE),
+                )
+            ]
+            if not job_ids:
+                return deleted
+            placeholders = ", ".join("?" * len(job_ids))
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    f"DELETE FROM job_events WHERE analysis_id IN ({placeholders})",
+                    job_ids,
+                )
+                conn.execute(
+                    f"DELETE FROM fingerprints WHERE analysis_id IN ({placeholders})",
+                    job_ids,
+                )
+                deleted += conn.execute(
+                    f"DELETE FROM jobs WHERE analysis_id IN ({placeholders})",
+                    job_ids,
+                ).rowcount
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            if len(job_ids) < EXPIRE_BATCH_SIZE:
+                return deleted
+
+    def count(self, status=None):
+        conn = self._connection()
+        if status is None:
+            return conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        return conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)
+        ).fetchone()[0]
+
+    def finished_metrics(self, after, after_id="", before=None, limit=500):
+        rows = self._connection().execute(
+            "SELECT analysis_id, kind, status, completed_at, metrics FROM jobs "
+            "WHERE completed_at >= ? AND completed_at < ? AND metrics IS NOT NULL "
+            "AND (completed_at > ? OR analysis_id > ?) "
+            "ORDER BY completed_at, analysis_id LIMIT ?",
+            (
+                after,
+                float("inf") if before is None else before,
+                after,
+                after_id,
+                limit,
+            ),
+        )
+        return [{**dict(row), "metrics": json.loads(row["metrics"])} for row in rows]
+
+    def queue_waits(self, limit=100):
+        rows = self._connection().execute(
+            "SELECT started_at - created_at FROM jobs WHERE started_at IS NOT NULL "
+            "ORDER BY started_at DESC LIMIT ?",
+            (limit,),
+        )
+        return [row[0] for row in rows]
+
+    def oldest_queued_at(self):
+        row = (
+            self._connection()
+            .execute(
+                "SELECT created_at FROM jobs WHERE status = 'queued' "
+                "ORDER BY created_at LIMIT 1"
+            )
+            .fetchone()
+        )
+        return row["created_at"] if row else None
+
+    def run_durations(self, limit=100):
+        rows = self._connection().execute(
+            "SELECT completed_at - started_at FROM jobs WHERE status = 'completed' "
+            "ORDER BY completed_at DESC LIMIT ?",
+            (limit,),
+        )
+        return [row[0] for row in rows]
+
+    def _queue_counts(self, job):
+        conn = self._connection()
+        rank = PRIORITIES.index(job["priority"])
+        higher = 0
+        if rank:
+            higher = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' "
+                f"AND priority IN ({', '.join('?' * rank)})",
+                PRIORITIES[:rank],
+            ).fetchone()[0]
+        own = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND tenant = ? "
+            "AND priority = ? AND created_at < ?",
+            (job["tenant"], job["priority"], job["created_at"]),
+        ).fetchone()[0]
+        others = [
+            row[0]
+            for row in conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND priority = ? "
+                "AND tenant != ? GROUP BY tenant",
+                (job["priority"], job["tenant"]),
+            )
+        ]
+        return higher, own, others
+
+    def events(self, job_id, after=0):
+        rows = self._connection().execute(
+            "SELECT seq, event, data, created_at FROM job_events "
+            "WHERE analysis_id = ? AND seq > ? ORDER BY seq",
+            (job_id, after),
+        )
+        return [
+            {
+                "seq": row["seq"],
+                "event": row["event"],
+                "data": json.loads(row["data"]),
+                "created_at": row["created_at"],
+            }
+            for row in rows
+        ]
+
+    def get_fingerprint(self, url):
+        row = (
+            self._connection()
+            .execute("SELECT data FROM fingerprints WHERE url = ?", (url,))
+            .fetchone()
+        )
+        return json.loads(row["data"]) if row else None
+
+    def save_fingerprint(self, url, fingerprint):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO fingerprints (url, data, updated_at, analysis_id) "
+            "VALUES (?, ?, ?, ?)",
+            (url, json.dumps(fingerprint), time.time(), fingerprint.get("analysis_id")),
+        )
+
+    def _append_event(self, job_id, event, data):
+        conn = self._connection()
+        # Take the write lock before reading the last number so concurrent
+        # writers can't pick the same one
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            (seq,) = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events "
+                "WHERE analysis_id = ?",
+                (job_id,),
+            ).fetchone()
+            conn.execute(
+                "INSERT INTO job_events (analysis_id, seq, event, data, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (job_id, seq, event, json.dumps(data), time.time()),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return seq
+
+
+class ResultReaper:
+    """
+    Background thread that expires finished jobs every `interval` seconds:
+    those finished more than `ttl` seconds ago, and the oldest ones beyond
+    the `max_results` most recent. Either limit can be None to disable it.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        ttl: Optional[float],
+        max_results: Optional[int] = None,
+        interval: float = 300,
+    ):
+        self.store = store
+        self.ttl = ttl
+        self.max_results = max_results
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "ResultReaper":
+        if self.ttl is None and self.max_results is None:
+            return self
+        self._thread = threading.Thread(
+            target=self._run, name="result-reaper", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run_once(self) -> int:
+        finished_before = None if self.ttl is None else time.time() - self.ttl
+        return self.store.expire(finished_before, self.max_results)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                removed = self.run_once()
+                if removed:
+                    print(f"Expired {removed} finished analyses")
+            except Exception as e:
+                print(f"Error expiring finished analyses: {str(e)}")
+            if self._stopping.wait(self.interval):
+                return
+
+
+def create_job_store(
+    url: str,
+    recheck_interval: float = 5,
+    tenant_max_running: int = 0,
+    bulk_max_running: int = 0,
+) -> JobStore:
+    """
+    Build a job store from a URL: `sqlite:///path/to/jobs.db` (the default
+    backend) or `memory://` for a single-process, non-durable store. Every
+    process sharing a store should use the same quotas.
+    """
+    if url.startswith("memory://"):
+        return MemoryJobStore(tenant_max_running, bulk_max_running)
+    if url.startswith("sqlite:///"):
+        return SQLiteJobStore(
+            url[len("sqlite:///") :],
+            recheck_interval,
+            tenant_max_running,
+            bulk_max_running,
+        )
+    raise ValueError(f"Unsupported job store URL: {url}")
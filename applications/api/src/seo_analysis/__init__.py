@@ -1,14 +1,27 @@
-from .crew import (
-    landing_page_specialist,
-    visual_content_analyst,
-    create_seo_analysis_crew,
-    SEOAnalysisTools,
-)
-from .tools import SEOAnalysisTools
+# Nothing is imported eagerly: the extraction pool's processes import
+# submodules of this package and shouldn't load crewai along with it
+
+
+def __getattr__(name):
+    if name == "create_seo_analysis_crew":
+        from .crew import create_seo_analysis_crew
+
+        return create_seo_analysis_crew
+    if name == "SEOAnalysisTools":
+        from .tools import SEOAnalysisTools
+
+        return SEOAnalysisTools
+    # The agents are built on first access, not when the package is imported
+    if name in ("landing_page_specialist", "visual_content_analyst"):
+        from . import crew
+
+        return getattr(crew, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
-    create_seo_analysis_crew,
-    landing_page_specialist,
-    visual_content_analyst,
-    SEOAnalysisTools,
+    "create_seo_analysis_crew",
+    "landing_page_specialist",
+    "visual_content_analyst",
+    "SEOAnalysisTools",
 ]
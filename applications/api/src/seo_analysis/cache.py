@@ -0,0 +1,228 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from .extract import decode_html
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL so equivalent spellings share one cache key."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    # The fragment never reaches the server, so it must not split the cache
+    return urlunsplit((scheme, host, path, parts.query, ""))
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into a single execution."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """
+    `SingleFlight` for coroutines: concurrent awaits for the same key share
+    one execution. Use one instance per event loop.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is not None:
+            # A cancelled follower must not cancel the shared call
+            return await asyncio.shield(call)
+
+        call = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        except BaseException as e:
+            call.set_exception(e)
+            # Mark the error as retrieved in case nobody else was waiting
+            call.exception()
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+
+@dataclass
+class CachedPage:
+    """A fetched and extracted page plus the validators needed to revalidate it."""
+
+    url: str
+    body: bytes
+    encoding: Optional[str]
+    facts: Any
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+    # The `analyze_page_structure` result, computed along with the facts
+    structure_analysis: Optional[Dict[str, Any]] = None
+    # Whether the body was cut short at the page size limit
+    truncated: bool = False
+
+    @property
+    def html(self) -> str:
+        return decode_html(self.body, self.encoding)
+
+
+@dataclass
+class CachedAnalysis:
+    """A result computed from a page, with an ETag for HTTP responses."""
+
+    url: str
+    result: Dict[str, Any]
+    etag: str
+    fetched_at: float = 0.0
+
+
+def _entry_bytes(entry: Any) -> int:
+    body = getattr(entry, "body", None)
+    return len(body) if body is not None else 0
+
+
+class PageCache:
+    """
+    Size-bounded LRU cache of fetched pages keyed by normalized URL.
+
+    At most `max_entries` entries are kept, and with `max_bytes` set, the
+    least recently used pages are also evicted once their bodies add up to
+    more than that (the newest entry is always kept).
+
+    Entries are served as-is for `ttl` seconds. After that they are kept
+    (until evicted) so the loader can revalidate them with a conditional GET
+    instead of downloading and parsing the page again.
+
+    Any entry with a `fetched_at` timestamp can be cached, e.g. a
+    `CachedAnalysis` of the page.
+    """
+
+    def __init__(
+        self, ttl: float = 900, max_entries: int = 128, max_bytes: Optional[int] = None
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        # Total size of the cached page bodies
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight = SingleFlight()
+
+    def get(self, url: str, load: Callable[[str, Optional[Any]], Any]) -> Any:
+        """
+        Return the cached page for `url`, calling `load(url, stale_entry)` when
+        it is missing or older than the TTL. Concurrent misses share one load.
+        """
+        key = normalize_url(url)
+        entry = self._lookup(key)
+        if entry is not None and time.time() - entry.fetched_at < self.ttl:
+            return entry
+
+        def refresh():
+            # Another caller may have refreshed the entry while we waited
+            current = self._lookup(key)
+            if current is not None and time.time() - current.fetched_at < self.ttl:
+                return current
+            fresh = load(url, current)
+            self._store(key, fresh)
+            return fresh
+
+        return self._inflight.do(key, refresh)
+
+    def peek(self, url: str) -> Optional[Any]:
+        """Return the cached page for `url` if it is within the TTL, else None."""
+        entry = self._lookup(normalize_url(url))
+        if entry is not None and time.time() - entry.fetched_at < self.ttl:
+            return entry
+        return None
+
+    def lookup(self, url: str) -> Optional[Any]:
+        """Return the cached page for `url` even past the TTL, e.g. to revalidate it."""
+        return self._lookup(normalize_url(url))
+
+    def put(self, url: str, entry: Any) -> None:
+        """Store a page fetched outside `get`."""
+        self._store(normalize_url(url), entry)
+
+    def invalidate(self, url: str) -> None:
+        with self._lock:
+            self._bytes -= _entry_bytes(self._entries.pop(normalize_url(url), None))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key: str, entry: Any) -> None:
+        with self._lock:
+            self._bytes -= _entry_bytes(self._entries.pop(key, None))
+            self._entries[key] = entry
+            self._bytes += _entry_bytes(entry)
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None
+                and self._bytes > self.max_bytes
+                and len(self._entries) > 1
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= _entry_bytes(evicted)
@@ -0,0 +1,188 @@
+import functools
+import json
+import os
+from collections import Counter
+from typing import Any, Callable, Dict, List
+
+from crewai.tools.base_tool import BaseTool, Tool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# How tool results and precomputed page data are written into prompts:
+# "compact" (summarized, see `compact_page_data`) or "full" (the whole dict)
+TOOL_OUTPUT_MODE = os.getenv("TOOL_OUTPUT_MODE", "compact").lower()
+# Most tokens of page data one tool result, page data section or task
+# context may take up in a prompt; 0 for no limit
+TASK_TOKEN_BUDGET = int(os.getenv("TASK_TOKEN_BUDGET", "1500"))
+
+# Rough size of a token in English text and JSON, to estimate prompt sizes
+# without loading a tokenizer
+CHARS_PER_TOKEN = 4
+
+MAX_HEADINGS_PER_LEVEL = 5
+MAX_TEXT_CHARS = 80
+MAX_KEYWORDS = 10
+MAX_PHRASES = 5
+MAX_IMAGES = 5
+
+# Separator crewai puts between the outputs of context tasks
+CONTEXT_DIVIDER = "\n\n----------\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def fit_to_budget(text: str, budget: int = TASK_TOKEN_BUDGET) -> str:
+    """
+    Cut `text` down to about `budget` tokens (no limit if 0), at a line
+    break when there is one near the end, and say that it was cut.
+    """
+    if not budget or estimate_tokens(text) <= budget:
+        return text
+    note = f"\n[... truncated to fit a {budget} token budget]"
+    limit = max(budget * CHARS_PER_TOKEN - len(note), 0)
+    cut = text[:limit]
+    line_end = cut.rfind("\n")
+    if line_end > 0.8 * limit:
+        cut = cut[:line_end]
+    return cut + note
+
+
+def _shorten(text: str, limit: int = MAX_TEXT_CHARS) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def compact_structure(structure: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    `analyze_page_structure` without the bulk: the first headings of each
+    level, shortened; keywords and phrases as "text:count"; image counts
+    without per-image records.
+    """
+    stats = structure["content_stats"]
+    images = structure["images"]
+    phrases = structure.get("top_phrases") or {}
+    compact = {
+        "title": _shorten(structure["title"], 2 * MAX_TEXT_CHARS),
+        "title_length": structure["title_length"],
+        "meta_description": _shorten(structure["meta_description"], 3 * MAX_TEXT_CHARS),
+        "meta_description_length": structure["meta_description_length"],
+        "headings": {
+            tag: {
+                "count": len(texts),
+                "first": [_shorten(text) for text in texts[:MAX_HEADINGS_PER_LEVEL]],
+            }
+            for tag, texts in structure["headings"].items()
+            if texts
+        },
+        "content_stats": {
+            name: round(value, 1) if isinstance(value, float) else value
+            for name, value in stats.items()
+        },
+        "top_keywords": ", ".join(
+            f"{word}:{count}"
+            for word, count in structure["top_keywords"][:MAX_KEYWORDS]
+        ),
+        "top_phrases": ", ".join(
+            f"{phrase['phrase']}:{phrase['count']}"
+            for name in ("trigrams", "bigrams")
+            for phrase in phrases.get(name, [])[:MAX_PHRASES]
+        ),
+        "images": {
+            name: images[name]
+            for name in ("total_count", "with_alt_text", "without_alt_text")
+        },
+    }
+    if structure.get("truncated"):
+        compact["truncated"] = True
+    return compact
+
+
+def compact_images(images_analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Probed images as counts per format and total size, plus the largest few."""
+    probed = [image for image in images_analysis["data"] if "error" not in image]
+    largest = sorted(probed, key=lambda image: image["size_kb"], reverse=True)
+    return {
+        "count": images_analysis["count"],
+        # The tools only keep a sample of the probed images
+        "sampled": len(images_analysis["data"]),
+        "failed_probes": len(images_analysis["data"]) - len(probed),
+        "formats": dict(Counter(str(image["format"]) for image in probed)),
+        "total_kb": round(sum(image["size_kb"] for image in probed), 1),
+        "largest": [_compact_image(image) for image in largest[:MAX_IMAGES]],
+    }
+
+
+def _compact_image(image: Dict[str, Any]) -> Dict[str, Any]:
+    compact = {"url": _shorten(image["url"]), "kb": round(image["size_kb"], 1)}
+    # Unknown for e.g. SVGs without width, height or viewBox
+    if image["width"] is not None and image["height"] is not None:
+        compact["size"] = f"{image['width']}x{image['height']}"
+    compact["alt"] = _shorten(image["alt"], 40)
+    return compact
+
+
+# Sections of the tool results and how each is compacted; the page URL is
+# dropped everywhere, since the task already names it
+_COMPACTORS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "structure_analysis": compact_structure,
+    "images_analysis": compact_images,
+    "visual_analysis": compact_images,
+}
+
+
+def compact_page_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A compact copy of any tool result (or a part of one): drops the URL,
+    empty values and unset truncation flags, and summarizes the structure
+    and image sections.
+    """
+    if "content_stats" in data and "headings" in data:
+        return compact_structure(data)
+    compact = {}
+    for name, value in data.items():
+        if name == "url" or value in (None, "", [], {}):
+            continue
+        if name == "truncated" and not value:
+            continue
+        if name in _COMPACTORS:
+            value = _COMPACTORS[name](value)
+        compact[name] = value
+    return compact
+
+
+def render_page_data(data: Dict[str, Any], budget: int = TASK_TOKEN_BUDGET) -> str:
+    """Page data as written into a prompt, in TOOL_OUTPUT_MODE and within budget."""
+    if TOOL_OUTPUT_MODE == "compact":
+        text = json.dumps(compact_page_data(data), separators=(",", ":"), default=str)
+    else:
+        text = json.dumps(data, indent=2, default=str)
+    return fit_to_budget(text, budget)
+
+
+def render_context(outputs: List[str], budget: int = TASK_TOKEN_BUDGET) -> str:
+    """Outputs of earlier tasks, sharing the budget equally."""
+    share = budget // max(len(outputs), 1)
+    return CONTEXT_DIVIDER.join(fit_to_budget(output, share) for output in outputs)
+
+
+def agent_tool(base_tool: BaseTool) -> BaseTool:
+    """
+    The tool as the agents see it: the same name, arguments and description,
+    with its result rendered by `render_page_data`. The tool itself keeps
+    returning the full dict for the API and workers.
+    """
+    func = base_tool.func
+
+    @functools.wraps(func)
+    def rendered(*args, **kwargs):
+        return render_page_data(func(*args, **kwargs))
+
+    return Tool(
+        name=base_tool.name,
+        description=func.__doc__,
+        func=rendered,
+        args_schema=base_tool.args_schema,
+    )
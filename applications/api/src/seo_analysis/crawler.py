@@ -0,0 +1,282 @@
+import contextvars
+import gzip
+import os
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+import requests
+from dotenv import load_dotenv
+
+from .cache import SingleFlight, normalize_url
+from .http_client import HttpClient, http_client
+
+load_dotenv()
+
+CRAWL_MAX_WORKERS = int(os.getenv("CRAWL_MAX_WORKERS", "8"))
+# Pages fetched from one host at the same time, and the minimum number of
+# seconds between two fetches from it (raised by a robots.txt Crawl-delay)
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "2"))
+CRAWL_MIN_INTERVAL = float(os.getenv("CRAWL_MIN_INTERVAL", "1"))
+CRAWL_RESPECT_ROBOTS = os.getenv("CRAWL_RESPECT_ROBOTS", "true").lower() == "true"
+# Nested sitemap indexes followed below the submitted sitemap
+SITEMAP_MAX_DEPTH = int(os.getenv("SITEMAP_MAX_DEPTH", "2"))
+# The sitemap protocol allows up to 50MB per (uncompressed) file
+SITEMAP_MAX_BYTES = 50 * 1024 * 1024
+
+SITEMAP_NAMESPACE = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+
+class CrawlStopped(Exception):
+    """Raised by `CrawlScheduler.run` when `should_stop` asks it to stop."""
+
+
+def _host(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def parse_sitemap(xml: bytes) -> Tuple[List[str], List[str]]:
+    """
+    Parse a sitemap or sitemap index (optionally gzipped).
+
+    Returns the page URLs of a `<urlset>` and the child sitemap URLs of a
+    `<sitemapindex>`; the other list is empty.
+    """
+    if xml[:2] == b"\x1f\x8b":
+        xml = gzip.decompress(xml)
+    root = ElementTree.fromstring(xml)
+    # Accept sitemaps that omit the standard namespace
+    namespace = SITEMAP_NAMESPACE if root.tag.startswith(SITEMAP_NAMESPACE) else ""
+    locations = [
+        loc.text.strip()
+        for loc in root.iter(f"{namespace}loc")
+        if loc.text and loc.text.strip()
+    ]
+    if root.tag == f"{namespace}sitemapindex":
+        return [], locations
+    return locations, []
+
+
+def fetch_sitemap_urls(
+    sitemap_url: str,
+    limit: int,
+    max_depth: int = SITEMAP_MAX_DEPTH,
+    client: HttpClient = http_client,
+) -> List[str]:
+    """Collect up to `limit` page URLs from a sitemap, following sitemap indexes."""
+    urls: List[str] = []
+    seen = set()
+    pending = deque([(sitemap_url, 0)])
+    while pending and len(urls) < limit:
+        url, depth = pending.popleft()
+        if url in seen:
+            continue
+        seen.add(url)
+        response, body = client.fetch(url, max_bytes=SITEMAP_MAX_BYTES)
+        response.raise_for_status()
+        pages, sitemaps = parse_sitemap(body)
+        urls.extend(pages[: limit - len(urls)])
+        if depth < max_depth:
+            pending.extend((urljoin(url, child), depth + 1) for child in sitemaps)
+    return urls
+
+
+class RobotsRules:
+    """robots.txt rules per host, fetched once and shared by every crawl."""
+
+    def __init__(self, client: HttpClient = http_client):
+        self.client = client
+        self.user_agent = client.user_agent
+        self._parsers: Dict[str, RobotFileParser] = {}
+        self._lock = threading.Lock()
+        self._inflight = SingleFlight()
+
+    def allowed(self, url: str) -> bool:
+        return self._parser(_host(url)).can_fetch(self.user_agent, url)
+
+    def load(self, url: str) -> None:
+        """Fetch the robots.txt of `url`'s host, unless it is loaded already."""
+        self._parser(_host(url))
+
+    def crawl_delay(self, url: str) -> Optional[float]:
+        """The host's Crawl-delay, or None if unset or robots.txt isn't loaded yet."""
+        with self._lock:
+            parser = self._parsers.get(_host(url))
+        if parser is None:
+            return None
+        delay = parser.crawl_delay(self.user_agent)
+        return float(delay) if delay is not None else None
+
+    def _parser(self, host: str) -> RobotFileParser:
+        with self._lock:
+            parser = self._parsers.get(host)
+        if parser is not None:
+            return parser
+        return self._inflight.do(host, lambda: self._load(host))
+
+    def _load(self, host: str) -> RobotFileParser:
+        parser = RobotFileParser(f"{host}/robots.txt")
+        try:
+            response, body = self.client.fetch(parser.url)
+        except requests.RequestException:
+            # Unreachable robots.txt: don't crawl the host
+            parser.disallow_all = True
+        else:
+            # Same rules as RobotFileParser.read
+            if response.status_code in (401, 403):
+                parser.disallow_all = True
+            elif response.status_code >= 400:
+                parser.allow_all = True
+            else:
+                # robots.txt is UTF-8 (RFC 9309)
+                parser.parse(body.decode("utf-8", errors="replace").splitlines())
+        with self._lock:
+            self._parsers[host] = parser
+        return parser
+
+
+class CrawlScheduler:
+    """
+    Visit a list of URLs in parallel while staying polite to every host.
+
+    URLs are deduplicated by their normalized form and queued per host. A
+    host never has more than `per_host` visits running at once, and two
+    visits to it start at least `min_interval` seconds apart (or its
+    robots.txt Crawl-delay, if longer). With `robots`, a host's robots.txt
+    is loaded before its first visit, so the Crawl-delay applies from the
+    start. Other hosts keep being crawled while one is waiting, so a single
+    slow site doesn't hold up the batch.
+    """
+
+    def __init__(
+        self,
+        visit: Callable[[str], Any],
+        max_workers: int = CRAWL_MAX_WORKERS,
+        per_host: int = CRAWL_PER_HOST,
+        min_interval: float = CRAWL_MIN_INTERVAL,
+        robots: Optional[RobotsRules] = None,
+    ):
+        self.visit = visit
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.min_interval = min_interval
+        self.robots = robots
+
+    def run(
+        self,
+        urls: Iterable[str],
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Visit every URL and return one record per unique URL, in submission
+        order: {"url", "status", "result", "error"}, where status is
+        "completed", "failed" or "skipped" (disallowed by robots.txt).
+
+        `on_result` receives each record as soon as it is ready. When
+        `should_stop` returns True no new visits start, and `CrawlStopped`
+        is raised once the running ones have finished.
+        """
+        frontier: Dict[str, Deque[str]] = {}
+        order: List[str] = []
+        seen = set()
+        for url in urls:
+            key = normalize_url(url)
+            if key in seen:
+                continue
+            seen.add(key)
+            order.append(url)
+            frontier.setdefault(_host(url), deque()).append(url)
+
+        records: Dict[str, Dict[str, Any]] = {}
+        running: Dict[str, int] = {}
+        next_start: Dict[str, float] = {}
+        # Visit (or robots.txt fetch, with no URL) -> (host, URL)
+        pending: Dict[Any, Tuple[str, Optional[str]]] = {}
+        # Hosts whose robots.txt is loaded (or not needed)
+        robots_loaded = set() if self.robots is not None else None
+        stopped = False
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while frontier or pending:
+                if should_stop is not None and should_stop():
+                    stopped = True
+                    frontier.clear()
+
+                now = time.monotonic()
+                for host in list(frontier):
+                    queue = frontier[host]
+                    if robots_loaded is not None and host not in robots_loaded:
+                        if (
+                            running.get(host, 0) == 0
+                            and len(pending) < self.max_workers
+                        ):
+                            running[host] = 1
+                            load = executor.submit(self.robots.load, queue[0])
+                            pending[load] = (host, None)
+                        continue
+                    while (
+                        queue
+                        and len(pending) < self.max_workers
+                        and running.get(host, 0) < self.per_host
+                        and next_start.get(host, 0) <= now
+                    ):
+                        url = queue.popleft()
+                        running[host] = running.get(host, 0) + 1
+                        next_start[host] = now + self._interval(url)
+                        # In the caller's context, so page spans reach its trace
+                        visit = executor.submit(
+                            contextvars.copy_context().run, self._visit_one, url
+                        )
+                        pending[visit] = (host, url)
+                    if not queue:
+                        del frontier[host]
+
+                # Sleep until a visit finishes or a waiting host may start again
+                ready_at = [
+                    next_start.get(host, 0)
+                    for host in frontier
+                    if running.get(host, 0) < self.per_host
+                    and len(pending) < self.max_workers
+                    and (robots_loaded is None or host in robots_loaded)
+                ]
+                timeout = max(min(ready_at) - time.monotonic(), 0) if ready_at else None
+                if not pending:
+                    time.sleep(timeout or 0)
+                    continue
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    host, url = pending.pop(future)
+                    running[host] -= 1
+                    if url is None:
+                        # Load errors are left to the first visit to report
+                        robots_loaded.add(host)
+                        continue
+                    records[url] = future.result()
+                    if on_result is not None:
+                        on_result(records[url])
+
+        if stopped:
+            raise CrawlStopped()
+        return [records[url] for url in order]
+
+    def _interval(self, url: str) -> float:
+        crawl_delay = self.robots.crawl_delay(url) if self.robots else None
+        return max(self.min_interval, crawl_delay or 0)
+
+    def _visit_one(self, url: str) -> Dict[str, Any]:
+        record = {"url": url, "status": "completed", "result": None, "error": None}
+        try:
+            if self.robots is not None and not self.robots.allowed(url):
+                record.update(status="skipped", error="Disallowed by robots.txt")
+                return record
+            record["result"] = self.visit(url)
+        except Exception as e:
+            record.update(status="failed", error=str(e))
+        return record
@@ -1,10 +1,15 @@
+import contextvars
+import functools
 import os
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
 
-from crewai import Agent, Task, Crew, Process
-from langchain_openai import ChatOpenAI
-import nltk
+from crewai import Agent, Task, Crew, Process, LLM, BaseLLM
+from crewai.tasks.task_output import TaskOutput
 
+from .compact import agent_tool, render_context, render_page_data
+from .llm_cache import CachedLLM, LLMResponseCache, TimedLLM
+from .metrics import add_total, span
 from .tools import SEOAnalysisTools
 
 from dotenv import load_dotenv
@@ -15,52 +20,117 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o")
 MODEL_TEMPERATURE = float(os.getenv("MODEL_TEMPERATURE", "0.2"))
+# On-disk LLM response cache; set LLM_CACHE_PATH to an empty value to disable
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "100"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
 
 
-llm = ChatOpenAI(model=MODEL_NAME, temperature=MODEL_TEMPERATURE)
+# Replaces the configured LLM when set, see `use_llm`
+_llm_override: Optional[BaseLLM] = None
 
-# Download NLTK data
-nltk_data_dir = os.path.expanduser("~/nltk_data")
-nltk.data.path.append(nltk_data_dir)
 
-nltk.download("punkt_tab", download_dir=nltk_data_dir)
-nltk.download("stopwords", download_dir=nltk_data_dir)
+# The LLM, the response cache and the agents are built on first use rather
+# than at import, so importing the API (or a worker) stays fast and offline
+@functools.lru_cache(maxsize=None)
+def get_llm() -> BaseLLM:
+    if _llm_override is not None:
+        return _llm_override
+    return LLM(model=MODEL_NAME, temperature=MODEL_TEMPERATURE)
+
+
+@functools.lru_cache(maxsize=None)
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    if not LLM_CACHE_PATH:
+        return None
+    return LLMResponseCache(
+        LLM_CACHE_PATH,
+        max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024),
+        ttl=LLM_CACHE_TTL,
+    )
 
 
 # ====== AGENTS ======
-visual_content_analyst = Agent(
-    role="Visual & Content SEO Analyst",
-    goal="Analyze webpage visual elements, headings, and content to identify SEO optimization opportunities",
-    backstory="""You are an experienced visual and content SEO analyst with expertise in analyzing webpage
-    structure, content quality, headings, and visual elements. You specialize in identifying issues that
-    affect both search engine rankings and user experience. Your recommendations balance SEO best practices
-    with usability and conversion optimization.""",
-    verbose=True,
-    llm=llm,
-    tools=[
-        SEOAnalysisTools.analyze_page_structure,
-        SEOAnalysisTools.analyze_visual_elements,
-    ],
-)
-
-landing_page_specialist = Agent(
-    role="Landing Page SEO Specialist",
-    goal="Optimize landing pages for long-term SEO performance and conversion",
-    backstory="""You are a landing page optimization expert who specializes in creating high-performing
-    pages that rank well for years. You understand both the technical SEO aspects of landing pages and
-    the conversion elements that make them effective. You excel at balancing immediate conversion needs
-    with long-term SEO value, and you know how to create evergreen content that continues to perform.""",
-    verbose=True,
-    llm=llm,
-    tools=[SEOAnalysisTools.analyze_landing_page],
-)
+@functools.lru_cache(maxsize=None)
+def get_visual_content_analyst() -> Agent:
+    return Agent(
+        role="Visual & Content SEO Analyst",
+        goal="Analyze webpage visual elements, headings, and content to identify SEO optimization opportunities",
+        backstory="""You are an experienced visual and content SEO analyst with expertise in analyzing webpage
+        structure, content quality, headings, and visual elements. You specialize in identifying issues that
+        affect both search engine rankings and user experience. Your recommendations balance SEO best practices
+        with usability and conversion optimization.""",
+        verbose=True,
+        llm=get_llm(),
+        tools=[
+            agent_tool(SEOAnalysisTools.analyze_page_structure),
+            agent_tool(SEOAnalysisTools.analyze_visual_elements),
+        ],
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_landing_page_specialist() -> Agent:
+    return Agent(
+        role="Landing Page SEO Specialist",
+        goal="Optimize landing pages for long-term SEO performance and conversion",
+        backstory="""You are a landing page optimization expert who specializes in creating high-performing
+        pages that rank well for years. You understand both the technical SEO aspects of landing pages and
+        the conversion elements that make them effective. You excel at balancing immediate conversion needs
+        with long-term SEO value, and you know how to create evergreen content that continues to perform.""",
+        verbose=True,
+        llm=get_llm(),
+        tools=[agent_tool(SEOAnalysisTools.analyze_landing_page)],
+    )
+
+
+def use_llm(llm: Optional[BaseLLM]) -> None:
+    """
+    Run the agents with `llm` instead of the configured model, e.g. a fake
+    LLM for offline benchmarks; `None` goes back to the configured model.
+    """
+    global _llm_override
+    _llm_override = llm
+    for getter in (get_llm, get_visual_content_analyst, get_landing_page_specialist):
+        getter.cache_clear()
+
+
+_LAZY_ATTRIBUTES = {
+    "llm": get_llm,
+    "llm_cache": get_llm_cache,
+    "visual_content_analyst": get_visual_content_analyst,
+    "landing_page_specialist": get_landing_page_specialist,
+}
+
+
+def __getattr__(name: str) -> Any:
+    # Keep `crew.llm`, `crew.visual_content_analyst` etc. working
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # ====== TASKS ======
-def create_analysis_tasks(url: str) -> List[Task]:
-    """Create tasks for analyzing a webpage and optimizing landing pages."""
+def _page_data_section(title: str, data: Dict[str, Any]) -> str:
+    return f"""
+        {title} (already collected from the page, do not fetch it again):
+        {render_page_data(data)}
+        """
+
+
+def create_analysis_tasks(
+    url: str, page_analysis: Optional[Dict[str, Any]] = None
+) -> List[Task]:
+    """
+    Create tasks for analyzing a webpage and optimizing landing pages.
+
+    When `page_analysis` (the output of `analyze_landing_page`) is given, the
+    relevant parts are embedded in each task description so the agents can
+    reason over them without calling the tools.
+    """
 
     task_analyze_content = Task(
+        name="content_analysis",
         description=f"""
         Perform a comprehensive analysis of the webpage at {url}.
         
@@ -79,11 +149,12 @@ def create_analysis_tasks(url: str) -> List[Task]:
         
         Your analysis should be detailed and actionable, with specific examples from the page.
         """,
-        agent=visual_content_analyst,
+        agent=get_visual_content_analyst(),
         expected_output="A comprehensive content analysis with specific recommendations for improvement",
     )
 
     task_analyze_visual = Task(
+        name="visual_analysis",
         description=f"""
         Perform a detailed visual analysis of the webpage at {url}.
         
@@ -102,11 +173,12 @@ def create_analysis_tasks(url: str) -> List[Task]:
         
         Your analysis should include specific examples and actionable recommendations.
         """,
-        agent=visual_content_analyst,
+        agent=get_visual_content_analyst(),
         expected_output="A detailed visual element analysis with specific optimization recommendations",
     )
 
     task_optimize_landing_page = Task(
+        name="landing_page_strategy",
         description=f"""
         Create a comprehensive long-term SEO strategy for the landing page at {url}.
         
@@ -125,25 +197,169 @@ def create_analysis_tasks(url: str) -> List[Task]:
         
         Provide a detailed implementation plan with specific recommendations.
         """,
-        agent=landing_page_specialist,
+        agent=get_landing_page_specialist(),
         context=[task_analyze_content, task_analyze_visual],
         expected_output="A comprehensive long-term SEO strategy for the landing page with implementation plan",
     )
 
+    if page_analysis is not None:
+        task_analyze_content.description += _page_data_section(
+            "Page structure and content data",
+            page_analysis["structure_analysis"],
+        )
+        task_analyze_visual.description += _page_data_section(
+            "Visual elements and layout data",
+            {
+                "truncated": page_analysis["truncated"],
+                "images_analysis": page_analysis["visual_analysis"],
+                "layout_analysis": page_analysis["layout_analysis"],
+            },
+        )
+        task_optimize_landing_page.description += _page_data_section(
+            "Landing page elements", page_analysis["landing_page_elements"]
+        )
+
     return [task_analyze_content, task_analyze_visual, task_optimize_landing_page]
 
 
 # ====== CREW SETUP ======
-def create_seo_analysis_crew(url: str) -> Crew:
-    """Create and configure the SEO analysis crew with visual and landing page optimization focus."""
+class BudgetedCrew(Crew):
+    """
+    A crew whose tasks get the outputs of their context tasks through
+    `render_context`, so they take up at most TASK_TOKEN_BUDGET tokens of
+    the prompt however long the earlier answers were.
+    """
 
-    tasks = create_analysis_tasks(url)
+    def _get_context(self, task: Task, task_outputs: List[TaskOutput]) -> str:
+        if not task.context:
+            return super()._get_context(task, task_outputs)
+        return render_context(
+            [context.output.raw for context in task.context if context.output]
+        )
 
-    seo_crew = Crew(
-        agents=[visual_content_analyst, landing_page_specialist],
+
+class StagedCrew:
+    """
+    Run crews in stages: every crew in a stage runs concurrently, and a stage
+    starts only once the previous one has finished.
+
+    Exposes the same `tasks` and `kickoff()` surface as a single `Crew`;
+    `kickoff` returns the output of the last crew in the final stage. `tasks`
+    may list tasks that already have an output and run in no crew.
+    """
+
+    def __init__(self, stages: List[List[Crew]], tasks: Optional[List[Task]] = None):
+        self.stages = [stage for stage in stages if stage]
+        self._tasks = tasks
+
+    @property
+    def tasks(self) -> List[Task]:
+        if self._tasks is not None:
+            return self._tasks
+        return [task for stage in self.stages for crew in stage for task in crew.tasks]
+
+    def kickoff(self) -> Any:
+        if not self.stages:
+            return self.tasks[-1].output
+        width = max(len(stage) for stage in self.stages)
+        with ThreadPoolExecutor(max_workers=width) as executor:
+            for stage in self.stages:
+                # Copy the context so the crews' spans reach the caller's trace
+                futures = [
+                    executor.submit(contextvars.copy_context().run, self._kickoff, crew)
+                    for crew in stage
+                ]
+                # Re-raises the first failure once its crew finishes
+                outputs = [future.result() for future in futures]
+        return outputs[-1]
+
+    @staticmethod
+    def _kickoff(crew: Crew) -> Any:
+        with span(f"task:{crew.tasks[0].name}") as attrs:
+            output = crew.kickoff()
+            usage = crew.usage_metrics
+            if usage is not None:
+                attrs.update(
+                    prompt_tokens=usage.prompt_tokens,
+                    completion_tokens=usage.completion_tokens,
+                    llm_requests=usage.successful_requests,
+                )
+                add_total("prompt_tokens", usage.prompt_tokens)
+                add_total("completion_tokens", usage.completion_tokens)
+        return output
+
+
+def create_seo_analysis_crew(
+    url: str,
+    step_callback: Optional[Callable[[Any], None]] = None,
+    page_analysis: Optional[Dict[str, Any]] = None,
+    page_hash: Optional[str] = None,
+    task_callback: Optional[Callable[[Any], None]] = None,
+    reused_outputs: Optional[Dict[int, str]] = None,
+) -> StagedCrew:
+    """
+    Create and configure the SEO analysis crew with visual and landing page optimization focus.
+
+    The content and visual analyses are independent, so they run in parallel;
+    the landing page strategy starts as soon as both are done and receives
+    their outputs through its task context.
+
+    `step_callback` is called after every agent step, e.g. to stop a cancelled job,
+    and `task_callback` with each task's output as soon as that task finishes.
+    With a precomputed `page_analysis` the agents get no tools and only reason
+    over the data embedded in their tasks. `page_hash` (see
+    `llm_cache.content_hash`) enables the LLM response cache, keyed on the
+    page content so cached answers are reused only while the page is unchanged.
+
+    `reused_outputs` maps task numbers (1-based, in `tasks` order) to outputs
+    of an earlier run; those tasks don't run again and later tasks get the
+    reused outputs as context.
+    """
+
+    tasks = create_analysis_tasks(url, page_analysis)
+    task_analyze_content, task_analyze_visual, task_optimize_landing_page = tasks
+
+    for number, task in enumerate(tasks, start=1):
+        if reused_outputs and number in reused_outputs:
+            task.output = TaskOutput(
+                description=task.description,
+                raw=reused_outputs[number],
+                agent=task.agent.role,
+            )
+
+    llm_cache = get_llm_cache()
+
+    # Each task gets its own agent copy: crews running at the same time must
+    # not share agent state
+    def single_task_crew(task: Task) -> Crew:
+        task.agent = task.agent.copy()
+        if page_analysis is not None:
+            # Tasks copy their agent's tools when created, and crewai runs a
+            # task with its own tools first
+            task.agent.tools = []
+            task.tools = []
+        # Agent.copy copies the LLM too; wrap the shared one instead, so what
+        # it records on each call isn't lost with the copy
+        llm = get_llm()
+        if llm_cache is not None and page_hash is not None:
+            llm = CachedLLM(llm, llm_cache, context_hash=page_hash)
+        task.agent.llm = TimedLLM(llm)
+        return BudgetedCrew(
+            agents=[task.agent],
+            tasks=[task],
+            verbose=True,
+            process=Process.sequential,
+            step_callback=step_callback,
+            task_callback=task_callback,
+        )
+
+    def stage(*stage_tasks: Task) -> List[Crew]:
+        return [single_task_crew(task) for task in stage_tasks if task.output is None]
+
+    return StagedCrew(
+        [
+            stage(task_analyze_content, task_analyze_visual),
+            stage(task_optimize_landing_page),
+        ],
         tasks=tasks,
-        verbose=True,
-        process=Process.sequential,
     )
-
-    return seo_crew
@@ -0,0 +1,392 @@
+import codecs
+import importlib.util
+import os
+import re
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# One of "auto", "selectolax", "lxml" or "html.parser". "auto" picks the
+# fastest backend that is installed. They give the same facts, except where
+# they repair broken markup differently: lxml ends a heading at a nested
+# block such as <p>, so "<h2>Sub<p>Para</p></h2>" has the heading "Sub"
+# there and "SubPara" with the others.
+HTML_PARSER_BACKEND = os.getenv("HTML_PARSER_BACKEND", "auto")
+
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+
+# Elements whose text is not considered part of the main content
+EXCLUDED_CONTENT_TAGS = ("script", "style", "header", "footer", "nav")
+
+CALL_TO_ACTION_PATTERN = re.compile(
+    r"sign up|get started|try|buy|subscribe|download", re.I
+)
+TESTIMONIALS_PATTERN = re.compile(r"testimonial|review|customer|client", re.I)
+BENEFITS_PATTERN = re.compile(r"benefit|feature|why|advantage", re.I)
+RESPONSIVE_CLASS_PATTERN = re.compile(r"responsive|mobile|flex|grid")
+SOCIAL_CLASS_PATTERN = re.compile(r"social|share|facebook|twitter|linkedin", re.I)
+
+_COUNTED_TAGS = ("script", "iframe", "table", "div", "form")
+
+# Bytes of a page body decoded (and fed to the parser) at a time
+DECODE_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class PageFacts:
+    """Everything the analysis tools need from a page, gathered in one pass."""
+
+    title: str = ""
+    # The <html lang> attribute, e.g. "en-US"
+    language: str = ""
+    meta_description: str = ""
+    viewport_meta: bool = False
+    canonical_url: Optional[str] = None
+    headings: Dict[str, List[str]] = field(
+        default_factory=lambda: {tag: [] for tag in HEADING_TAGS}
+    )
+    # Text outside script, style, header, footer and nav, joined by spaces
+    content_text: str = ""
+    # Every <img> with a src: src, alt, width, height and whether it sits in
+    # the main content (i.e. outside the excluded elements)
+    images: List[Dict[str, Any]] = field(default_factory=list)
+    tag_counts: Dict[str, int] = field(
+        default_factory=lambda: {tag: 0 for tag in _COUNTED_TAGS}
+    )
+    css_count: int = 0
+    responsive_elements: bool = False
+    has_call_to_action: bool = False
+    has_testimonials: bool = False
+    has_benefits_section: bool = False
+    has_schema_markup: bool = False
+    has_social_sharing: bool = False
+
+
+class PageFactsCollector:
+    """
+    Visitor that builds `PageFacts` from a stream of parser events.
+
+    Parser backends call `start`, `end`, `text` and `comment` in document
+    order and `close` once at the end; the collector never looks at a tree.
+    Consecutive `text` calls are joined, since streaming parsers may split
+    one text node at chunk boundaries or character references.
+    """
+
+    def __init__(self):
+        self.facts = PageFacts()
+        self._content_parts: List[str] = []
+        self._pending_text: List[str] = []
+        # Open elements we track text for, innermost last
+        self._open_title: Optional[List[str]] = None
+        self._title_seen = False
+        self._open_headings: List[Tuple[str, List[str]]] = []
+        self._excluded_stack: List[str] = []
+        self._meta_description_seen = False
+
+    def start(self, tag: str, attrs: Dict[str, str]) -> None:
+        self._flush_text()
+        facts = self.facts
+
+        if tag in _COUNTED_TAGS:
+            facts.tag_counts[tag] += 1
+
+        class_attr = attrs.get("class")
+        if class_attr:
+            if not facts.responsive_elements and RESPONSIVE_CLASS_PATTERN.search(
+                class_attr
+            ):
+                facts.responsive_elements = True
+            if not facts.has_social_sharing and SOCIAL_CLASS_PATTERN.search(class_attr):
+                facts.has_social_sharing = True
+
+        if tag in HEADING_TAGS:
+            self._open_headings.append((tag, []))
+        elif tag == "html" and not facts.language:
+            facts.language = attrs.get("lang", "")
+        elif tag == "title" and not self._title_seen:
+            self._title_seen = True
+            self._open_title = []
+        elif tag == "meta":
+            name = attrs.get("name")
+            if name == "description" and not self._meta_description_seen:
+                self._meta_description_seen = True
+                facts.meta_description = attrs.get("content", "")
+            elif name == "viewport":
+                facts.viewport_meta = True
+        elif tag == "link":
+            rel = attrs.get("rel", "").split()
+            if "stylesheet" in rel:
+                facts.css_count += 1
+            if "canonical" in rel and facts.canonical_url is None:
+                facts.canonical_url = attrs.get("href")
+        elif tag == "script":
+            if attrs.get("type") == "application/ld+json":
+                facts.has_schema_markup = True
+        elif tag == "img" and attrs.get("src"):
+            facts.images.append(
+                {
+                    "src": attrs["src"],
+                    "alt": attrs.get("alt", ""),
+                    "width": attrs.get("width", ""),
+                    "height": attrs.get("height", ""),
+                    "in_content": not self._excluded_stack,
+                }
+            )
+
+        if tag in EXCLUDED_CONTENT_TAGS:
+            self._excluded_stack.append(tag)
+
+    def end(self, tag: str) -> None:
+        self._flush_text()
+        if tag in HEADING_TAGS:
+            for i in range(len(self._open_headings) - 1, -1, -1):
+                if self._open_headings[i][0] == tag:
+                    name, parts = self._open_headings.pop(i)
+                    self.facts.headings[name].append("".join(parts).strip())
+                    break
+        elif tag == "title" and self._open_title is not None:
+            self.facts.title = "".join(self._open_title).strip()
+            self._open_title = None
+
+        if tag in EXCLUDED_CONTENT_TAGS and tag in self._excluded_stack:
+            # Pop back to the matching element, tolerating mis-nested markup
+            while self._excluded_stack.pop() != tag:
+                pass
+
+    def text(self, data: str) -> None:
+        self._pending_text.append(data)
+
+    def comment(self, data: str) -> None:
+        self._flush_text()
+        self._match_signals(data)
+
+    def close(self) -> PageFacts:
+        self._flush_text()
+        # Close anything left open by truncated or malformed markup
+        while self._open_headings:
+            self.end(self._open_headings[-1][0])
+        if self._open_title is not None:
+            self.end("title")
+        self.facts.content_text = " ".join(self._content_parts)
+        return self.facts
+
+    def _flush_text(self) -> None:
+        if not self._pending_text:
+            return
+        data = "".join(self._pending_text)
+        self._pending_text = []
+        self._match_signals(data)
+
+        if self._open_title is not None:
+            self._open_title.append(data)
+        for _, parts in self._open_headings:
+            parts.append(data)
+
+        if not self._excluded_stack:
+            stripped = data.strip()
+            if stripped:
+                self._content_parts.append(stripped)
+
+    def _match_signals(self, data: str) -> None:
+        facts = self.facts
+        if not facts.has_call_to_action and CALL_TO_ACTION_PATTERN.search(data):
+            facts.has_call_to_action = True
+        if not facts.has_testimonials and TESTIMONIALS_PATTERN.search(data):
+            facts.has_testimonials = True
+        if not facts.has_benefits_section and BENEFITS_PATTERN.search(data):
+            facts.has_benefits_section = True
+
+
+class _HTMLParserEvents(HTMLParser):
+    """Feed the standard library's streaming tokenizer into a collector."""
+
+    def __init__(self, collector: PageFactsCollector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag, {name: value or "" for name, value in attrs})
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.text(data)
+
+    def handle_comment(self, data):
+        self.collector.comment(data)
+
+
+def _walk_html_parser(chunks: Iterable[str], collector: PageFactsCollector) -> None:
+    parser = _HTMLParserEvents(collector)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+
+
+class _LxmlTarget:
+    """lxml parser target passing the parser's events on to a collector."""
+
+    def __init__(self, collector: PageFactsCollector):
+        self.collector = collector
+
+    def start(self, tag, attrib):
+        self.collector.start(tag, {name: value or "" for name, value in attrib.items()})
+
+    def end(self, tag):
+        self.collector.end(tag)
+
+    def data(self, data):
+        self.collector.text(data)
+
+    def comment(self, text):
+        self.collector.comment(text or "")
+
+    def close(self):
+        return None
+
+
+def _walk_lxml(chunks: Iterable[str], collector: PageFactsCollector) -> None:
+    from lxml import etree
+
+    # Events go straight to the collector as the chunks are fed; no tree is
+    # built
+    parser = etree.HTMLParser(target=_LxmlTarget(collector))
+    for chunk in chunks:
+        parser.feed(chunk)
+    try:
+        parser.close()
+    except etree.XMLSyntaxError:
+        # Empty document
+        pass
+
+
+def _selectolax_comment(node) -> str:
+    content = getattr(node, "comment_content", None)
+    if content is not None:
+        return content
+    # Older selectolax releases only give the serialized comment
+    html = node.html or ""
+    if html.startswith("<!--") and html.endswith("-->"):
+        return html[4:-3]
+    return html
+
+
+def _walk_selectolax(chunks: Iterable[str], collector: PageFactsCollector) -> None:
+    from selectolax.lexbor import LexborHTMLParser
+
+    # Lexbor has no incremental API; it parses the whole text at once
+    root = LexborHTMLParser("".join(chunks)).root
+    if root is None:
+        return
+    # Start from the document node's first child to include top-level comments
+    node = root.parent.child if root.parent is not None else root
+    open_nodes = []
+    while node is not None:
+        tag = node.tag
+        if tag == "-text":
+            collector.text(node.text(deep=False) or "")
+        elif tag == "-comment":
+            collector.comment(_selectolax_comment(node))
+        elif not tag.startswith("-"):
+            collector.start(
+                tag, {name: value or "" for name, value in node.attributes.items()}
+            )
+            if node.child is not None:
+                open_nodes.append(node)
+                node = node.child
+                continue
+            collector.end(tag)
+
+        following = node.next
+        while following is None and open_nodes:
+            parent = open_nodes.pop()
+            collector.end(parent.tag)
+            following = parent.next
+        node = following
+
+
+# Fastest first; "auto" uses the first one whose module is importable
+PARSER_BACKENDS: Dict[str, Tuple[Optional[str], Callable]] = {
+    "selectolax": ("selectolax", _walk_selectolax),
+    "lxml": ("lxml", _walk_lxml),
+    "html.parser": (None, _walk_html_parser),
+}
+
+
+def resolve_parser_backend(backend: Optional[str] = None) -> str:
+    """Return the concrete backend name for `backend` (default: the env setting)."""
+    backend = backend or HTML_PARSER_BACKEND
+    if backend == "auto":
+        for name, (module, _) in PARSER_BACKENDS.items():
+            if module is None or importlib.util.find_spec(module) is not None:
+                return name
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(
+            f"Unknown HTML parser backend '{backend}', expected one of: "
+            + ", ".join(["auto", *PARSER_BACKENDS])
+        )
+    return backend
+
+
+def decode_html(body: bytes, encoding: Optional[str] = None) -> str:
+    """Decode a page body with its charset, falling back to UTF-8."""
+    try:
+        return body.decode(encoding or "utf-8", errors="replace")
+    except LookupError:
+        # Unknown charset in the Content-Type header
+        return body.decode("utf-8", errors="replace")
+
+
+def iter_decoded(
+    body: bytes, encoding: Optional[str] = None, chunk_size: int = DECODE_CHUNK_SIZE
+) -> Iterator[str]:
+    """
+    Decode a page body `chunk_size` bytes at a time, like `decode_html`, so
+    it can be parsed without holding the whole decoded text in memory.
+    """
+    try:
+        decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    view = memoryview(body)
+    for start in range(0, len(view), chunk_size):
+        text = decoder.decode(view[start : start + chunk_size])
+        if text:
+            yield text
+    # A body cut short may end in the middle of a character
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def _extract(chunks: Iterable[str], backend: Optional[str]) -> PageFacts:
+    collector = PageFactsCollector()
+    _, walk = PARSER_BACKENDS[resolve_parser_backend(backend)]
+    walk(chunks, collector)
+    return collector.close()
+
+
+def extract_page_facts(html: str, backend: Optional[str] = None) -> PageFacts:
+    """
+    Walk `html` once and return the facts used by every analysis tool.
+
+    Every backend emits the same start/end/text/comment events into the
+    collector, so the resulting facts don't depend on the parser in use.
+    """
+    return _extract([html], backend)
+
+
+def extract_body_facts(
+    body: bytes, encoding: Optional[str] = None, backend: Optional[str] = None
+) -> PageFacts:
+    """
+    `extract_page_facts` for an undecoded page body: the body is decoded and
+    fed to the parser chunk by chunk (except by selectolax, which parses the
+    whole text at once).
+    """
+    return _extract(iter_decoded(body, encoding), backend)
@@ -0,0 +1,136 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Processes parsing pages and analyzing their text, so analyses use more
+# than one core; 0 runs the extraction in the calling thread instead
+EXTRACTION_PROCESSES = int(os.getenv("EXTRACTION_PROCESSES", str(os.cpu_count())))
+# Pages being extracted or waiting for a process (default: two per process),
+# and how long callers wait for room before giving up
+EXTRACTION_MAX_PENDING = int(os.getenv("EXTRACTION_MAX_PENDING", "0"))
+EXTRACTION_QUEUE_TIMEOUT = float(os.getenv("EXTRACTION_QUEUE_TIMEOUT", "30"))
+# Seconds clients are told to wait (Retry-After) when the pool is busy
+EXTRACTION_RETRY_AFTER = int(os.getenv("EXTRACTION_RETRY_AFTER", "5"))
+
+
+class ExtractionPoolBusy(RuntimeError):
+    """Raised when the pool stayed full for longer than the queue timeout."""
+
+
+class ExtractionPool:
+    """
+    Process pool for the CPU-bound extraction stage of the analysis tools:
+    parsing a page and analyzing its text. Functions run here take and
+    return plain data (bytes, dicts), which is all that crosses processes.
+
+    At most `max_pending` calls are running or queued. Further callers wait
+    up to `queue_timeout` seconds for one of them to finish, then get
+    `ExtractionPoolBusy`, so a burst of large pages pushes back on the
+    callers instead of piling up in memory.
+
+    The processes are started on first use, with "spawn" so they don't
+    inherit the parent's threads. A pool broken by a crashed process is
+    replaced on the next call.
+    """
+
+    def __init__(
+        self,
+        processes: int = EXTRACTION_PROCESSES,
+        max_pending: int = EXTRACTION_MAX_PENDING,
+        queue_timeout: float = EXTRACTION_QUEUE_TIMEOUT,
+    ):
+        self.processes = processes
+        self.max_pending = max_pending or 2 * max(processes, 1)
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Call `fn(*args)` in a pool process and wait for the result."""
+        if self.processes <= 0:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise self._busy()
+        return self._submit(fn, *args).result()
+
+    async def run_async(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """`run` for coroutines: waits for a slot and the result without blocking."""
+        loop = asyncio.get_running_loop()
+        if self.processes <= 0:
+            return await loop.run_in_executor(None, fn, *args)
+        if not self._slots.acquire(blocking=False):
+            # Wait for a slot in a thread so the event loop keeps running
+            acquire = loop.run_in_executor(
+                None, self._slots.acquire, True, self.queue_timeout
+            )
+            try:
+                acquired = await asyncio.shield(acquire)
+            except asyncio.CancelledError:
+                # Give back the slot if it's acquired after all
+                acquire.add_done_callback(
+                    lambda acquire: acquire.result() and self._slots.release()
+                )
+                raise
+            if not acquired:
+                raise self._busy()
+        return await asyncio.wrap_future(self._submit(fn, *args))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    def _submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        # Called with a slot held; the slot is freed when the call finishes
+        try:
+            executor = self._get_executor()
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._discard(executor)
+            raise
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda future: self._finished(future, executor))
+        return future
+
+    def _finished(self, future: Future, executor: ProcessPoolExecutor) -> None:
+        self._slots.release()
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._discard(executor)
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        # Several calls fail with the same broken pool; only replace it once
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _busy(self) -> ExtractionPoolBusy:
+        return ExtractionPoolBusy(
+            f"All {self.max_pending} extraction slots stayed busy "
+            f"for {self.queue_timeout:g}s"
+        )
+
+
+# Shared by the tools and the async API
+extraction_pool = ExtractionPool()
@@ -0,0 +1,256 @@
+import codecs
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import charset_normalizer
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry, make_headers
+
+load_dotenv()
+
+USER_AGENT = os.getenv(
+    "USER_AGENT",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+)
+REQUEST_CONNECT_TIMEOUT = float(os.getenv("REQUEST_CONNECT_TIMEOUT", "10"))
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "30"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.5"))
+# Keep-alive connections kept per host, and hosts kept in the session pool
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))
+HTTP_MAX_SESSIONS = int(os.getenv("HTTP_MAX_SESSIONS", "256"))
+# Largest (decompressed) body read into memory
+MAX_RESPONSE_BYTES = int(os.getenv("MAX_RESPONSE_BYTES", str(10 * 1024 * 1024)))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+READ_CHUNK_SIZE = 64 * 1024
+# Bytes of a body looked at to guess its charset when the headers name none
+CHARSET_SNIFF_BYTES = 64 * 1024
+
+
+class ResponseTooLarge(requests.RequestException):
+    """The response body is larger than the allowed maximum."""
+
+
+class UnsupportedContentType(requests.RequestException):
+    """The response is not of a type we can analyze (e.g. video for a page)."""
+
+
+def content_type(headers: Mapping[str, str]) -> str:
+    """The media type of a response, lowercased and without parameters."""
+    return headers.get("Content-Type", "").split(";")[0].strip().lower()
+
+
+def require_content_type(
+    url: str, headers: Mapping[str, str], allowed: Sequence[str]
+) -> None:
+    """
+    Raise `UnsupportedContentType` unless the response's media type is one
+    of `allowed` (entries ending in "/" allow a whole family, e.g. "image/").
+    Responses without a Content-Type are let through.
+    """
+    media_type = content_type(headers)
+    if media_type and not any(
+        media_type.startswith(prefix) if prefix.endswith("/") else media_type == prefix
+        for prefix in allowed
+    ):
+        raise UnsupportedContentType(
+            f"Response from {url} is {media_type}, expected one of: "
+            + ", ".join(allowed)
+        )
+
+
+def page_charset(headers: Mapping[str, str], body: bytes) -> str:
+    """
+    The charset to decode a page body with, the same on every fetch path:
+    the Content-Type charset if it names a known codec, else the one
+    detected from the start of the body, else utf-8.
+    """
+    for param in headers.get("Content-Type", "").split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset":
+            try:
+                return codecs.lookup(value.strip().strip("\"'")).name
+            except LookupError:
+                break
+
+    match = charset_normalizer.from_bytes(body[:CHARSET_SNIFF_BYTES]).best()
+    # An ASCII-only prefix says nothing about the rest; utf-8 is its superset
+    if match is None or match.encoding == "ascii":
+        return "utf-8"
+    return codecs.lookup(match.encoding).name
+
+
+def read_body(response: requests.Response, max_bytes: int) -> bytes:
+    """
+    Read a streamed response's (decompressed) body, refusing bodies larger
+    than `max_bytes` before downloading them when Content-Length says so.
+    """
+    declared = response.headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        response.close()
+        raise ResponseTooLarge(
+            f"Response from {response.url} is {declared} bytes, "
+            f"more than the {max_bytes} byte limit"
+        )
+
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=READ_CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            response.close()
+            raise ResponseTooLarge(
+                f"Response from {response.url} exceeds the {max_bytes} byte limit"
+            )
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def read_prefix(response: requests.Response, max_bytes: int) -> Tuple[bytes, bool]:
+    """
+    Read a streamed response's (decompressed) body up to `max_bytes`.
+    Returns the body and whether it was cut short; the rest of a longer body
+    is never downloaded.
+    """
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=READ_CHUNK_SIZE):
+        if size + len(chunk) > max_bytes:
+            chunks.append(chunk[: max_bytes - size])
+            response.close()
+            return b"".join(chunks), True
+        size += len(chunk)
+        chunks.append(chunk)
+    return b"".join(chunks), False
+
+
+def new_retry(
+    max_retries: int = HTTP_MAX_RETRIES, backoff: float = HTTP_RETRY_BACKOFF
+) -> Retry:
+    """
+    The retry policy of every page fetch, sync or async: failed connections
+    and RETRY_STATUSES answers are retried with exponential backoff, waiting
+    as long as a Retry-After header asks.
+    """
+    return Retry(
+        total=max_retries,
+        # A host that stopped answering mid-response rarely recovers;
+        # don't multiply the read timeout
+        read=0,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=("GET", "HEAD"),
+        # Hand the last response back instead of raising
+        raise_on_status=False,
+    )
+
+
+class HttpClient:
+    """
+    Shared HTTP client for every outgoing fetch: pages, images, sitemaps and
+    robots.txt.
+
+    Each host gets its own keep-alive `Session` (the least recently used
+    ones are dropped past `max_sessions`). GETs have connect and read
+    timeouts and are retried with exponential backoff on connection errors,
+    429 and 5xx responses (honouring Retry-After), but not on read timeouts.
+    Bodies are requested compressed (gzip/deflate, plus brotli and zstd when
+    installed) and capped at `max_bytes` after decompression.
+    """
+
+    def __init__(
+        self,
+        user_agent: str = USER_AGENT,
+        connect_timeout: float = REQUEST_CONNECT_TIMEOUT,
+        read_timeout: float = REQUEST_TIMEOUT,
+        max_retries: int = HTTP_MAX_RETRIES,
+        backoff: float = HTTP_RETRY_BACKOFF,
+        pool_maxsize: int = HTTP_POOL_MAXSIZE,
+        max_sessions: int = HTTP_MAX_SESSIONS,
+        max_bytes: int = MAX_RESPONSE_BYTES,
+    ):
+        self.user_agent = user_agent
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool_maxsize = pool_maxsize
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, requests.Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def session(self, url: str) -> requests.Session:
+        """The pooled session for the scheme and host of `url`."""
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}".lower()
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = self._new_session()
+                # Dropped sessions close their connections once unreferenced
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(key)
+            return session
+
+    def get(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> requests.Response:
+        """
+        GET `url` through the host's session. The body is streamed and left
+        to the caller, see `read_body`; `timeout` overrides the read timeout.
+        """
+        return self.session(url).get(
+            url,
+            headers=headers,
+            stream=True,
+            timeout=(self.connect_timeout, timeout or self.read_timeout),
+        )
+
+    def fetch(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ) -> Tuple[requests.Response, bytes]:
+        """
+        GET `url` and read its body right away, up to `max_bytes` (default:
+        the client's limit). Returns the closed response and its body.
+        """
+        with self.get(url, headers=headers, timeout=timeout) as response:
+            return response, read_body(response, max_bytes or self.max_bytes)
+
+    def close(self) -> None:
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def _new_session(self) -> requests.Session:
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=new_retry(self.max_retries, self.backoff),
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update(make_headers(accept_encoding=True))
+        session.headers["User-Agent"] = self.user_agent
+        return session
+
+
+# Shared by the tools, the image prober and the crawler
+http_client = HttpClient()
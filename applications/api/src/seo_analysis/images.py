@@ -0,0 +1,334 @@
+import contextvars
+import io
+import re
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from PIL import Image
+
+from .http_client import HttpClient, http_client, read_body, require_content_type
+from .metrics import add_total
+
+# Bytes read per chunk while sniffing, and the most we read before giving up
+# and decoding the whole image with PIL instead
+SNIFF_CHUNK_SIZE = 4096
+SNIFF_MAX_BYTES = 64 * 1024
+
+# Media types probed as images; some servers send images as generic binary
+IMAGE_CONTENT_TYPES = ("image/", "application/octet-stream", "binary/octet-stream")
+
+# JPEG start-of-frame markers that carry the image dimensions
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_SVG_TAG = re.compile(rb"<svg\b[^>]*>", re.I | re.S)
+_SVG_LENGTH = re.compile(r"^\s*([0-9.]+)\s*(px)?\s*$")
+
+
+def _svg_attr(tag: str, name: str) -> Optional[str]:
+    match = re.search(r"\b%s\s*=\s*[\"']([^\"']*)[\"']" % name, tag)
+    return match.group(1) if match else None
+
+
+def _sniff_svg(data: bytes) -> Optional[Tuple[str, int, int]]:
+    match = _SVG_TAG.search(data)
+    if not match:
+        return None
+    tag = match.group(0).decode("utf-8", "replace")
+    width, height = _svg_attr(tag, "width"), _svg_attr(tag, "height")
+    width = _SVG_LENGTH.match(width or "")
+    height = _SVG_LENGTH.match(height or "")
+    if width and height:
+        return "SVG", round(float(width.group(1))), round(float(height.group(1)))
+
+    view_box = (_svg_attr(tag, "viewBox") or "").replace(",", " ").split()
+    if len(view_box) == 4:
+        try:
+            return "SVG", round(float(view_box[2])), round(float(view_box[3]))
+        except ValueError:
+            pass
+    return "SVG", None, None
+
+
+def _sniff_jpeg(data: bytes) -> Optional[Tuple[str, int, int]]:
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte before the actual marker
+            i += 1
+            continue
+        if marker in (0x01, *range(0xD0, 0xDA)):
+            i += 2
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[i + 5 : i + 9])
+            return "JPEG", width, height
+        (length,) = struct.unpack(">H", data[i + 2 : i + 4])
+        i += 2 + length
+    return None
+
+
+def _sniff_webp(data: bytes) -> Optional[Tuple[str, int, int]]:
+    if len(data) < 30:
+        return None
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return "WEBP", width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        (bits,) = struct.unpack("<I", data[21:25])
+        return "WEBP", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return "WEBP", width, height
+    return None
+
+
+def _sniff_avif(data: bytes) -> Optional[Tuple[str, int, int]]:
+    (ftyp_size,) = struct.unpack(">I", data[:4])
+    brands = data[8 : max(ftyp_size, 12)]
+    if b"avif" not in brands and b"avis" not in brands:
+        return None
+    # The first image spatial extents box belongs to the primary item
+    offset = data.find(b"ispe")
+    if offset < 0 or offset + 16 > len(data):
+        return None
+    width, height = struct.unpack(">II", data[offset + 8 : offset + 16])
+    return "AVIF", width, height
+
+
+def sniff_image(data: bytes) -> Optional[Tuple[str, int, int]]:
+    """
+    Read `(format, width, height)` from the first bytes of an image.
+
+    Supports PNG, JPEG, GIF, WebP, AVIF and SVG. Returns None when the format
+    is unknown or more bytes are needed to find the dimensions.
+    """
+    try:
+        if data.startswith(b"\x89PNG\r\n\x1a\n") and len(data) >= 24:
+            width, height = struct.unpack(">II", data[16:24])
+            return "PNG", width, height
+        if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+            width, height = struct.unpack("<HH", data[6:10])
+            return "GIF", width, height
+        if data.startswith(b"\xff\xd8"):
+            return _sniff_jpeg(data)
+        if data.startswith(b"RIFF") and data[8:12] == b"WEBP":
+            return _sniff_webp(data)
+        if data[4:8] == b"ftyp":
+            return _sniff_avif(data)
+        if b"<svg" in data[:SNIFF_MAX_BYTES].lower():
+            return _sniff_svg(data)
+    except struct.error:
+        pass
+    return None
+
+
+def _content_length(response: requests.Response) -> Optional[int]:
+    """Byte size from the headers, unless the body is content-encoded."""
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        return None
+    try:
+        return int(response.headers["Content-Length"])
+    except (KeyError, ValueError):
+        return None
+
+
+# A queued probe: its future, the caller's context, the image URL and when
+# the page's probing started
+_Probe = Tuple[Future, contextvars.Context, str, float]
+
+
+class ImageProber:
+    """
+    Fetch image metadata concurrently on a bounded thread pool.
+
+    `max_workers` caps concurrent downloads process-wide, `per_host` caps
+    connections to any single host, `timeout` applies to each request and
+    `deadline` bounds the total time spent probing one page's images.
+    Requests go through `client` (the shared HTTP client by default).
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        per_host: int = 4,
+        timeout: float = 10,
+        deadline: float = 30,
+        client: Optional[HttpClient] = None,
+    ):
+        self.per_host = per_host
+        self.timeout = timeout
+        self.deadline = deadline
+        self.client = client or http_client
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="image-probe"
+        )
+        # Probes running and waiting per host; a host is dropped once idle
+        self._running: Dict[str, int] = {}
+        self._waiting: Dict[str, Deque[_Probe]] = {}
+        self._lock = threading.Lock()
+
+    def probe_all(self, images: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Probe `(image_url, alt)` pairs and return their records in input order.
+
+        Images that answer with a non-200 status are skipped; images that fail
+        or do not finish before the deadline get a record with an `error`.
+        """
+        started = time.monotonic()
+        # Each probe runs in a copy of the caller's context, so the bytes it
+        # downloads count towards the caller's job
+        futures = [self._submit(img_url, started) for img_url, _ in images]
+        done, _ = wait(futures, timeout=self.deadline)
+
+        images_data = []
+        for (img_url, alt), future in zip(images, futures):
+            if future not in done:
+                future.cancel()
+                error = "Image probe exceeded the total deadline"
+            else:
+                try:
+                    details = future.result()
+                except Exception as e:
+                    error = str(e)
+                else:
+                    if details is None:
+                        continue
+                    images_data.append(
+                        {
+                            "url": img_url,
+                            "alt": alt,
+                            "width": details["width"],
+                            "height": details["height"],
+                            "size_kb": details["size"] / 1024,
+                            # Only a lower bound: counting stopped at the limit
+                            "size_truncated": details["size_truncated"],
+                            "format": details["format"],
+                            "has_alt_text": bool(alt),
+                        }
+                    )
+                    continue
+
+            # If we can't analyze the image, add basic info
+            images_data.append(
+                {"url": img_url, "alt": alt, "error": error, "has_alt_text": bool(alt)}
+            )
+
+        return images_data
+
+    def _submit(self, img_url: str, started: float) -> Future:
+        """
+        Queue a probe of `img_url`. It runs right away unless its host already
+        has `per_host` probes running; then it waits for one of them to end,
+        without holding a pool thread meanwhile.
+        """
+        probe = (Future(), contextvars.copy_context(), img_url, started)
+        host = urlparse(img_url).netloc.lower()
+        with self._lock:
+            if self._running.get(host, 0) >= self.per_host:
+                self._waiting.setdefault(host, deque()).append(probe)
+                return probe[0]
+            self._running[host] = self._running.get(host, 0) + 1
+        self._executor.submit(self._run, host, probe)
+        return probe[0]
+
+    def _run(self, host: str, probe: _Probe) -> None:
+        future, context, img_url, started = probe
+        try:
+            # False when the caller gave up on it while it was queued
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = context.run(self._probe_guarded, img_url, started)
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            with self._lock:
+                waiting = self._waiting.get(host)
+                probe = waiting.popleft() if waiting else None
+                if waiting is not None and not waiting:
+                    del self._waiting[host]
+                if probe is None:
+                    self._running[host] -= 1
+                    if not self._running[host]:
+                        del self._running[host]
+            if probe is not None:
+                # Hand the host's slot on through the pool queue, so other
+                # hosts' probes get their turn
+                self._executor.submit(self._run, host, probe)
+
+    def _probe_guarded(self, img_url: str, started: float) -> Optional[Dict[str, Any]]:
+        if time.monotonic() - started >= self.deadline:
+            raise TimeoutError("Image probe exceeded the total deadline")
+        return self._probe(img_url)
+
+    def _probe(self, img_url: str) -> Optional[Dict[str, Any]]:
+        """
+        Return width, height, format and byte size, or None on a non-200.
+
+        Only the first few KB are read to find the dimensions; the size comes
+        from Content-Length when the server sends it. The whole body (up to
+        the client's byte limit) is downloaded only when the size is unknown
+        or the header can't be parsed. Responses that aren't images are
+        refused before their body is read.
+        """
+        with self.client.get(img_url, timeout=self.timeout) as img_response:
+            if img_response.status_code != 200:
+                return None
+            require_content_type(img_url, img_response.headers, IMAGE_CONTENT_TYPES)
+
+            size = _content_length(img_response)
+            chunks = img_response.iter_content(chunk_size=SNIFF_CHUNK_SIZE)
+            head = b""
+            sniffed = None
+            for chunk in chunks:
+                head += chunk
+                sniffed = sniff_image(head)
+                if sniffed or len(head) >= SNIFF_MAX_BYTES:
+                    break
+
+            if sniffed is None:
+                # Unknown format or unusually large header: decode it all
+                content = head + read_body(img_response, self.client.max_bytes)
+                add_total("downloaded_bytes", len(content))
+                img_obj = Image.open(io.BytesIO(content))
+                width, height = img_obj.size
+                return {
+                    "width": width,
+                    "height": height,
+                    "format": img_obj.format,
+                    "size": len(content),
+                    "size_truncated": False,
+                }
+
+            downloaded = len(head)
+            size_truncated = False
+            if size is None:
+                # Count the remaining bytes without keeping them in memory,
+                # giving up past the client's limit
+                for chunk in chunks:
+                    downloaded += len(chunk)
+                    if downloaded > self.client.max_bytes:
+                        size_truncated = True
+                        break
+                size = downloaded
+            add_total("downloaded_bytes", downloaded)
+
+            image_format, width, height = sniffed
+            return {
+                "width": width,
+                "height": height,
+                "format": image_format,
+                "size": size,
+                "size_truncated": size_truncated,
+            }
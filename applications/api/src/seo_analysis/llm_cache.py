@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from crewai import BaseLLM
+
+from .metrics import span
+
+
+def content_hash(data: Any) -> str:
+    """Stable hash of JSON-serializable page data, e.g. extracted page facts."""
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+_stop_words_lock = threading.Lock()
+
+
+def add_stop_words(llm: BaseLLM, stop: Sequence[str]) -> None:
+    """
+    Make the LLM wrapped by an agent's LLM stop at the agent's stop words,
+    which the agent executor sets on the wrapper. Every agent uses the same
+    ReAct stop words, so the wrapped LLM is updated in place rather than
+    called through a copy, which would lose what it records on each call.
+    """
+    if all(word in (llm.stop or []) for word in stop):
+        return
+    with _stop_words_lock:
+        current = list(llm.stop or [])
+        llm.stop = current + [word for word in stop if word not in current]
+
+
+class TimedLLM(BaseLLM):
+    """Wrap an agent's LLM and record every call as an "llm_call" span."""
+
+    def __init__(self, llm: BaseLLM):
+        super().__init__(model=llm.model, temperature=llm.temperature)
+        self.llm = llm
+        self.stop = list(llm.stop or [])
+
+    def call(
+        self,
+        messages: Union[str, List[Dict[str, str]]],
+        tools: Optional[List[dict]] = None,
+        callbacks: Optional[List[Any]] = None,
+        available_functions: Optional[Dict[str, Any]] = None,
+    ) -> Union[str, Any]:
+        # The executor sets our stop words
+        add_stop_words(self.llm, self.stop)
+        with span("llm_call", model=self.model):
+            return self.llm.call(messages, tools, callbacks, available_functions)
+
+    def supports_stop_words(self) -> bool:
+        return self.llm.supports_stop_words()
+
+    def supports_function_calling(self) -> bool:
+        supports = getattr(self.llm, "supports_function_calling", None)
+        return supports() if supports else False
+
+    def get_context_window_size(self) -> int:
+        return self.llm.get_context_window_size()
+
+
+class LLMResponseCache:
+    """
+    On-disk cache of LLM responses, bounded by total size and age.
+
+    When the stored responses exceed `max_bytes`, the least recently used
+    ones are evicted; entries older than `ttl` seconds are never served.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+    """
+
+    # Running total of the response sizes, kept by triggers so `set` doesn't
+    # sum the whole table; the first open counts the responses already stored
+    SIZE_TOTAL = """
+        BEGIN IMMEDIATE;
+        CREATE TABLE IF NOT EXISTS size_total (bytes INTEGER NOT NULL);
+        INSERT INTO size_total (bytes)
+            SELECT (SELECT COALESCE(SUM(size), 0) FROM responses)
+            WHERE NOT EXISTS (SELECT 1 FROM size_total);
+        CREATE TRIGGER IF NOT EXISTS responses_inserted AFTER INSERT ON responses
+            BEGIN UPDATE size_total SET bytes = bytes + NEW.size; END;
+        CREATE TRIGGER IF NOT EXISTS responses_updated
+            AFTER UPDATE OF size ON responses
+            BEGIN UPDATE size_total SET bytes = bytes + NEW.size - OLD.size; END;
+        CREATE TRIGGER IF NOT EXISTS responses_deleted AFTER DELETE ON responses
+            BEGIN UPDATE size_total SET bytes = bytes - OLD.size; END;
+        COMMIT;
+    """
+
+    def __init__(self, path: str, max_bytes: int = 100 * 1024 * 1024, ttl=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(self.SCHEMA)
+        self._connection().executescript(self.SIZE_TOTAL)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        return content_hash(parts)
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        response, created_at = row
+        if self.ttl is not None and time.time() - created_at > self.ttl:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        conn.execute(
+            "UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key)
+        )
+        return response
+
+    def set(self, key: str, response: str) -> None:
+        now = time.time()
+        conn = self._connection()
+        # An upsert rather than INSERT OR REPLACE: replaced rows don't fire
+        # the delete trigger
+        conn.execute(
+            "INSERT INTO responses "
+            "(key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET response = excluded.response, "
+            "size = excluded.size, created_at = excluded.created_at, "
+            "accessed_at = excluded.accessed_at",
+            (key, response, len(response.encode("utf-8")), now, now),
+        )
+        self._evict(conn)
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM responses")
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        (total,) = conn.execute("SELECT bytes FROM size_total").fetchone()
+        if total <= self.max_bytes:
+            return
+        # Walk from least recently used until enough bytes are freed
+        excess = total - self.max_bytes
+        doomed = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at"
+        ):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+
+class CachedLLM(BaseLLM):
+    """
+    Wrap any CrewAI LLM (or a fake stand-in with the same `call` signature)
+    and serve repeated prompts from an `LLMResponseCache`.
+
+    The cache key covers the model, temperature, stop words, prompt messages
+    and `context_hash` (a hash of the page data the prompts were built from),
+    so a changed page never hits a stale entry.
+    """
+
+    def __init__(self, llm: BaseLLM, cache: LLMResponseCache, context_hash: str = ""):
+        super().__init__(model=llm.model, temperature=llm.temperature)
+        self.llm = llm
+        self.cache = cache
+        self.context_hash = context_hash
+        self.stop = list(llm.stop or [])
+
+    def call(
+        self,
+        messages: Union[str, List[Dict[str, str]]],
+        tools: Optional[List[dict]] = None,
+        callbacks: Optional[List[Any]] = None,
+        available_functions: Optional[Dict[str, Any]] = None,
+    ) -> Union[str, Any]:
+        key = self.cache.make_key(
+            model=self.model,
+            temperature=self.temperature,
+            stop=sorted(self.stop or []),
+            messages=messages,
+            tools=tools,
+            context_hash=self.context_hash,
+        )
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        add_stop_words(self.llm, self.stop)
+        response = self.llm.call(messages, tools, callbacks, available_functions)
+        if isinstance(response, str):
+            self.cache.set(key, response)
+        return response
+
+    def supports_stop_words(self) -> bool:
+        return self.llm.supports_stop_words()
+
+    def supports_function_calling(self) -> bool:
+        supports = getattr(self.llm, "supports_function_calling", None)
+        return supports() if supports else False
+
+    def get_context_window_size(self) -> int:
+        return self.llm.get_context_window_size()
@@ -0,0 +1,301 @@
+import bisect
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Histogram bucket upper bounds, in seconds
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+JOB_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+# Spans kept per job; a batch of thousands of pages only keeps its first ones
+MAX_TRACE_SPANS = 1000
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _label_text(self, key: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [
+            f'{label}="{_escape(value)}"' for label, value in zip(self.labels, key)
+        ]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return super().render() + [
+            f"{self.name}{self._label_text(key)} {_number(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = STAGE_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (count per bucket, +Inf last; sum)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(c), s)) for key, (c, s) in self._values.items())
+        lines = super().render()
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                labels = self._label_text(key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of `sorted_values` (in ascending order): the
+    smallest value that at least `fraction` of the values are at or below.
+    """
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+# ====== METRICS ======
+stage_seconds = Histogram(
+    "seo_stage_duration_seconds",
+    "Time spent in each analysis stage (fetch, extraction, tools, crew tasks)",
+    labels=("stage",),
+)
+llm_call_seconds = Histogram(
+    "seo_llm_call_duration_seconds", "Latency of LLM calls made by the agents"
+)
+llm_tokens = Counter(
+    "seo_llm_tokens_total", "LLM tokens used by the agents", labels=("type",)
+)
+downloaded_bytes = Counter(
+    "seo_downloaded_bytes_total", "Bytes downloaded from analyzed sites"
+)
+queue_wait_seconds = Histogram(
+    "seo_job_queue_wait_seconds",
+    "Time jobs waited in the queue before a worker claimed them",
+    buckets=JOB_BUCKETS,
+)
+job_seconds = Histogram(
+    "seo_job_duration_seconds",
+    "Time workers spent running each job",
+    labels=("kind", "status"),
+    buckets=JOB_BUCKETS,
+)
+worker_busy_seconds = Counter(
+    "seo_worker_busy_seconds_total", "Time this process's workers spent running jobs"
+)
+workers_gauge = Gauge(
+    "seo_workers", "Analysis workers of this process", labels=("state",)
+)
+jobs_gauge = Gauge("seo_jobs", "Jobs in the store by status", labels=("status",))
+
+REGISTRY = [
+    stage_seconds,
+    llm_call_seconds,
+    llm_tokens,
+    downloaded_bytes,
+    queue_wait_seconds,
+    job_seconds,
+    worker_busy_seconds,
+    workers_gauge,
+    jobs_gauge,
+]
+
+# Per-job totals (see `Trace.add`) and the counters they feed
+_TOTAL_COUNTERS = {
+    "downloaded_bytes": (downloaded_bytes, {}),
+    "prompt_tokens": (llm_tokens, {"type": "prompt"}),
+    "completion_tokens": (llm_tokens, {"type": "completion"}),
+}
+
+
+def render_metrics() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ====== PER-JOB TRACES ======
+class Trace:
+    """
+    Spans and totals recorded while running one job, to be stored with it.
+
+    While a trace is active (see `record_trace`) spans and totals go to the
+    trace only; they reach the histograms when the stored trace is passed
+    to `observe_job`, so jobs run by other processes are counted too.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.totals: Dict[str, float] = {}
+        self.dropped_spans = 0
+        self._lock = threading.Lock()
+
+    def add_span(self, stage: str, started: float, seconds: float, **attrs) -> None:
+        entry = {
+            "stage": stage,
+            "start_ms": round(1000 * (started - self.started), 1),
+            "duration_ms": round(1000 * seconds, 1),
+            **attrs,
+        }
+        with self._lock:
+            if len(self.spans) < MAX_TRACE_SPANS:
+                self.spans.append(entry)
+            else:
+                self.dropped_spans += 1
+
+    def add(self, name: str, amount: float) -> None:
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0) + amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "spans": sorted(self.spans, key=lambda entry: entry["start_ms"]),
+                "totals": dict(self.totals),
+                "dropped_spans": self.dropped_spans,
+            }
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+    "seo_trace", default=None
+)
+
+
+@contextmanager
+def record_trace() -> Iterator[Trace]:
+    """
+    Collect the spans of everything run in this context into a new trace.
+    Threads started from it must run in a copy of the context
+    (`contextvars.copy_context().run`) for their spans to be included.
+    """
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def record_span(stage: str, started: float, seconds: float, **attrs) -> None:
+    """Record a span timed by the caller (`started` from `time.perf_counter`)."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(stage, started, seconds, **attrs)
+    elif stage == "llm_call":
+        llm_call_seconds.observe(seconds)
+    else:
+        stage_seconds.observe(seconds, stage=stage)
+
+
+@contextmanager
+def span(stage: str, **attrs) -> Iterator[Dict[str, Any]]:
+    """
+    Time the block as `stage`. The yielded dict holds the span's attributes;
+    add to it to store more details with the span.
+    """
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        record_span(stage, started, time.perf_counter() - started, **attrs)
+
+
+def add_total(name: str, amount: float) -> None:
+    """Add to a per-job total such as "downloaded_bytes" or "prompt_tokens"."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, amount)
+    elif name in _TOTAL_COUNTERS:
+        counter, labels = _TOTAL_COUNTERS[name]
+        counter.inc(amount, **labels)
+
+
+def observe_job(job: Dict[str, Any]) -> None:
+    """Add a finished job's stored metrics to the histograms and counters."""
+    metrics = job["metrics"]
+    if metrics.get("queue_wait_seconds") is not None:
+        queue_wait_seconds.observe(metrics["queue_wait_seconds"])
+    if metrics.get("run_seconds") is not None:
+        job_seconds.observe(
+            metrics["run_seconds"], kind=job["kind"], status=job["status"]
+        )
+    for entry in metrics.get("spans", []):
+        seconds = entry["duration_ms"] / 1000
+        if entry["stage"] == "llm_call":
+            llm_call_seconds.observe(seconds)
+        else:
+            stage_seconds.observe(seconds, stage=entry["stage"])
+    for name, amount in metrics.get("totals", {}).items():
+        if name in _TOTAL_COUNTERS:
+            counter, labels = _TOTAL_COUNTERS[name]
+            counter.inc(amount, **labels)
@@ -0,0 +1,94 @@
+# Page extraction: the CPU-bound stage of the analysis tools
+#
+# Kept apart from `tools` (and crewai) so the extraction pool's processes
+# only import what parsing a page and analyzing its text needs.
+
+import dataclasses
+import time
+from typing import Any, Dict, Optional
+
+from .extract import PageFacts, extract_body_facts
+from .text_stats import analyze_text, stopword_language
+
+
+def extract_page(
+    url: str, body: bytes, encoding: Optional[str], truncated: bool = False
+) -> Dict[str, Any]:
+    """
+    The CPU-bound stage of the tools: parse a downloaded page and analyze its
+    text. Takes and returns plain data so it can run in the extraction pool.
+    Returns {"facts": PageFacts fields, "structure_analysis": ...,
+    "timings": seconds spent parsing and analyzing the text}.
+    """
+    started = time.perf_counter()
+    facts = extract_body_facts(body, encoding)
+    parsed = time.perf_counter()
+    structure_analysis = build_structure_analysis(url, facts, truncated)
+    return {
+        "facts": dataclasses.asdict(facts),
+        "structure_analysis": structure_analysis,
+        "timings": {
+            "parse": parsed - started,
+            "text_analysis": time.perf_counter() - parsed,
+        },
+    }
+
+
+def build_structure_analysis(
+    url: str, facts: PageFacts, truncated: bool = False
+) -> Dict[str, Any]:
+    """
+    Build the `analyze_page_structure` result from extracted page facts;
+    `truncated` tells whether they only cover the start of the page.
+    """
+    title = facts.title
+    meta_description = facts.meta_description
+    headings = {tag: list(texts) for tag, texts in facts.headings.items()}
+
+    # Get page text and split into paragraphs
+    page_text = facts.content_text
+    paragraphs = [p for p in page_text.split("\n") if p.strip()]
+
+    # Analyze content
+    stats = analyze_text(page_text, language=stopword_language(facts.language))
+    word_count = stats.word_count
+    sentence_count = stats.sentence_count
+
+    # Images in the main content and their attributes
+    images = [
+        {
+            "src": img["src"],
+            "alt": img["alt"],
+            "width": img["width"],
+            "height": img["height"],
+            "has_alt_text": bool(img["alt"]),
+        }
+        for img in facts.images
+        if img["in_content"]
+    ]
+
+    # Create structured analysis object
+    return {
+        "url": url,
+        "truncated": truncated,
+        "title": title,
+        "title_length": len(title),
+        "meta_description": meta_description,
+        "meta_description_length": len(meta_description),
+        "headings": headings,
+        "h1_count": len(headings["h1"]),
+        "content_stats": {
+            "word_count": word_count,
+            "sentence_count": sentence_count,
+            "paragraphs": len(paragraphs),
+            "avg_words_per_sentence": word_count / max(sentence_count, 1),
+        },
+        "top_keywords": stats.top_keywords,
+        "top_phrases": stats.top_phrases,
+        "images": {
+            "total_count": len(images),
+            "with_alt_text": sum(1 for img in images if img["has_alt_text"]),
+            "without_alt_text": sum(1 for img in images if not img["has_alt_text"]),
+            "image_data": images[:10],  # Limit to first 10 images
+        },
+    }
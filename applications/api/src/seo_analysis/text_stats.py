@@ -0,0 +1,177 @@
+import functools
+import os
+import re
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, List, Tuple
+
+import nltk
+from nltk.corpus import stopwords
+
+# Fetch missing NLTK data on first use; images that bundle the data (see the
+# Dockerfile) turn this off so analyses never depend on the network
+NLTK_AUTO_DOWNLOAD = os.getenv("NLTK_AUTO_DOWNLOAD", "true").lower() == "true"
+
+# NLTK package name -> resource path checked with `nltk.data.find`
+NLTK_RESOURCES = {
+    "stopwords": "corpora/stopwords",
+}
+
+nltk_data_dir = os.path.expanduser("~/nltk_data")
+nltk.data.path.append(nltk_data_dir)
+_nltk_data_ready = False
+
+DEFAULT_LANGUAGE = "english"
+
+# <html lang> primary subtag -> NLTK stopword list
+LANGUAGE_CODES = {
+    "ar": "arabic",
+    "da": "danish",
+    "de": "german",
+    "el": "greek",
+    "en": "english",
+    "es": "spanish",
+    "fi": "finnish",
+    "fr": "french",
+    "hu": "hungarian",
+    "id": "indonesian",
+    "it": "italian",
+    "nb": "norwegian",
+    "nl": "dutch",
+    "nn": "norwegian",
+    "no": "norwegian",
+    "pt": "portuguese",
+    "ro": "romanian",
+    "ru": "russian",
+    "sl": "slovene",
+    "sv": "swedish",
+    "tr": "turkish",
+}
+
+# Words (letters/digits, with inner apostrophes or hyphens) and sentence ends
+TOKEN_PATTERN = re.compile(r"(?P<word>\w+(?:['’-]\w+)*)|(?P<end>[.!?]+)")
+
+# Keywords shorter than this are ignored
+MIN_KEYWORD_LENGTH = 4
+PHRASE_SIZES = (2, 3)
+
+
+def ensure_nltk_data() -> None:
+    """
+    Make sure the NLTK stopword data is installed locally.
+
+    Only looks at the local data paths unless a resource is missing and
+    NLTK_AUTO_DOWNLOAD is enabled.
+    """
+    global _nltk_data_ready
+    if _nltk_data_ready:
+        return
+    for package, resource in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            if not NLTK_AUTO_DOWNLOAD:
+                raise LookupError(
+                    f"NLTK resource '{package}' is not installed; run "
+                    f"`python -m nltk.downloader {package}` or set "
+                    "NLTK_AUTO_DOWNLOAD=true"
+                )
+            nltk.download(package, download_dir=nltk_data_dir, quiet=True)
+    _nltk_data_ready = True
+
+
+def stopword_language(lang: str) -> str:
+    """Map an `<html lang>` value such as "de-AT" to an NLTK stopword list."""
+    code = lang.strip().lower().replace("_", "-").split("-")[0]
+    return LANGUAGE_CODES.get(code, DEFAULT_LANGUAGE)
+
+
+@functools.lru_cache(maxsize=None)
+def stopwords_for(language: str = DEFAULT_LANGUAGE) -> FrozenSet[str]:
+    """Stopwords for `language`, loaded once per process."""
+    ensure_nltk_data()
+    if language not in stopwords.fileids():
+        language = DEFAULT_LANGUAGE
+    return frozenset(stopwords.words(language))
+
+
+@dataclass
+class TextStats:
+    word_count: int = 0
+    sentence_count: int = 0
+    # (keyword, count), most frequent first
+    top_keywords: List[Tuple[str, int]] = field(default_factory=list)
+    # "bigrams"/"trigrams" -> [{"phrase", "count", "density"}], most frequent first
+    top_phrases: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+
+
+def analyze_text(
+    text: str,
+    language: str = DEFAULT_LANGUAGE,
+    top_k: int = 20,
+    top_phrases: int = 10,
+) -> TextStats:
+    """
+    Count words, sentences, keywords and key phrases in one pass over `text`.
+
+    Keywords are lowercased words of at least MIN_KEYWORD_LENGTH characters
+    that aren't stopwords. Phrases are runs of two or three words inside one
+    sentence that neither start nor end with a stopword; their density is the
+    share of all words, in percent.
+    """
+    stop_words = stopwords_for(language)
+    keywords: Counter = Counter()
+    phrases = {size: Counter() for size in PHRASE_SIZES}
+    window: deque = deque(maxlen=max(PHRASE_SIZES))
+    word_count = 0
+    sentence_count = 0
+    in_sentence = False
+
+    for match in TOKEN_PATTERN.finditer(text):
+        word = match.group("word")
+        if word is None:
+            # Sentence end: phrases don't span sentences
+            in_sentence = False
+            window.clear()
+            continue
+
+        word_count += 1
+        if not in_sentence:
+            in_sentence = True
+            sentence_count += 1
+
+        word = word.lower()
+        if not word.isalnum():
+            # Contractions, hyphenated words and underscores break phrases
+            window.clear()
+            continue
+        is_stopword = word in stop_words
+        if not is_stopword and len(word) >= MIN_KEYWORD_LENGTH:
+            keywords[word] += 1
+
+        window.append((word, is_stopword))
+        if is_stopword:
+            continue
+        for size in PHRASE_SIZES:
+            if len(window) >= size and not window[-size][1]:
+                phrase = " ".join(w for w, _ in list(window)[-size:])
+                phrases[size][phrase] += 1
+
+    return TextStats(
+        word_count=word_count,
+        sentence_count=sentence_count,
+        top_keywords=keywords.most_common(top_k),
+        top_phrases={
+            name: [
+                {
+                    "phrase": phrase,
+                    "count": count,
+                    "density": round(100 * count / max(word_count, 1), 2),
+                }
+                for phrase, count in phrases[size].most_common(top_phrases)
+                # A phrase seen once isn't a key phrase
+                if count > 1
+            ]
+            for name, size in (("bigrams", 2), ("trigrams", 3))
+        },
+    )
@@ -1,257 +1,347 @@
 import os
-import requests
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List, Mapping, Optional, Tuple
 from urllib.parse import urljoin, urlparse
-import io
-import re
 
+import requests
 from bs4 import BeautifulSoup
-from nltk.tokenize import sent_tokenize, word_tokenize
-from PIL import Image
-
-from nltk.corpus import stopwords
 from crewai.tools import tool
 from dotenv import load_dotenv
 
+from .cache import CachedAnalysis, CachedPage, PageCache
+from .extract import PageFacts, resolve_parser_backend
+from .extraction_pool import extraction_pool
+from .http_client import http_client, page_charset, read_prefix, require_content_type
+from .images import ImageProber
+from .llm_cache import content_hash
+from .metrics import add_total, record_span, span
+from .structure import build_structure_analysis, extract_page
+
 load_dotenv()
 
-USER_AGENT = os.getenv(
-    "USER_AGENT",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "900"))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "128"))
+# Most bytes of page bodies kept in the page cache, per process
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Most bytes of a page downloaded and analyzed; longer pages are cut short
+# and their results flagged "truncated"
+PAGE_MAX_BYTES = int(os.getenv("PAGE_MAX_BYTES", str(5 * 1024 * 1024)))
+IMAGE_PROBE_WORKERS = int(os.getenv("IMAGE_PROBE_WORKERS", "8"))
+IMAGE_PROBE_PER_HOST = int(os.getenv("IMAGE_PROBE_PER_HOST", "4"))
+IMAGE_PROBE_TIMEOUT = float(os.getenv("IMAGE_PROBE_TIMEOUT", "10"))
+IMAGE_PROBE_DEADLINE = float(os.getenv("IMAGE_PROBE_DEADLINE", "30"))
+QUICK_ANALYSIS_CACHE_TTL = float(os.getenv("QUICK_ANALYSIS_CACHE_TTL", "300"))
+QUICK_ANALYSIS_CACHE_MAX_ENTRIES = int(
+    os.getenv("QUICK_ANALYSIS_CACHE_MAX_ENTRIES", "256")
+)
+
+# Media types analyzed as pages; anything else is refused before its body
+# is downloaded
+PAGE_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+# Shared by every tool so one analysis fetches and parses the target page once
+page_cache = PageCache(
+    ttl=PAGE_CACHE_TTL,
+    max_entries=PAGE_CACHE_MAX_ENTRIES,
+    max_bytes=PAGE_CACHE_MAX_BYTES,
 )
 
+# Structure analyses served by the quick analysis endpoint
+quick_analysis_cache = PageCache(
+    ttl=QUICK_ANALYSIS_CACHE_TTL, max_entries=QUICK_ANALYSIS_CACHE_MAX_ENTRIES
+)
+
+image_prober = ImageProber(
+    max_workers=IMAGE_PROBE_WORKERS,
+    per_host=IMAGE_PROBE_PER_HOST,
+    timeout=IMAGE_PROBE_TIMEOUT,
+    deadline=IMAGE_PROBE_DEADLINE,
+    client=http_client,
+)
+
+
+def conditional_headers(
+    etag: Optional[str], last_modified: Optional[str]
+) -> Dict[str, str]:
+    """Request headers revalidating a page with the given validators."""
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def record_extraction(extracted: Dict[str, Any], started: float) -> None:
+    """
+    Record the stages of an `extract_page` call started at `started`; they
+    ran in the extraction pool, so they are timed there and reported here.
+    """
+    timings = extracted["timings"]
+    record_span("parse", started, timings["parse"])
+    record_span("text_analysis", started + timings["parse"], timings["text_analysis"])
+
+
+def _get_page(
+    url: str, headers: Dict[str, str]
+) -> Tuple[requests.Response, bytes, bool]:
+    """
+    GET a page, reading at most PAGE_MAX_BYTES of its body. Returns the
+    response, the body and whether it was cut short. Error statuses and
+    non-HTML responses raise before the body is downloaded; a 304 has no body.
+    """
+    body = b""
+    truncated = False
+    with span("fetch") as attrs:
+        with http_client.get(url, headers=headers) as response:
+            attrs["status"] = response.status_code
+            if response.status_code != 304:
+                response.raise_for_status()
+                require_content_type(url, response.headers, PAGE_CONTENT_TYPES)
+                body, truncated = read_prefix(response, PAGE_MAX_BYTES)
+                attrs.update(bytes=len(body), truncated=truncated)
+                add_total("downloaded_bytes", len(body))
+    return response, body, truncated
+
+
+def _page_from_response(url: str, response, body: bytes, truncated: bool) -> CachedPage:
+    encoding = page_charset(response.headers, body)
+    started = time.perf_counter()
+    extracted = extraction_pool.run(extract_page, url, body, encoding, truncated)
+    record_extraction(extracted, started)
+    return page_from_extraction(
+        url, response.headers, body, encoding, truncated, extracted
+    )
+
+
+def page_from_extraction(
+    url: str,
+    headers: Mapping[str, str],
+    body: bytes,
+    encoding: str,
+    truncated: bool,
+    extracted: Dict[str, Any],
+) -> CachedPage:
+    """The cache entry of a page, from its response headers and `extract_page` result."""
+    return CachedPage(
+        url=url,
+        body=body,
+        encoding=encoding,
+        facts=PageFacts(**extracted["facts"]),
+        etag=headers.get("ETag"),
+        last_modified=headers.get("Last-Modified"),
+        fetched_at=time.time(),
+        structure_analysis=extracted["structure_analysis"],
+        truncated=truncated,
+    )
+
+
+def _load_page(url: str, stale: Optional[CachedPage]) -> CachedPage:
+    """Fetch and parse a page, revalidating a stale cache entry when possible."""
+    headers = {}
+    if stale is not None:
+        headers = conditional_headers(stale.etag, stale.last_modified)
+
+    response, body, truncated = _get_page(url, headers)
+    if response.status_code == 304 and stale is not None:
+        stale.fetched_at = time.time()
+        return stale
+
+    return _page_from_response(url, response, body, truncated)
+
+
+def fetch_page(url: str) -> CachedPage:
+    """Fetch a page (with its validators) through the shared cache."""
+    return page_cache.get(url, _load_page)
+
+
+def fetch_page_if_modified(
+    url: str, etag: Optional[str] = None, last_modified: Optional[str] = None
+) -> Optional[CachedPage]:
+    """
+    Fetch a page unless it is unchanged since the given validators.
+
+    Returns None when the server answers the conditional GET with 304 Not
+    Modified. A fresh cached copy is returned without asking the server;
+    a downloaded page is added to the cache for the tools to use.
+    """
+    cached = page_cache.peek(url)
+    if cached is not None or not (etag or last_modified):
+        return fetch_page(url)
+
+    response, body, truncated = _get_page(url, conditional_headers(etag, last_modified))
+    if response.status_code == 304:
+        return None
+    page = _page_from_response(url, response, body, truncated)
+    page_cache.put(url, page)
+    return page
+
+
+def page_structure_analysis(url: str, page: CachedPage) -> Dict[str, Any]:
+    """The `analyze_page_structure` result of a cached page, for `url`."""
+    if page.structure_analysis is None:
+        page.structure_analysis = build_structure_analysis(
+            page.url, page.facts, page.truncated
+        )
+    # The page may have been cached under another spelling of the URL
+    return {**page.structure_analysis, "url": url}
+
+
+def _load_quick_analysis(url: str, stale: Optional[CachedAnalysis]) -> CachedAnalysis:
+    result = page_structure_analysis(url, fetch_page(url))
+    return CachedAnalysis(
+        url=url,
+        result=result,
+        etag=content_hash(result),
+        fetched_at=time.time(),
+    )
+
+
+def quick_structure_analysis(url: str) -> CachedAnalysis:
+    """
+    The `analyze_page_structure` result for `url`, computed at most once per
+    QUICK_ANALYSIS_CACHE_TTL. Concurrent requests for the same page share
+    one computation.
+    """
+    return quick_analysis_cache.get(url, _load_quick_analysis)
+
+
+def build_layout_analysis(facts: PageFacts) -> Dict[str, Any]:
+    """Build the page layout section of `analyze_visual_elements`."""
+    return {
+        "viewport_meta": facts.viewport_meta,
+        "css_count": facts.css_count,
+        "javascript_count": facts.tag_counts["script"],
+        "iframe_count": facts.tag_counts["iframe"],
+        "table_count": facts.tag_counts["table"],
+        "div_count": facts.tag_counts["div"],
+        "responsive_elements": facts.responsive_elements,
+    }
+
+
+def build_visual_analysis(
+    url: str,
+    facts: PageFacts,
+    images_data: List[Dict[str, Any]],
+    truncated: bool = False,
+) -> Dict[str, Any]:
+    """Build the `analyze_visual_elements` result from facts and image probes."""
+    return {
+        "url": url,
+        "truncated": truncated,
+        "images_analysis": {
+            "count": len(images_data),
+            "data": images_data[:5],  # Limit to first 5 for brevity
+        },
+        "layout_analysis": build_layout_analysis(facts),
+    }
+
+
+def build_landing_page_elements(facts: PageFacts) -> Dict[str, Any]:
+    """Build the landing page specific checks of `analyze_landing_page`."""
+    return {
+        "has_clear_value_proposition": bool(
+            facts.headings["h1"] or facts.headings["h2"]
+        ),
+        "has_call_to_action": facts.has_call_to_action,
+        "form_count": facts.tag_counts["form"],
+        "has_testimonials": facts.has_testimonials,
+        "has_benefits_section": facts.has_benefits_section,
+        "has_schema_markup": facts.has_schema_markup,
+        "has_social_sharing": facts.has_social_sharing,
+        "canonical_url": facts.canonical_url,
+        "mobile_friendly_indicators": facts.viewport_meta,
+    }
+
+
+def fingerprint_sections(url: str, page: CachedPage) -> Dict[str, str]:
+    """
+    Hash the page data each analysis task works from: "content" (the page
+    structure), "visual" (images and layout) and "landing" (landing page
+    elements). A task only needs to run again when its section changed.
+    """
+    facts = page.facts
+    return {
+        "content": content_hash(page_structure_analysis(url, page)),
+        "visual": content_hash(
+            {"images": facts.images, "layout": build_layout_analysis(facts)}
+        ),
+        "landing": content_hash(build_landing_page_elements(facts)),
+    }
+
+
+def _probe_page_images(url: str, facts: PageFacts) -> List[Dict[str, Any]]:
+    base_url = "{0.scheme}://{0.netloc}".format(urlparse(url))
+    images = []
+    for img in facts.images:
+        # Construct absolute URL if relative
+        img_url = img["src"]
+        if not img_url.startswith(("http://", "https://")):
+            img_url = urljoin(base_url, img_url)
+        images.append((img_url, img["alt"]))
+
+    # Get image dimensions and size concurrently
+    with span("probe_images", images=len(images)):
+        return image_prober.probe_all(images)
+
 
 class SEOAnalysisTools:
     """Tools for visual, heading, and content analysis of web pages."""
 
     @staticmethod
     def fetch_page_content(url: str) -> tuple:
-        """Fetch a webpage's HTML content and return BS4 object and raw HTML."""
-        headers = {"User-Agent": USER_AGENT}
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        return soup, response.text
+        """
+        Fetch a webpage's HTML content and return BS4 object and raw HTML.
+
+        The HTML comes from the shared page cache; the analysis tools use
+        `fetch_page_facts` instead and never build a soup. The soup uses lxml
+        when that is the configured parser backend.
+        """
+        page = fetch_page(url)
+        features = "lxml" if resolve_parser_backend() == "lxml" else "html.parser"
+        return BeautifulSoup(page.html, features), page.html
+
+    @staticmethod
+    def fetch_page_facts(url: str) -> PageFacts:
+        """Fetch a webpage through the shared cache and return its extracted facts."""
+        return fetch_page(url).facts
 
     @staticmethod
     @tool("Analyze the page structure of a given URL")
     def analyze_page_structure(url: str) -> Dict[str, Any]:
         """Analyze the page structure including headings, content, and metadata."""
-        soup, html = SEOAnalysisTools.fetch_page_content(url)
-
-        # Extract metadata
-        title = soup.title.text.strip() if soup.title else ""
-        meta_description = ""
-        meta_description_tag = soup.find("meta", {"name": "description"})
-        if meta_description_tag and "content" in meta_description_tag.attrs:
-            meta_description = meta_description_tag["content"]
-
-        # Extract all headings
-        headings = {
-            "h1": [h.text.strip() for h in soup.find_all("h1")],
-            "h2": [h.text.strip() for h in soup.find_all("h2")],
-            "h3": [h.text.strip() for h in soup.find_all("h3")],
-            "h4": [h.text.strip() for h in soup.find_all("h4")],
-            "h5": [h.text.strip() for h in soup.find_all("h5")],
-            "h6": [h.text.strip() for h in soup.find_all("h6")],
-        }
-
-        # Extract main content (simplified approach)
-        # Remove script, style, header, footer, and nav elements
-        for element in soup(["script", "style", "header", "footer", "nav"]):
-            element.decompose()
-
-        # Get page text and split into paragraphs
-        page_text = soup.get_text(separator=" ", strip=True)
-        paragraphs = [p for p in page_text.split("\n") if p.strip()]
-
-        # Analyze content
-        word_count = len(word_tokenize(page_text))
-        sentence_count = len(sent_tokenize(page_text))
-        stop_words = set(stopwords.words("english"))
-        words = [w.lower() for w in word_tokenize(page_text) if w.isalnum()]
-        filtered_words = [w for w in words if w not in stop_words]
-
-        # Calculate keyword density
-        word_freq = {}
-        for word in filtered_words:
-            if len(word) > 3:  # Only count words with more than 3 characters
-                word_freq[word] = word_freq.get(word, 0) + 1
-
-        # Sort by frequency
-        sorted_keywords = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
-        top_keywords = sorted_keywords[:20]
-
-        # Extract images and their attributes
-        images = []
-        for img in soup.find_all("img"):
-            if img.get("src"):
-                image_data = {
-                    "src": img.get("src"),
-                    "alt": img.get("alt", ""),
-                    "width": img.get("width", ""),
-                    "height": img.get("height", ""),
-                    "has_alt_text": bool(img.get("alt")),
-                }
-                images.append(image_data)
-
-        # Create structured analysis object
-        analysis = {
-            "url": url,
-            "title": title,
-            "title_length": len(title),
-            "meta_description": meta_description,
-            "meta_description_length": len(meta_description),
-            "headings": headings,
-            "h1_count": len(headings["h1"]),
-            "content_stats": {
-                "word_count": word_count,
-                "sentence_count": sentence_count,
-                "paragraphs": len(paragraphs),
-                "avg_words_per_sentence": word_count / max(sentence_count, 1),
-            },
-            "top_keywords": top_keywords,
-            "images": {
-                "total_count": len(images),
-                "with_alt_text": sum(1 for img in images if img["has_alt_text"]),
-                "without_alt_text": sum(1 for img in images if not img["has_alt_text"]),
-                "image_data": images[:10],  # Limit to first 10 images
-            },
-        }
-
-        return analysis
+        with span("tool:analyze_page_structure"):
+            return page_structure_analysis(url, fetch_page(url))
 
     @staticmethod
     @tool("Analyze visual elements of a webpage")
     def analyze_visual_elements(url: str) -> Dict[str, Any]:
         """Analyze visual elements of the page including images and layout."""
-        soup, html = SEOAnalysisTools.fetch_page_content(url)
-        base_url = "{0.scheme}://{0.netloc}".format(urlparse(url))
-
-        # Extract images for visual analysis
-        images_data = []
-        for img in soup.find_all("img"):
-            if img.get("src"):
-                # Construct absolute URL if relative
-                img_url = img["src"]
-                if not img_url.startswith(("http://", "https://")):
-                    img_url = urljoin(base_url, img_url)
-
-                try:
-                    # Get image dimensions and size
-                    img_response = requests.get(img_url, stream=True)
-                    if img_response.status_code == 200:
-                        img_size = len(img_response.content)
-                        img_file = io.BytesIO(img_response.content)
-                        img_obj = Image.open(img_file)
-                        width, height = img_obj.size
-
-                        img_data = {
-                            "url": img_url,
-                            "alt": img.get("alt", ""),
-                            "width": width,
-                            "height": height,
-                            "size_kb": img_size / 1024,
-                            "format": img_obj.format,
-                            "has_alt_text": bool(img.get("alt")),
-                        }
-                        images_data.append(img_data)
-                except Exception as e:
-                    # If we can't analyze the image, add basic info
-                    images_data.append(
-                        {
-                            "url": img_url,
-                            "alt": img.get("alt", ""),
-                            "error": str(e),
-                            "has_alt_text": bool(img.get("alt")),
-                        }
-                    )
-
-        # Analyze page layout
-        layout_analysis = {
-            "viewport_meta": bool(soup.find("meta", {"name": "viewport"})),
-            "css_count": len(soup.find_all("link", {"rel": "stylesheet"})),
-            "javascript_count": len(soup.find_all("script")),
-            "iframe_count": len(soup.find_all("iframe")),
-            "table_count": len(soup.find_all("table")),
-            "div_count": len(soup.find_all("div")),
-            "responsive_elements": bool(
-                soup.find_all(class_=re.compile(r"responsive|mobile|flex|grid"))
-            ),
-        }
-
-        return {
-            "url": url,
-            "images_analysis": {
-                "count": len(images_data),
-                "data": images_data[:5],  # Limit to first 5 for brevity
-            },
-            "layout_analysis": layout_analysis,
-        }
+        with span("tool:analyze_visual_elements"):
+            page = fetch_page(url)
+            return build_visual_analysis(
+                url, page.facts, _probe_page_images(url, page.facts), page.truncated
+            )
 
     @staticmethod
     @tool("Comprehensive SEO and UX landing page analysis")
     def analyze_landing_page(url: str) -> Dict[str, Any]:
         """Comprehensive analysis of a landing page for long-term SEO optimization."""
-        # Combine both analyses
-        structure_analysis = SEOAnalysisTools.analyze_page_structure.run(url)
-        visual_analysis = SEOAnalysisTools.analyze_visual_elements.run(url)
-
-        # Get additional landing page specific elements
-        soup, html = SEOAnalysisTools.fetch_page_content(url)
-
-        # Check for important landing page elements
-        call_to_action = bool(
-            soup.find_all(
-                string=re.compile(
-                    r"sign up|get started|try|buy|subscribe|download", re.I
-                )
-            )
-        )
-        form_elements = len(soup.find_all("form"))
-        testimonials = bool(
-            soup.find_all(
-                string=re.compile(r"testimonial|review|customer|client", re.I)
+        with span("tool:analyze_landing_page"):
+            # Every section is built from the same single-pass extraction
+            page = fetch_page(url)
+            facts = page.facts
+            structure_analysis = page_structure_analysis(url, page)
+            visual_analysis = build_visual_analysis(
+                url, facts, _probe_page_images(url, facts)
             )
-        )
-        benefits_section = bool(
-            soup.find_all(string=re.compile(r"benefit|feature|why|advantage", re.I))
-        )
-
-        # Check for schema markup
-        schema_markup = bool(soup.find_all("script", {"type": "application/ld+json"}))
-
-        # Check for Social Sharing elements
-        social_elements = bool(
-            soup.find_all(
-                class_=re.compile(r"social|share|facebook|twitter|linkedin", re.I)
-            )
-        )
 
-        # Check for canonical URL
-        canonical = soup.find("link", {"rel": "canonical"})
-        canonical_url = canonical["href"] if canonical else None
-
-        # Additional landing page analysis
-        landing_page_elements = {
-            "has_clear_value_proposition": bool(soup.find_all(["h1", "h2"], limit=2)),
-            "has_call_to_action": call_to_action,
-            "form_count": form_elements,
-            "has_testimonials": testimonials,
-            "has_benefits_section": benefits_section,
-            "has_schema_markup": schema_markup,
-            "has_social_sharing": social_elements,
-            "canonical_url": canonical_url,
-            "mobile_friendly_indicators": visual_analysis["layout_analysis"][
-                "viewport_meta"
-            ],
-        }
-
-        # Combine analyses into comprehensive report
-        return {
-            "url": url,
-            "landing_page_elements": landing_page_elements,
-            "structure_analysis": structure_analysis,
-            "visual_analysis": visual_analysis["images_analysis"],
-            "layout_analysis": visual_analysis["layout_analysis"],
-        }
+            # Combine analyses into comprehensive report
+            return {
+                "url": url,
+                "truncated": page.truncated,
+                "landing_page_elements": build_landing_page_elements(facts),
+                "structure_analysis": structure_analysis,
+                "visual_analysis": visual_analysis["images_analysis"],
+                "layout_analysis": visual_analysis["layout_analysis"],
+            }
@@ -0,0 +1,23 @@
+# Entry point of the SEO Analysis API on Flask's built-in server
+#
+#     python -m applications.api.src.server
+#
+# Processes started with "spawn", such as the extraction pool's, import the
+# main module again before they run anything. This one imports the API only
+# when it runs as the program, so those processes don't load Flask, crewai
+# or the background workers.
+
+import os
+
+
+def main():
+    from .api import PORT, create_app
+
+    # For development only - use gunicorn or similar for production
+    port = int(os.environ.get("PORT", PORT))
+    print(f"Server running on port {port}... ")
+    create_app().run(host="0.0.0.0", port=port, debug=True)
+
+
+if __name__ == "__main__":
+    main()
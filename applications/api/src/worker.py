@@ -0,0 +1,539 @@
+# SEO Analysis workers
+
+import argparse
+import dataclasses
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from .job_store import JobStore, create_job_store
+from .seo_analysis import SEOAnalysisTools, create_seo_analysis_crew
+from .seo_analysis.cache import normalize_url
+from .seo_analysis.crawler import (
+    CRAWL_RESPECT_ROBOTS,
+    CrawlScheduler,
+    CrawlStopped,
+    RobotsRules,
+    fetch_sitemap_urls,
+)
+from .seo_analysis.llm_cache import content_hash
+from .seo_analysis.metrics import record_trace, worker_busy_seconds
+from .seo_analysis.tools import fetch_page_if_modified, fingerprint_sections
+
+load_dotenv()
+
+# Configuration from environment variables
+JOB_STORE_URL = os.getenv("JOB_STORE_URL", "sqlite:///seo_jobs.db")
+# Analyses run at the same time by each worker process
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "1"))
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "2"))
+# How often idle workers look for jobs queued by *other* processes; jobs
+# queued through the same process wake a worker immediately
+JOB_STORE_RECHECK_INTERVAL = float(os.getenv("JOB_STORE_RECHECK_INTERVAL", "5"))
+# Jobs of one client (see API_KEYS), and bulk jobs in all, running at once
+# across every process sharing the store (0 for no limit); keep
+# BULK_MAX_RUNNING below the total number of workers to leave room for
+# interactive analyses
+TENANT_MAX_RUNNING = int(os.getenv("TENANT_MAX_RUNNING", "0"))
+BULK_MAX_RUNNING = int(os.getenv("BULK_MAX_RUNNING", "0"))
+# How long shutdown waits for in-flight analyses before requeueing them
+WORKER_SHUTDOWN_TIMEOUT = float(os.getenv("WORKER_SHUTDOWN_TIMEOUT", "300"))
+# Run the (deterministic) page analysis once up front and hand the results to
+# the agents, instead of letting them call the scraping tools through the LLM
+PRECOMPUTE_TOOL_RESULTS = (
+    os.getenv("PRECOMPUTE_TOOL_RESULTS", "false").lower() == "true"
+)
+# Workers renew the lease of each running job every JOB_HEARTBEAT_SECONDS;
+# jobs whose lease went unrenewed for JOB_LEASE_SECONDS are assumed to belong
+# to a dead worker and are requeued
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+# Pages analyzed by one batch job, including those found in a sitemap
+MAX_BATCH_URLS = int(os.getenv("MAX_BATCH_URLS", "5000"))
+# Finished analyses are deleted this many hours after they finish, and once
+# more than MAX_STORED_RESULTS are kept (0 disables either limit); the API
+# process checks every RESULT_REAPER_INTERVAL seconds
+RESULT_TTL_HOURS = float(os.getenv("RESULT_TTL_HOURS", "168"))
+MAX_STORED_RESULTS = int(os.getenv("MAX_STORED_RESULTS", "10000"))
+RESULT_REAPER_INTERVAL = float(os.getenv("RESULT_REAPER_INTERVAL", "300"))
+
+# Analysis tasks (by number) that work from each fingerprint section. The
+# landing page strategy builds on the other two, so it reruns on any change.
+SECTION_TASKS = {"content": {1, 3}, "visual": {2, 3}, "landing": {3}}
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a running crew when its job has been cancelled.
+
+    Derives from BaseException so CrewAI's retry-on-Exception handling
+    doesn't swallow it and re-run the task.
+    """
+
+
+def _task_result(task_number: int, task: Any) -> Dict[str, Any]:
+    return {
+        "task_number": task_number,
+        "task_name": task.description.strip().splitlines()[0],
+        "task_output": str(task.output),
+    }
+
+
+def _reuse_result(
+    previous: Dict[str, Any],
+    fingerprint: Dict[str, Any],
+    on_task_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    result = dict(previous["result"])
+    result.update(
+        timestamp=time.time(),
+        incremental={
+            "previous_analysis_id": previous["analysis_id"],
+            "changed_sections": [],
+            "reused_tasks": [task["task_number"] for task in result["tasks"]],
+        },
+        fingerprint=fingerprint,
+    )
+    if on_task_result:
+        for task_result in result["tasks"]:
+            on_task_result(task_result)
+    return result
+
+
+def run_analysis(
+    url: str,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    on_task_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+    previous: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Run the SEO analysis crew for `url` and return the API result payload.
+
+    `should_cancel` is polled after every agent step; when it returns True
+    the crew is stopped with `JobCancelled`. `on_task_result` receives each
+    entry of the result's "tasks" list as soon as that task finishes.
+
+    `previous` is the last completed analysis of the page ("analysis_id",
+    "result" and "fingerprint"). If the page is unchanged since then (a 304
+    for its validators, or identical section hashes) the previous result is
+    returned as is; otherwise only the tasks whose inputs changed run again.
+    The result's "fingerprint" is meant to be saved for the next run.
+    """
+
+    def check_cancelled(_step):
+        if should_cancel():
+            raise JobCancelled()
+
+    old_fingerprint = previous["fingerprint"] if previous else {}
+    page = fetch_page_if_modified(
+        url, old_fingerprint.get("etag"), old_fingerprint.get("last_modified")
+    )
+    if page is None:
+        # 304 Not Modified
+        return _reuse_result(previous, old_fingerprint, on_task_result)
+
+    sections = fingerprint_sections(url, page)
+    fingerprint = {
+        "etag": page.etag,
+        "last_modified": page.last_modified,
+        "sections": sections,
+    }
+    changed = [
+        name
+        for name, digest in sections.items()
+        if old_fingerprint.get("sections", {}).get(name) != digest
+    ]
+    if previous and not changed:
+        return _reuse_result(previous, fingerprint, on_task_result)
+
+    rerun = set().union(*(SECTION_TASKS[name] for name in changed))
+    reused_outputs = {}
+    if previous:
+        reused_outputs = {
+            task_result["task_number"]: task_result["task_output"]
+            for task_result in previous["result"]["tasks"]
+            if task_result["task_number"] not in rerun
+        }
+
+    # Key cached LLM responses on the page content; the fetch is shared with
+    # the tools through the page cache
+    page_hash = content_hash(dataclasses.asdict(page.facts))
+
+    page_analysis = None
+    if PRECOMPUTE_TOOL_RESULTS:
+        page_analysis = SEOAnalysisTools.analyze_landing_page.run(url)
+
+    def report_task(output):
+        for idx, task in enumerate(seo_crew.tasks, start=1):
+            if task.output is output:
+                on_task_result(_task_result(idx, task))
+
+    seo_crew = create_seo_analysis_crew(
+        url,
+        step_callback=check_cancelled if should_cancel else None,
+        page_analysis=page_analysis,
+        page_hash=page_hash,
+        task_callback=report_task if on_task_result else None,
+        reused_outputs=reused_outputs,
+    )
+    if on_task_result:
+        for idx, task in enumerate(seo_crew.tasks, start=1):
+            if idx in reused_outputs:
+                on_task_result(_task_result(idx, task))
+    crew_result = seo_crew.kickoff()
+
+    # Collect all task outputs
+    task_outputs = [
+        _task_result(idx, task) for idx, task in enumerate(seo_crew.tasks, start=1)
+    ]
+
+    return {
+        "tasks": task_outputs,
+        "result_summary": (
+            str(crew_result).split("\n\n")[0] if str(crew_result) else ""
+        ),
+        "analysis_text": str(crew_result),
+        "url": url,
+        # The analysis only covers the first PAGE_MAX_BYTES of the page
+        "truncated": page.truncated,
+        "timestamp": time.time(),
+        "incremental": {
+            "previous_analysis_id": previous["analysis_id"] if previous else None,
+            "changed_sections": changed,
+            "reused_tasks": sorted(reused_outputs),
+        },
+        "fingerprint": fingerprint,
+    }
+
+
+def _summarize_batch(pages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    analyzed = [page["result"] for page in pages if page["status"] == "completed"]
+    word_counts = [result["content_stats"]["word_count"] for result in analyzed]
+    return {
+        "total": len(pages),
+        **{
+            status: sum(1 for page in pages if page["status"] == status)
+            for status in ("completed", "failed", "skipped")
+        },
+        "missing_title": sum(1 for result in analyzed if not result["title"]),
+        "missing_meta_description": sum(
+            1 for result in analyzed if not result["meta_description"]
+        ),
+        "missing_h1": sum(1 for result in analyzed if result["h1_count"] == 0),
+        "multiple_h1": sum(1 for result in analyzed if result["h1_count"] > 1),
+        "truncated": sum(1 for result in analyzed if result["truncated"]),
+        "images_without_alt_text": sum(
+            result["images"]["without_alt_text"] for result in analyzed
+        ),
+        "avg_word_count": sum(word_counts) / max(len(word_counts), 1),
+    }
+
+
+def run_batch(
+    params: Dict[str, Any],
+    should_cancel: Optional[Callable[[], bool]] = None,
+    on_page_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Run the quick structure analysis on every page of a batch job and return
+    the per-page results with a site-wide summary.
+
+    `params` holds "urls" and/or a "sitemap_url" whose pages are added (up to
+    MAX_BATCH_URLS in total). Pages are crawled politely, see `CrawlScheduler`;
+    `on_page_result` receives each page's record as soon as it is ready.
+    """
+    urls = list(params.get("urls") or [])[:MAX_BATCH_URLS]
+    if params.get("sitemap_url") and len(urls) < MAX_BATCH_URLS:
+        urls += fetch_sitemap_urls(params["sitemap_url"], MAX_BATCH_URLS - len(urls))
+
+    scheduler = CrawlScheduler(
+        SEOAnalysisTools.analyze_page_structure.run,
+        robots=RobotsRules() if CRAWL_RESPECT_ROBOTS else None,
+    )
+    try:
+        pages = scheduler.run(urls, on_page_result, should_cancel)
+    except CrawlStopped:
+        raise JobCancelled()
+
+    return {
+        "pages": pages,
+        "summary": _summarize_batch(pages),
+        "sitemap_url": params.get("sitemap_url"),
+        "timestamp": time.time(),
+    }
+
+
+class WorkerPool:
+    """
+    Threads that block on the job store, run analyses and shut down cleanly.
+
+    `stop` stops claiming new jobs, waits for in-flight analyses to finish
+    and gives any that outlive the timeout back to the queue.
+
+    While the pool runs, a lease thread renews the leases of its running jobs
+    and requeues jobs of dead workers. A job whose lease was lost anyway is
+    stopped like a cancelled one, and its result is not stored.
+    """
+
+    def __init__(self, store: JobStore, concurrency: int):
+        self.store = store
+        self.concurrency = concurrency
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        # Leases are renewed until in-flight jobs are drained, after `_stopping`
+        self._leases_stopping = threading.Event()
+        self._lease_thread: Optional[threading.Thread] = None
+        # Running job -> (worker holding it, when it was claimed (time.monotonic))
+        self._in_flight: Dict[str, Tuple[str, float]] = {}
+        # Running jobs whose lease was lost to another worker
+        self._lost: Set[str] = set()
+        self._busy_seconds = 0.0
+        self._started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def start(self) -> "WorkerPool":
+        self._started_at = time.monotonic()
+        self.store.requeue_abandoned(time.time() - JOB_LEASE_SECONDS)
+        for idx in range(self.concurrency):
+            worker_name = f"{socket.gethostname()}:{os.getpid()}:{idx}"
+            thread = threading.Thread(
+                target=self.process_analysis_queue,
+                args=(worker_name,),
+                name=f"analysis-worker-{idx}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+        if self.concurrency:
+            self._lease_thread = threading.Thread(
+                target=self._renew_leases, name="job-leases", daemon=True
+            )
+            self._lease_thread.start()
+        return self
+
+    def stop(self, timeout: float = WORKER_SHUTDOWN_TIMEOUT) -> None:
+        self._stopping.set()
+        self.store.interrupt()
+
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+        with self._lock:
+            unfinished = [
+                (analysis_id, worker)
+                for analysis_id, (worker, _) in self._in_flight.items()
+            ]
+        for analysis_id, worker in unfinished:
+            print(f"Requeueing unfinished analysis {analysis_id} on shutdown")
+            self.store.release(analysis_id, worker)
+            self._report_status(analysis_id)
+
+        self._leases_stopping.set()
+        if self._lease_thread is not None:
+            self._lease_thread.join()
+
+    def process_analysis_queue(self, worker_name: str) -> None:
+        """Claim and run queued analyses until the pool is stopped."""
+        while not self._stopping.is_set():
+            job = self.store.claim(worker_name, stop=self._stopping)
+            if job is None:
+                continue
+            with self._lock:
+                self._in_flight[job["analysis_id"]] = (worker_name, time.monotonic())
+            try:
+                self.run_job(job)
+            finally:
+                with self._lock:
+                    _, claimed = self._in_flight.pop(job["analysis_id"])
+                    self._lost.discard(job["analysis_id"])
+                    busy = time.monotonic() - claimed
+                    self._busy_seconds += busy
+                worker_busy_seconds.inc(busy)
+
+    def utilization(self) -> Dict[str, Any]:
+        """
+        How many workers are running a job now, and the share of the time
+        since the pool started that they spent running jobs.
+        """
+        now = time.monotonic()
+        with self._lock:
+            busy = len(self._in_flight)
+            busy_seconds = self._busy_seconds + sum(
+                now - claimed for _, claimed in self._in_flight.values()
+            )
+        capacity = self.concurrency * (now - self._started_at)
+        return {
+            "workers": self.concurrency,
+            "busy": busy,
+            "utilization": round(busy_seconds / capacity, 3) if capacity else None,
+        }
+
+    def _renew_leases(self) -> None:
+        while not self._leases_stopping.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                with self._lock:
+                    running = [
+                        (analysis_id, worker)
+                        for analysis_id, (worker, _) in self._in_flight.items()
+                    ]
+                for analysis_id, worker in running:
+                    if not self.store.heartbeat(analysis_id, worker):
+                        with self._lock:
+                            # Unless the job finished in the meantime
+                            if analysis_id in self._in_flight:
+                                self._lost.add(analysis_id)
+                self.store.requeue_abandoned(time.time() - JOB_LEASE_SECONDS)
+            except Exception as e:
+                print(f"Error renewing job leases: {str(e)}")
+
+    def run_job(self, job: Dict[str, Any]) -> None:
+        analysis_id = job["analysis_id"]
+        worker = job["worker"]
+        self._report_status(analysis_id)
+
+        def should_cancel():
+            with self._lock:
+                if analysis_id in self._lost:
+                    return True
+            return self.store.status(analysis_id) == "cancelling"
+
+        def on_task_result(task_result):
+            self.store.add_event(analysis_id, "task", task_result)
+
+        def on_page_result(page_result):
+            self.store.add_event(analysis_id, "page", page_result)
+
+        def job_metrics():
+            return {
+                "queue_wait_seconds": round(job["started_at"] - job["created_at"], 3),
+                "run_seconds": round(time.perf_counter() - trace.started, 3),
+                **trace.to_dict(),
+            }
+
+        # Spans of the fetch, tools, crew tasks and LLM calls are stored with
+        # the job, and reach the /metrics histograms from there
+        with record_trace() as trace:
+            try:
+                fingerprint = None
+                if job.get("kind") == "batch":
+                    result = run_batch(job["params"], should_cancel, on_page_result)
+                else:
+                    previous = None
+                    if not (job.get("params") or {}).get("force"):
+                        previous = self._previous_analysis(job["url"])
+                    result = run_analysis(
+                        job["url"], should_cancel, on_task_result, previous
+                    )
+                    fingerprint = result.pop("fingerprint")
+                if not self.store.complete(
+                    analysis_id, result, job_metrics(), worker=worker
+                ):
+                    self.store.mark_cancelled(analysis_id, worker)
+                elif fingerprint is not None:
+                    self.store.save_fingerprint(
+                        normalize_url(job["url"]),
+                        {**fingerprint, "analysis_id": analysis_id},
+                    )
+                self._report_status(analysis_id)
+            except JobCancelled:
+                with self._lock:
+                    lost = analysis_id in self._lost
+                if lost:
+                    print(f"Stopped analysis {analysis_id}: its lease was lost")
+                    return
+                self.store.mark_cancelled(analysis_id, worker)
+                self._report_status(analysis_id)
+                print(f"Cancelled analysis {analysis_id}")
+            except Exception as e:
+                error_traceback = traceback.format_exc()
+                if not self.store.fail(
+                    analysis_id, str(e), error_traceback, job_metrics(), worker=worker
+                ):
+                    self.store.mark_cancelled(analysis_id, worker)
+                self._report_status(analysis_id, error=str(e))
+                print(f"Error processing analysis {analysis_id}: {str(e)}")
+                print(error_traceback)
+
+    def _previous_analysis(self, url: str) -> Optional[Dict[str, Any]]:
+        """The last completed analysis of `url` and its fingerprint, if kept."""
+        fingerprint = self.store.get_fingerprint(normalize_url(url))
+        if fingerprint is None:
+            return None
+        job = self.store.get(fingerprint["analysis_id"])
+        if job is None or job["status"] != "completed":
+            return None
+        return {
+            "analysis_id": job["analysis_id"],
+            "result": job["result"],
+            "fingerprint": fingerprint,
+        }
+
+    def _report_status(self, analysis_id: str, error: Optional[str] = None) -> None:
+        """Record the job's current status in its event log."""
+        status = self.store.status(analysis_id)
+        if status is None:
+            return
+        data = {"status": status}
+        if status == "failed" and error:
+            data["error"] = error
+        self.store.add_event(analysis_id, "status", data)
+
+
+def _run_worker_process(store_url: str, concurrency: int) -> None:
+    # Each process opens its own store; connections can't cross a fork
+    store = create_job_store(
+        store_url, JOB_STORE_RECHECK_INTERVAL, TENANT_MAX_RUNNING, BULK_MAX_RUNNING
+    )
+    pool = WorkerPool(store, concurrency).start()
+
+    # Drain in-flight jobs on SIGTERM, then exit
+    shutdown = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: shutdown.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: shutdown.set())
+    shutdown.wait()
+    pool.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run SEO analysis workers")
+    parser.add_argument("--processes", type=int, default=WORKER_PROCESSES)
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    parser.add_argument("--store", default=JOB_STORE_URL)
+    args = parser.parse_args()
+
+    if args.store.startswith("memory://"):
+        parser.error("worker processes need a shared store, e.g. sqlite:///...")
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(target=_run_worker_process, args=(args.store, args.concurrency))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    print(
+        f"Started {args.processes} worker processes "
+        f"with {args.concurrency} analyses each"
+    )
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""
+Shared setup for the API tests. Run from the repository root:
+
+    python -m pytest applications/api/tests
+"""
+
+import os
+
+# Offline, in-process settings; set before the API modules load
+TEST_ENV = {
+    "JOB_STORE_URL": "memory://",
+    "EXTRACTION_PROCESSES": "0",
+    "LLM_CACHE_PATH": "",
+    "NLTK_AUTO_DOWNLOAD": "false",
+    "CREWAI_DISABLE_TELEMETRY": "true",
+    "OTEL_SDK_DISABLED": "true",
+}
+
+for name, value in TEST_ENV.items():
+    os.environ.setdefault(name, value)
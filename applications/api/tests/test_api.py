@@ -0,0 +1,64 @@
+import pytest
+
+from applications.api.src import api
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(
+        api, "api_clients", api.parse_api_keys("acme:key-a,crawler:key-c:bulk")
+    )
+    return api.app.test_client()
+
+
+def analyze(client, api_key=None, **body):
+    headers = {"X-API-Key": api_key} if api_key else {}
+    return client.post(
+        "/api/seo/analyze",
+        json={"url": "https://example.com/", **body},
+        headers=headers,
+    )
+
+
+@pytest.mark.parametrize("api_key", [None, "rotated-key"])
+def test_unknown_keys_cannot_queue_jobs(client, api_key):
+    assert analyze(client, api_key).status_code == 401
+    response = client.post(
+        "/api/seo/analyze-batch",
+        json={"urls": ["https://example.com/"]},
+        headers={"X-API-Key": api_key} if api_key else {},
+    )
+    assert response.status_code == 401
+
+
+def test_jobs_are_queued_for_the_client_of_the_key(client):
+    response = analyze(client, "key-a")
+
+    assert response.status_code == 200
+    job = api.job_store.get(response.get_json()["analysis_id"])
+    assert (job["tenant"], job["priority"]) == ("acme", "interactive")
+
+
+def test_priority_is_capped_by_the_key(client):
+    response = analyze(client, "key-c", priority="interactive")
+
+    assert response.get_json()["priority"] == "bulk"
+    job = api.job_store.get(response.get_json()["analysis_id"])
+    assert (job["tenant"], job["priority"]) == ("crawler", "bulk")
+
+
+def test_without_api_keys_every_request_is_one_client(monkeypatch):
+    monkeypatch.setattr(api, "api_clients", {})
+    client = api.app.test_client()
+
+    jobs = [
+        api.job_store.get(analyze(client, key).get_json()["analysis_id"])
+        for key in (None, "key-1", "key-2")
+    ]
+    assert {job["tenant"] for job in jobs} == {""}
+
+
+@pytest.mark.parametrize("spec", ["acme", "acme:", ":key", "acme:key:urgent"])
+def test_invalid_api_keys_are_rejected(spec):
+    with pytest.raises(ValueError):
+        api.parse_api_keys(spec)
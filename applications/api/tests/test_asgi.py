@@ -0,0 +1,113 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("crewai")
+httpx = pytest.importorskip("httpx")
+
+from flask import Flask
+
+from applications.api.src.asgi import ThreadedWsgiToAsgi
+
+
+def test_a_slow_flask_route_does_not_hold_up_other_requests():
+    flask_app = Flask(__name__)
+
+    @flask_app.route("/slow")
+    def slow():
+        time.sleep(1)
+        return "slow"
+
+    @flask_app.route("/fast")
+    def fast():
+        return "fast"
+
+    executor = ThreadPoolExecutor(max_workers=4)
+    app = ThreadedWsgiToAsgi(flask_app, executor)
+
+    async def timed(client, path):
+        await asyncio.sleep(0 if path == "/slow" else 0.1)
+        started = time.monotonic()
+        response = await client.get(path)
+        return response.text, time.monotonic() - started
+
+    async def requests():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            return await asyncio.gather(
+                timed(client, "/slow"), timed(client, "/slow"), timed(client, "/fast")
+            )
+
+    try:
+        started = time.monotonic()
+        (slow, _), (_, _), (fast, fast_elapsed) = asyncio.run(requests())
+        elapsed = time.monotonic() - started
+    finally:
+        executor.shutdown()
+
+    assert (slow, fast) == ("slow", "fast")
+    assert fast_elapsed < 0.5
+    assert elapsed < 1.8
+
+
+def serve(handler):
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_async_fetches_retry_busy_answers_after_retry_after():
+    from applications.api.src.asgi import fetch_page_body
+
+    answers = [
+        httpx.Response(503, headers={"Retry-After": "0"}),
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(200, headers={"Content-Type": "text/html"}, content=b"<p>ok"),
+    ]
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return answers[len(requests) - 1]
+
+    async def fetch():
+        async with serve(handler) as client:
+            return await fetch_page_body(client, "https://busy.example/")
+
+    response, body, truncated = asyncio.run(fetch())
+
+    assert (response.status_code, body, truncated) == (200, b"<p>ok", False)
+    assert len(requests) == 3
+
+
+def test_async_fetches_revalidate_stale_cached_pages():
+    from applications.api.src.asgi import load_page
+    from applications.api.src.seo_analysis.tools import page_cache
+
+    url = "https://revalidate.example/"
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(
+            200,
+            headers={"Content-Type": "text/html", "ETag": '"v1"'},
+            content=b"<title>Page</title>",
+        )
+
+    async def load():
+        async with serve(handler) as client:
+            return await load_page(client, url)
+
+    page_cache.invalidate(url)
+    first = asyncio.run(load())
+    first.fetched_at = 0
+    second = asyncio.run(load())
+
+    assert second is first and second.fetched_at > 0
+    assert second.facts.title == "Page"
+    assert [r.headers.get("If-None-Match") for r in requests] == [None, '"v1"']
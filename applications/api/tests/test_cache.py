@@ -0,0 +1,32 @@
+from applications.api.src.seo_analysis.cache import CachedPage, PageCache
+
+
+def page(url, size):
+    return CachedPage(url=url, body=b"x" * size, encoding="utf-8", facts=None)
+
+
+def test_page_cache_evicts_least_recently_used_pages_past_its_byte_limit():
+    cache = PageCache(max_entries=10, max_bytes=250)
+    for name in "abc":
+        cache.put(f"https://example.com/{name}", page(name, 100))
+
+    assert cache.lookup("https://example.com/a") is None
+    assert len(cache) == 2
+
+    # Replacing a page counts its new size only
+    cache.put("https://example.com/b", page("b", 50))
+    cache.put("https://example.com/d", page("d", 100))
+    assert [cache.lookup(f"https://example.com/{n}") is not None for n in "bcd"] == [
+        True,
+        True,
+        True,
+    ]
+
+
+def test_page_cache_keeps_the_newest_page_even_if_it_is_too_large():
+    cache = PageCache(max_bytes=100)
+    cache.put("https://example.com/small", page("small", 10))
+    cache.put("https://example.com/large", page("large", 500))
+
+    assert cache.lookup("https://example.com/small") is None
+    assert cache.lookup("https://example.com/large") is not None
@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("crewai")
+
+from applications.api.src.seo_analysis.compact import compact_images
+from applications.api.src.seo_analysis.images import ImageProber
+
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg"><circle r="4"/></svg>'
+
+
+class SvgResponse:
+    status_code = 200
+    headers = {"Content-Type": "image/svg+xml", "Content-Length": str(len(SVG))}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_content(self, chunk_size):
+        return iter([SVG])
+
+
+class SvgClient:
+    max_bytes = 1024 * 1024
+
+    def get(self, url, timeout=None):
+        return SvgResponse()
+
+
+def test_images_without_dimensions_are_compacted_without_a_size():
+    prober = ImageProber(client=SvgClient())
+    images = prober.probe_all([("https://example.com/icon.svg", "Icon")])
+    assert (images[0]["format"], images[0]["width"]) == ("SVG", None)
+
+    compact = compact_images({"count": 1, "data": images})
+
+    assert compact["largest"] == [
+        {"url": "https://example.com/icon.svg", "kb": 0.1, "alt": "Icon"}
+    ]
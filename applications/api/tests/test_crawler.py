@@ -0,0 +1,59 @@
+import threading
+import time
+
+from applications.api.src.seo_analysis.crawler import CrawlScheduler, RobotsRules
+
+
+class RobotsResponse:
+    status_code = 200
+
+
+class RobotsClient:
+    """Serves the same robots.txt for every host and counts the fetches."""
+
+    user_agent = "test-agent"
+
+    def __init__(self, text):
+        self.text = text
+        self.fetched = []
+
+    def fetch(self, url):
+        self.fetched.append(url)
+        return RobotsResponse(), self.text.encode("utf-8")
+
+
+def test_crawl_delay_applies_from_the_first_visit():
+    robots = RobotsRules(RobotsClient("User-agent: *\nCrawl-delay: 1\n"))
+    started = []
+    lock = threading.Lock()
+
+    def visit(url):
+        with lock:
+            started.append(time.monotonic())
+        return url
+
+    # Crawl-delay only takes whole seconds
+    scheduler = CrawlScheduler(visit, per_host=2, min_interval=0, robots=robots)
+    records = scheduler.run(["http://example.com/1", "http://example.com/2"])
+
+    assert [record["status"] for record in records] == ["completed"] * 2
+    assert started[1] - started[0] >= 0.95
+    assert robots.client.fetched == ["http://example.com/robots.txt"]
+
+
+def test_disallowed_pages_are_skipped_and_other_hosts_crawled():
+    robots = RobotsRules(RobotsClient("User-agent: *\nDisallow: /private\n"))
+    scheduler = CrawlScheduler(lambda url: url, min_interval=0, robots=robots)
+    records = scheduler.run(
+        ["http://a.example/private/1", "http://a.example/public", "http://b.example/"]
+    )
+
+    assert [record["status"] for record in records] == [
+        "skipped",
+        "completed",
+        "completed",
+    ]
+    assert sorted(robots.client.fetched) == [
+        "http://a.example/robots.txt",
+        "http://b.example/robots.txt",
+    ]
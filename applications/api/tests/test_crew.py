@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("crewai")
+
+from applications.api.src.benchmarks.fake_llm import FakeLLM
+from applications.api.src.benchmarks.stub_site import StubSite
+from applications.api.src.seo_analysis.crew import create_seo_analysis_crew, use_llm
+from applications.api.src.seo_analysis.metrics import record_trace
+from applications.api.src.seo_analysis.tools import SEOAnalysisTools, page_cache
+
+
+@pytest.fixture
+def site():
+    site = StubSite(paragraphs=5).start()
+    yield site
+    site.stop()
+
+
+@pytest.fixture
+def fake_llm():
+    llm = FakeLLM()
+    use_llm(llm)
+    yield llm
+    use_llm(None)
+    page_cache.clear()
+
+
+def tool_spans(trace):
+    return [span["stage"] for span in trace.spans if span["stage"].startswith("tool:")]
+
+
+def test_agents_call_their_tools(site, fake_llm):
+    url = site.url("/page/1")
+    with record_trace() as trace:
+        create_seo_analysis_crew(url).kickoff()
+
+    assert fake_llm.calls
+    assert tool_spans(trace)
+
+
+def test_precomputed_page_analysis_runs_no_tools(site, fake_llm):
+    url = site.url("/page/2")
+    page_analysis = SEOAnalysisTools.analyze_landing_page.run(url)
+    crew = create_seo_analysis_crew(url, page_analysis=page_analysis)
+    with record_trace() as trace:
+        crew.kickoff()
+
+    assert fake_llm.calls
+    assert tool_spans(trace) == []
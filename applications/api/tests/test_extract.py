@@ -0,0 +1,78 @@
+import importlib.util
+from dataclasses import asdict
+
+import pytest
+
+from applications.api.src.benchmarks.stub_site import FIXTURES
+from applications.api.src.seo_analysis.extract import (
+    PARSER_BACKENDS,
+    extract_body_facts,
+    extract_page_facts,
+)
+
+# The third-party backends are optional
+BACKENDS = [
+    pytest.param(
+        name,
+        marks=pytest.mark.skipif(
+            module is not None and importlib.util.find_spec(module) is None,
+            reason=f"{module} is not installed",
+        ),
+    )
+    for name, (module, _) in PARSER_BACKENDS.items()
+    if name != "html.parser"
+]
+
+# Markup every backend turns into the same facts
+AGREEING_PAGES = {
+    "headings": "<h1>Top</h1><h2>Sub</h2><p>Text</p><h2>Other &amp; more</h2>",
+    "unclosed_paragraphs": "<div><p>one<p>two</div><p>three",
+    "excluded_content": (
+        "<header>Menu</header><nav><ul><li>Home</ul></nav>"
+        "<script>var x = '<p>no</p>';</script><p>Kept</p><footer>Bye</footer>"
+    ),
+    "images": (
+        "<img src='/a.png' alt='A' width='10' height='20'>"
+        "<nav><img src='/logo.png'></nav><img alt='no src'>"
+    ),
+    "signals": (
+        "<html lang='en-US'><head><title> Page </title>"
+        "<meta name='description' content='About us'>"
+        "<meta name='viewport' content='width=device-width'>"
+        "<link rel='canonical' href='https://example.com/'>"
+        "<script type='application/ld+json'>{}</script></head>"
+        "<body><!-- testimonial --><a class='share'>Subscribe</a></body></html>"
+    ),
+}
+
+
+def facts(html, backend):
+    return asdict(extract_page_facts(html, backend))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("name", sorted(AGREEING_PAGES))
+def test_backends_agree_with_html_parser(name, backend):
+    html = AGREEING_PAGES[name]
+    assert facts(html, backend) == facts(html, "html.parser")
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("name", ["small", "image_heavy", "script_heavy"])
+def test_backends_agree_on_the_fixture_corpus(name, backend):
+    body = FIXTURES[name]()
+    assert asdict(extract_body_facts(body, "utf-8", backend)) == asdict(
+        extract_body_facts(body, "utf-8", "html.parser")
+    )
+
+
+def test_lxml_closes_a_heading_at_a_nested_paragraph():
+    pytest.importorskip("lxml")
+    html = "<h2>Sub<p>Para</p></h2><p>After</p>"
+
+    # lxml ends the heading where the <p> starts; the others keep it open
+    assert facts(html, "lxml")["headings"]["h2"] == ["Sub"]
+    assert facts(html, "html.parser")["headings"]["h2"] == ["SubPara"]
+    # The text itself is the same
+    assert facts(html, "lxml")["content_text"] == "Sub Para After"
+    assert facts(html, "html.parser")["content_text"] == "Sub Para After"
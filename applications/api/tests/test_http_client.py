@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+import requests
+
+from applications.api.src.seo_analysis.http_client import page_charset
+
+PAGE = "<html><body><p>Crème brûlée, naïve café</p></body></html>"
+
+
+def test_page_charset_honours_the_content_type_charset():
+    headers = {"Content-Type": 'text/html; charset="ISO-8859-1"'}
+    assert page_charset(headers, PAGE.encode("utf-8")) == "iso8859-1"
+
+
+def test_page_charset_detects_the_charset_when_the_headers_name_none():
+    assert page_charset({"Content-Type": "text/html"}, PAGE.encode("utf-8")) == "utf-8"
+
+
+def test_page_charset_falls_back_on_an_unknown_charset():
+    headers = {"Content-Type": "text/html; charset=no-such-codec"}
+    assert page_charset(headers, PAGE.encode("utf-8")) == "utf-8"
+
+
+def test_page_charset_reads_an_ascii_prefix_as_utf8():
+    body = b"<html>" + b" " * 70_000 + PAGE.encode("utf-8")
+    assert page_charset({}, body) == "utf-8"
+
+
+def test_both_fetch_paths_decode_with_the_same_charset():
+    pytest.importorskip("crewai")
+    httpx = pytest.importorskip("httpx")
+    from applications.api.src.asgi import load_page
+    from applications.api.src.seo_analysis.tools import _page_from_response, page_cache
+
+    url = "https://charset.example/"
+    body = PAGE.encode("utf-8")
+    headers = {"Content-Type": "text/html"}
+
+    response = requests.Response()
+    response.status_code = 200
+    response.headers.update(headers)
+    page = _page_from_response(url, response, body, truncated=False)
+
+    async def fetch():
+        transport = httpx.MockTransport(
+            lambda request: httpx.Response(200, headers=headers, content=body)
+        )
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await load_page(client, url)
+
+    page_cache.invalidate(url)
+    async_page = asyncio.run(fetch())
+
+    assert page.encoding == async_page.encoding == "utf-8"
@@ -0,0 +1,56 @@
+import struct
+import threading
+
+from applications.api.src.seo_analysis.images import ImageProber
+
+PNG = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR" + struct.pack(">II", 10, 20)
+
+
+class ImageResponse:
+    status_code = 200
+    headers = {"Content-Type": "image/png", "Content-Length": str(len(PNG))}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_content(self, chunk_size):
+        return iter([PNG])
+
+
+class SlowHostClient:
+    """Holds requests to slow.example until fast.example has been fetched."""
+
+    max_bytes = 1024 * 1024
+
+    def __init__(self):
+        self.fast_fetched = threading.Event()
+        self.waited = []
+
+    def get(self, url, timeout=None):
+        if "fast.example" in url:
+            self.fast_fetched.set()
+        else:
+            self.waited.append(self.fast_fetched.wait(timeout=5))
+        return ImageResponse()
+
+
+def test_images_queued_for_a_busy_host_leave_pool_threads_to_other_hosts():
+    client = SlowHostClient()
+    prober = ImageProber(max_workers=2, per_host=1, deadline=10, client=client)
+    images = [
+        ("http://slow.example/1.png", "one"),
+        ("http://slow.example/2.png", "two"),
+        ("http://fast.example/3.png", "three"),
+    ]
+
+    records = prober.probe_all(images)
+
+    assert [(r["url"], r["width"], r["height"]) for r in records] == [
+        (url, 10, 20) for url, _ in images
+    ]
+    # The second slow.example image waited in its host queue, not on a thread
+    assert client.waited == [True, True]
+    assert prober._running == {} and prober._waiting == {}
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from applications.api.src import worker as worker_module
+from applications.api.src.job_store import MemoryJobStore, SQLiteJobStore
+from applications.api.src.worker import WorkerPool
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobStore()
+    return SQLiteJobStore(str(tmp_path / "jobs.db"), recheck_interval=0.1)
+
+
+def test_heartbeat_keeps_a_job_from_being_requeued(store):
+    job_id = store.create("https://example.com/")["analysis_id"]
+    store.claim("worker-a")
+
+    time.sleep(0.05)
+    assert store.heartbeat(job_id, "worker-a")
+    assert store.requeue_abandoned(time.time() - 0.02) == 0
+    assert store.status(job_id) == "running"
+
+    assert store.requeue_abandoned(time.time()) == 1
+    assert store.status(job_id) == "queued"
+    assert not store.heartbeat(job_id, "worker-a")
+
+
+def test_only_the_worker_holding_a_job_finishes_it(store):
+    job_id = store.create("https://example.com/")["analysis_id"]
+    store.claim("worker-a")
+    store.requeue_abandoned(time.time() + 1)
+    store.claim("worker-b")
+
+    assert not store.heartbeat(job_id, "worker-a")
+    assert not store.complete(job_id, {"by": "a"}, worker="worker-a")
+    assert not store.fail(job_id, "error", "traceback", worker="worker-a")
+    store.release(job_id, "worker-a")
+    assert store.get(job_id)["worker"] == "worker-b"
+
+    assert store.complete(job_id, {"by": "b"}, worker="worker-b")
+    assert store.get(job_id)["result"] == {"by": "b"}
+
+
+def test_fingerprints_go_with_jobs_evicted_by_count(store):
+    fingerprinted = []
+    for n in range(3):
+        job_id = store.create(f"https://example.com/{n}")["analysis_id"]
+        store.claim("worker-a")
+        assert store.complete(job_id, {}, worker="worker-a")
+        store.save_fingerprint(f"https://example.com/{n}", {"analysis_id": job_id})
+        fingerprinted.append(job_id)
+        time.sleep(0.01)
+
+    assert store.expire(keep=1) == 2
+
+    assert store.get_fingerprint("https://example.com/0") is None
+    assert store.get_fingerprint("https://example.com/1") is None
+    assert store.get_fingerprint("https://example.com/2") == {
+        "analysis_id": fingerprinted[2]
+    }
+
+
+@pytest.mark.parametrize("kind", ["analysis", "batch"])
+def test_worker_pool_renews_the_lease_of_a_long_job(store, kind, monkeypatch):
+    monkeypatch.setattr(worker_module, "JOB_LEASE_SECONDS", 0.3)
+    monkeypatch.setattr(worker_module, "JOB_HEARTBEAT_SECONDS", 0.05)
+
+    def slow_analysis(url, should_cancel, on_task_result, previous):
+        time.sleep(1)
+        return {"url": url, "fingerprint": None}
+
+    def slow_batch(params, should_cancel, on_page_result):
+        # A crawl of many pages, far longer than the lease
+        for url in params["urls"]:
+            time.sleep(0.1)
+            on_page_result({"url": url, "status": "completed"})
+        return {"pages": params["urls"]}
+
+    monkeypatch.setattr(worker_module, "run_analysis", slow_analysis)
+    monkeypatch.setattr(worker_module, "run_batch", slow_batch)
+    params = {"force": True, "urls": [f"https://example.com/{n}" for n in range(10)]}
+    job_id = store.create("https://example.com/", kind=kind, params=params)[
+        "analysis_id"
+    ]
+    pool = WorkerPool(store, 2).start()
+    try:
+        deadline = time.monotonic() + 5
+        while store.status(job_id) != "completed" and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        pool.stop()
+
+    job = store.get(job_id)
+    assert job["status"] == "completed"
+    assert [
+        event["data"]["status"]
+        for event in store.events(job_id)
+        if event["event"] == "status"
+    ] == ["queued", "running", "completed"]
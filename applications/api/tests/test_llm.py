@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("crewai")
+
+from applications.api.src.benchmarks.fake_llm import FakeLLM
+from applications.api.src.seo_analysis.llm_cache import (
+    CachedLLM,
+    LLMResponseCache,
+    TimedLLM,
+)
+from applications.api.src.seo_analysis.metrics import record_trace
+
+
+def test_wrappers_call_the_wrapped_llm_with_the_agent_stop_words(tmp_path):
+    fake_llm = FakeLLM()
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.db"))
+    llm = TimedLLM(CachedLLM(fake_llm, cache, context_hash="page"))
+    # As set by the agent executor
+    llm.stop = ["\nObservation:"]
+
+    with record_trace() as trace:
+        first = llm.call("Analyze https://example.com/")
+        second = llm.call("Analyze https://example.com/")
+
+    assert first == second
+    assert fake_llm.calls == 1
+    assert fake_llm.stop == ["\nObservation:"]
+    assert [span["stage"] for span in trace.spans] == ["llm_call", "llm_call"]
+
+
+def test_response_cache_keeps_a_running_total_of_its_size(tmp_path):
+    path = str(tmp_path / "llm_cache.db")
+    cache = LLMResponseCache(path, max_bytes=25)
+
+    def total():
+        return cache._connection().execute("SELECT bytes FROM size_total").fetchone()[0]
+
+    cache.set("a", "x" * 10)
+    cache.set("b", "x" * 10)
+    cache.set("a", "x" * 5)
+    assert total() == 15
+
+    # Past the limit, the least recently used responses go
+    cache.set("c", "x" * 12)
+    assert cache.get("b") is None
+    assert (cache.get("a"), total()) == ("x" * 5, 17)
+
+    # Reopening keeps the total instead of counting the table again
+    assert LLMResponseCache(path)._connection().execute(
+        "SELECT bytes FROM size_total"
+    ).fetchall() == [(17,)]
@@ -0,0 +1,29 @@
+import pytest
+
+from applications.api.src.seo_analysis.metrics import percentile
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        ([5.0], 5.0),
+        ([1.0, 2.0], 2.0),
+        ([float(n) for n in range(1, 21)], 19.0),
+        ([float(n) for n in range(1, 101)], 95.0),
+    ],
+)
+def test_p95_is_the_nearest_rank(values, expected):
+    assert percentile(values, 0.95) == expected
+
+
+def test_health_reports_nearest_rank_queue_waits(monkeypatch):
+    pytest.importorskip("crewai")
+    from applications.api.src import api
+
+    waits = [float(n) for n in range(10, 0, -1)]
+    monkeypatch.setattr(api.job_store, "queue_waits", lambda limit: waits)
+
+    queue_waits = api.health_payload()["queue_wait_seconds"]
+
+    assert (queue_waits["recent_p50"], queue_waits["recent_p95"]) == (5.0, 10.0)
+    assert queue_waits["recent_max"] == 10.0